@@ -1,17 +1,19 @@
 import logging
 import pathlib
+import random
 from typing import Dict
 from flask import Flask, render_template, request, jsonify, redirect, send_from_directory, url_for
+from markupsafe import Markup
 from flask_talisman import Talisman
 import os
 from helpers import MyAPIError
-from translate_eng2ovp import translate_ovp_to_english, translate_english_to_ovp
 
 
 from helpers import MyAPIError
 from app_base import app, bp
 import app_oauth
 import app_api
+import warmup
 
 thisdir = pathlib.Path(__file__).parent.absolute()
 
@@ -45,7 +47,7 @@ def handle_exception(e: Exception):
     logging.exception(e)
     return render_template('error.html', error_code=500, error_message='Internal server error'), 500
 
-from sentence_builder import get_all_choices, format_sentence, get_random_sentence, get_random_sentence_big
+from sentence_builder import get_all_choices, format_sentence, get_grammar_bundle, get_random_sentence, get_random_sentence_big
 
 # favicon route - in static/img/favicon.ico
 @bp.route('/favicon.ico')
@@ -56,9 +58,19 @@ def favicon():
 def index():
     return redirect(url_for('kubishi.builder'))
 
+def embed_json(text: str) -> Markup:
+    """Make encoded JSON safe to embed in a <script> element."""
+    return Markup(text.replace('<', '\\u003c'))
+
 @bp.route('/builder')
 def builder():
-    return render_template('builder.html')
+    # embed the initial choices and the tour's example, so the page doesn't have to fetch them
+    return render_template(
+        'builder.html',
+        grammar_version=get_grammar_bundle()['version'],
+        initial_state=embed_json(app_api.get_initial_state()),
+        example=embed_json(random.choice(app_api.get_example_pool()))
+    )
 
 @bp.route('/translator')
 def translator():
@@ -67,4 +79,5 @@ def translator():
 app.register_blueprint(bp)
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
+    warmup.start()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,32 +1,266 @@
 """API routes for the app"""
+import functools
+import hmac
+import json
 import logging
 import os
-from typing import Dict, List
+import pathlib
+import threading
+import time
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
 
-from openai import OpenAI, APIError
-from translate_eng2ovp import translate_ovp_to_english, translate_english_to_ovp
-from sentence_builder import get_all_choices, format_sentence, get_random_sentence, get_random_sentence_big
+from sentence_builder import get_all_choices, format_sentence, format_sentences, get_grammar_bundle, get_random_sentence, get_random_sentence_big
+from sentence_builder import SENTENCE_KEYS, get_sentence_words
+import circuit_breaker
+import deadlines
+import json_fragments
+import llm_clients
+import metrics
+import profiler
+import tracing
+import warmup
 
-from flask import g, jsonify, make_response, request, session
+from flask import Response, abort, g, jsonify, make_response, request, session, stream_with_context
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 from app_base import app
-from app_oauth import get_app_metadata
+from app_oauth import get_app_metadata, is_admin, requires_admin
+from hybrid_limiter import LocalLimiter
+from job_queue import JobQueue, QueueFull
 
+if TYPE_CHECKING:
+    import openai
+
+thisdir = pathlib.Path(__file__).parent.absolute()
+
+def translator() -> ModuleType:
+    """The translate_eng2ovp module, imported on first use so the builder routes never load its ML and LLM dependencies."""
+    import translate_eng2ovp
+    return translate_eng2ovp
+
+@app.before_request
+def start_request_timer():
+    # registered before the rate limit checks, so their time is included
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response: Response) -> Response:
+    if 'request_start' in g:
+        metrics.HTTP_DURATION.observe(
+            time.perf_counter() - g.request_start,
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+# admins can profile a single request by sending this header (see profiler.py)
+PROFILE_HEADER = 'X-Profile'
+PROFILE_INTERVAL = 0.001
+
+@app.before_request
+def start_request_profile():
+    if PROFILE_HEADER in request.headers and is_admin():
+        g.request_profiler = profiler.Sampler(
+            PROFILE_INTERVAL,
+            thread_ids=[threading.get_ident()],
+            include_idle=True # the wall-clock time of the request, including its waits on the LLM API
+        ).start()
+
+@app.after_request
+def finish_request_profile(response: Response) -> Response:
+    sampler = g.pop('request_profiler', None)
+    if sampler is not None:
+        profile_id = profiler.save_profile(profiler.render_collapsed(sampler.stop()))
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+RATELIMIT_STORAGE_TIMEOUT = float(os.getenv('RATELIMIT_STORAGE_TIMEOUT', '2'))
+RATELIMIT_SYNC_INTERVAL = float(os.getenv('RATELIMIT_SYNC_INTERVAL', '1'))
+DEFAULT_LIMIT = "10/second" # per route and address, to prevent abuse
+RATELIMIT_STORAGE_OPTIONS = {"socket_connect_timeout": RATELIMIT_STORAGE_TIMEOUT, "socket_timeout": RATELIMIT_STORAGE_TIMEOUT}
+
+# strict limits, checked against the shared store on every request (falling back to memory if it is down)
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     storage_uri=os.environ.get('REDIS_URL'),
-    storage_options={"socket_connect_timeout": 30},
+    storage_options=RATELIMIT_STORAGE_OPTIONS,
     strategy="fixed-window",
-    default_limits=["10/second"], # to prevent abuse
+    in_memory_fallback_enabled=True,
+)
+# the default limit is checked locally and synced with the shared store in the background
+default_limiter = LocalLimiter(
+    DEFAULT_LIMIT,
+    storage_uri=os.environ.get('REDIS_URL'),
+    storage_options=RATELIMIT_STORAGE_OPTIONS,
+    sync_interval=RATELIMIT_SYNC_INTERVAL,
+    name='default-limit',
 )
+# translate limits are in cost units: a full translation costs TRANSLATION_MODE_COSTS['full'],
+# so full translations are limited to 1/second;30/minute;200/month
+TRANSLATION_MODE_COSTS = {
+    'fast': 1,
+    'standard': 2,
+    'full': 3,
+}
 LIMITS = {
-    "translate": "1/second;30/minute;200/month",
+    "translate": "3/second;90/minute;600/month",
+    # charged per distinct sentence, so a batch uses the same budget as translating its sentences one by one
+    # (it is not held to the per-second limit, its sentences are translated at once)
+    "translate_batch": "90/minute;600/month",
 }
+# all translate routes draw on the same budget of a user
+TRANSLATE_SCOPE = 'translate'
+MAX_BATCH_SIZE = int(os.getenv('TRANSLATION_BATCH_MAX_SIZE', '50'))
+# a batch may cost at most a minute of the translate limit (e.g. 30 sentences in full mode)
+MAX_BATCH_COST = 90
+BATCH_WORKERS = int(os.getenv('TRANSLATION_BATCH_WORKERS', '8'))
+# seconds a translation may take end to end (clients can ask for less, see get_request_deadline)
+TRANSLATION_DEADLINE = float(os.getenv('TRANSLATION_DEADLINE', '30'))
+TRANSLATION_BATCH_DEADLINE = float(os.getenv('TRANSLATION_BATCH_DEADLINE', '60'))
+TRANSLATION_JOB_DEADLINE = float(os.getenv('TRANSLATION_JOB_DEADLINE', '120'))
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+def get_translation_mode() -> str:
+    """Get the translation mode requested in the JSON body (defaults to full)."""
+    data = request.get_json(silent=True)
+    mode = data.get('mode') if isinstance(data, dict) else None
+    return str(mode) if mode else 'full'
+
+def get_translation_cost() -> int:
+    # invalid modes are rejected by the route, charge them like a full translation
+    return TRANSLATION_MODE_COSTS.get(get_translation_mode(), TRANSLATION_MODE_COSTS['full'])
+
+def get_batch_sentences() -> Optional[List[str]]:
+    """The stripped sentences of a batch request (None unless "sentences" is a list of strings)."""
+    data = request.get_json(silent=True)
+    sentences = data.get('sentences') if isinstance(data, dict) else None
+    if not isinstance(sentences, list) or not all(isinstance(sentence, str) for sentence in sentences):
+        return None
+    return [sentence.strip() for sentence in sentences]
+
+def get_batch_error() -> Optional[str]:
+    """Why translate_batch rejects the request (None if it does not)."""
+    sentences = get_batch_sentences()
+    if sentences is None:
+        return 'sentences must be a list of strings'
+    num = len(set(sentences) - {''})
+    if num > MAX_BATCH_SIZE:
+        return f'At most {MAX_BATCH_SIZE} distinct sentences per batch'
+    cost = TRANSLATION_MODE_COSTS.get(get_translation_mode())
+    if cost is not None and num * cost > MAX_BATCH_COST:
+        return f'At most {MAX_BATCH_COST // cost} distinct sentences per batch in {get_translation_mode()} mode'
+    return None
+
+def get_batch_cost() -> int:
+    # charged per distinct sentence, rejected batches are free
+    if get_batch_error() is not None:
+        return 0
+    return len(set(get_batch_sentences()) - {''}) * get_translation_cost()
+
+def get_user_api_key() -> Optional[str]:
+    """Get the OpenAI API key saved in the logged in user's app metadata (None if there is none)."""
+    if 'profile' not in session:
+        return None
+    try:
+        return get_app_metadata().get('api_key') or None
+    except Exception as e: # fall back to the app's key (and limits) if Auth0 is unavailable
+        logging.exception(e)
+        return None
+
+def has_user_api_key() -> bool:
+    # users with their own key are not charged against the shared translate limits
+    return get_user_api_key() is not None
+
+def get_request_client() -> "openai.OpenAI":
+    """Get the pooled OpenAI client for the user's own API key, or the app's shared client."""
+    api_key = get_user_api_key()
+    return llm_clients.user_clients.get(api_key) if api_key else llm_clients.default_client()
+
+def with_request_client(view):
+    """Make the LLM calls of a view (and of the jobs it submits) with get_request_client()."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with llm_clients.use_client(get_request_client()):
+            return view(*args, **kwargs)
+    return wrapper
+
+def get_request_deadline(max_seconds: float) -> float:
+    """The request's deadline: max_seconds from now, or sooner if the client asks for it (in seconds) in the X-Request-Timeout header."""
+    seconds = request.headers.get(DEADLINE_HEADER, max_seconds, type=float)
+    return deadlines.from_now(min(seconds, max_seconds) if seconds > 0 else max_seconds)
+
+def with_deadline(max_seconds: float):
+    """Give a view's translation pipeline a deadline (see get_request_deadline and deadlines.py)."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with deadlines.use_deadline(get_request_deadline(max_seconds)):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def exempt_from_default_limit(view):
+    """Exclude a route from DEFAULT_LIMIT (e.g. because it has its own limits)."""
+    view.default_limit_exempt = True
+    return view
+
+@app.before_request
+def check_default_limit():
+    if not limiter.enabled or request.endpoint is None or request.endpoint.split('.')[-1] == 'static':
+        return
+    view = app.view_functions.get(request.endpoint)
+    if getattr(view, 'default_limit_exempt', False):
+        return
+    if not default_limiter.hit(f"{request.endpoint}/{get_remote_address()}"):
+        abort(429)
+
+def shared_limit(limit_value: str, scope: str, cost: Union[int, Callable[[], int]]):
+    """Limit a route per user in the shared store (instead of the default limit).
+
+    Routes limited in the same scope draw on the same budget: the windows they have in
+    common (e.g. "90/minute") are counted together. Users with their own OpenAI API key are exempt.
+    """
+    decorator = limiter.shared_limit(
+        limit_value,
+        scope,
+        key_func=lambda: session.get('profile', {}).get('sub', 'anonymous'),
+        cost=cost,
+        exempt_when=has_user_api_key
+    )
+    return lambda view: exempt_from_default_limit(decorator(view))
+
+def translate_limit(cost: Union[int, Callable[[], int]] = get_translation_cost):
+    return shared_limit(LIMITS['translate'], TRANSLATE_SCOPE, cost)
+
+def traced(view):
+    """Trace a view (see tracing.py), continuing the trace in the X-Trace-Id request header if there is one.
+
+    The trace ID is returned in the X-Trace-Id response header.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with tracing.start_trace(request.endpoint, trace_id=request.headers.get('X-Trace-Id'), path=request.path) as trace:
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Trace-Id'] = trace.trace_id
+            return response
+    return wrapper
 
 TRANSLATION_QUALITY_THRESHOLD = 0.8
+LLM_UNAVAILABLE_WARNING = (
+    'The translator\'s language model is unavailable right now, so this translation was made ' +
+    'with a simpler fallback and may be less accurate.'
+)
+
+def llm_unavailable_response() -> Response:
+    """503 for a request that could not be answered while the LLM circuit breaker is open."""
+    response = jsonify(error='The translator is unavailable right now, please try again later.')
+    response.status_code = 503
+    response.headers['Retry-After'] = str(int(circuit_breaker.LLM_BREAKER_OPEN_SECONDS))
+    return response
 
 # API Routes
 @app.errorhandler(429)
@@ -34,71 +268,117 @@ def ratelimit_handler(exp):
     message = 'Add your OpenAI API key in your account settings for unlimited access'
     return make_response(jsonify({"rate_limit_message": f"{message}."}), 429)
 
+@functools.lru_cache(maxsize=4096)
+def details_fragment(word: Any) -> json_fragments.Fragment:
+    return json_fragments.fragment(word.details)
+
+@functools.lru_cache(maxsize=256)
+def choice_list_fragment(choices: Tuple[Tuple[str, str], ...]) -> json_fragments.Fragment:
+    return json_fragments.fragment(choices)
+
+def encode_sentence(*selection: Optional[str]) -> List[json_fragments.Fragment]:
+    """format_sentence with the (cached) encoded details of each word."""
+    return [details_fragment(word) for word in get_sentence_words(*selection)]
+
+def encode_choices(choices: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """get_all_choices output with the (cached) encoded choice list of each slot."""
+    return {
+        slot: {**choice, 'choices': choice_list_fragment(tuple(choice['choices']))}
+        for slot, choice in choices.items()
+    }
+
+@functools.lru_cache(maxsize=4096)
+def choices_fragment(*selection: Optional[str]) -> json_fragments.Fragment:
+    """The encoded get_all_choices output for a selection."""
+    return json_fragments.Fragment(json_fragments.dumps(encode_choices(get_all_choices(*selection))))
+
+EXAMPLE_POOL_SIZE = int(os.getenv('BUILDER_EXAMPLE_POOL_SIZE', '32'))
+
+def get_initial_state() -> str:
+    """The encoded /api/builder/choices response for an empty selection."""
+    return json_fragments.dumps(dict(choices=choices_fragment(*[None] * len(SENTENCE_KEYS)), sentence=[]))
+
+@functools.lru_cache(maxsize=None)
+def get_example_pool() -> Tuple[str, ...]:
+    """Encoded /api/builder/random-example responses, pre-generated for embedding in the builder page."""
+    examples = []
+    for _ in range(EXAMPLE_POOL_SIZE):
+        choices = get_random_sentence_big()
+        sentence = encode_sentence(*[choices[key]['value'] for key in SENTENCE_KEYS])
+        examples.append(json_fragments.dumps(dict(choices=encode_choices(choices), sentence=sentence)))
+    return tuple(examples)
+
 @app.route('/api/builder/choices', methods=['POST'])
 def get_choices():
+    """Get the choices for every builder slot and the sentence (if complete) for a selection."""
     data: Dict = request.get_json()
-    word_choices = dict(
-        subject_noun=data.get('subject_noun') or None,
-        subject_suffix=data.get('subject_suffix') or None,
-        verb=data.get('verb') or None,
-        verb_tense=data.get('verb_tense') or None,
-        object_pronoun=data.get('object_pronoun') or None,
-        object_noun=data.get('object_noun') or None,
-        object_suffix=data.get('object_suffix') or None,
-    )
-    choices = get_all_choices(
-        subject_noun=data.get('subject_noun') or None,
-        subject_suffix=data.get('subject_suffix') or None,
-        verb=data.get('verb') or None,
-        verb_tense=data.get('verb_tense') or None,
-        object_pronoun=data.get('object_pronoun') or None,
-        object_noun=data.get('object_noun') or None,
-        object_suffix=data.get('object_suffix') or None,
-    )
-
-    print(choices)
-    print(word_choices)
-    
+    selection = [data.get(key) or None for key in SENTENCE_KEYS]
+    choices = choices_fragment(*selection)
     sentence = []
     try:
-        sentence = format_sentence(
-            subject_noun=data.get('subject_noun') or None,
-            subject_suffix=data.get('subject_suffix') or None,
-            verb=data.get('verb') or None,
-            verb_tense=data.get('verb_tense') or None,
-            object_pronoun=data.get('object_pronoun') or None,
-            object_noun=data.get('object_noun') or None,
-            object_suffix=data.get('object_suffix') or None,
-        )
+        sentence = encode_sentence(*selection)
     except Exception as e:
-        print(e) 
-
-    # here you can call your functions and build the sentence
-    return jsonify(choices=choices, sentence=sentence)
+        logging.debug(e)
+    return json_fragments.response(choices=choices, sentence=sentence)
 
 @app.route('/api/builder/sentence', methods=['POST'])
 def build_sentence():
     data: Dict = request.get_json()
     try:
-        sentence = format_sentence(
-            subject_noun=data.get('subject_noun') or None,
-            subject_suffix=data.get('subject_suffix') or None,
-            verb=data.get('verb') or None,
-            verb_tense=data.get('verb_tense') or None,
-            object_pronoun=data.get('object_pronoun') or None,
-            object_noun=data.get('object_noun') or None,
-            object_suffix=data.get('object_suffix') or None,
-        )
-        return jsonify(sentence=sentence)
+        sentence = encode_sentence(*[data.get(key) or None for key in SENTENCE_KEYS])
+        return json_fragments.response(sentence=sentence)
     except Exception as e:
         return jsonify(sentence=[], error=str(e)), 400
 
+def versioned_response(data: Dict, version: str) -> Response:
+    """JSON response for a resource that only changes with its version.
+
+    Requested with ?v=<version> it is cached forever, otherwise it is revalidated with its ETag.
+    """
+    response = jsonify(data)
+    response.set_etag(version)
+    if request.args.get('v') == version:
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/builder/grammar', methods=['GET'])
+@exempt_from_default_limit
+def get_grammar():
+    """Get the grammar bundle the builder computes choices with in the browser."""
+    bundle = get_grammar_bundle()
+    return versioned_response(bundle, bundle['version'])
+
+MAX_SENTENCES_BATCH_SIZE = int(os.getenv('BUILDER_BATCH_MAX_SIZE', '1000'))
+
+@app.route('/api/builder/sentences', methods=['POST'])
+def build_sentences():
+    """Format a batch of sentences ("sentences", at most MAX_SENTENCES_BATCH_SIZE).
+
+    Each sentence is either an object with the same fields as /api/builder/sentence or a
+    compact sentence code (see sentence_builder.encode_sentence). Returns one
+    {"sentence": [...]} (or {"sentence": [], "error": message}) per input, in order.
+    """
+    data: Dict = request.get_json(silent=True) or {}
+    sentences = data.get('sentences')
+    if not isinstance(sentences, list):
+        return jsonify(error='sentences must be a list'), 400
+    if len(sentences) > MAX_SENTENCES_BATCH_SIZE:
+        return jsonify(error=f'At most {MAX_SENTENCES_BATCH_SIZE} sentences per batch'), 400
+    return jsonify(sentences=format_sentences(sentences))
+
 @app.route('/api/builder/translate', methods=['POST'])
-@limiter.limit(LIMITS['translate'], key_func = lambda: session.get('profile', {}).get('sub', 'anonymous'))
+@translate_limit(TRANSLATION_MODE_COSTS['full'])
+@traced
+@with_request_client
+@with_deadline(TRANSLATION_DEADLINE)
 def get_translation():
     data: Dict = request.get_json()
     try:
-        translation = translate_ovp_to_english(
+        translation = translator().translate_ovp_to_english(
             subject_noun=data.get('subject_noun') or None,
             subject_suffix=data.get('subject_suffix') or None,
             verb=data.get('verb') or None,
@@ -109,6 +389,10 @@ def get_translation():
             model='gpt-3.5-turbo'
         )
         return jsonify(translation=translation)
+    except circuit_breaker.CircuitOpen:
+        return llm_unavailable_response()
+    except deadlines.DeadlineExceeded as e:
+        return jsonify(sentence=[], error=str(e)), 504
     except Exception as e:
         return jsonify(sentence=[], error=str(e)), 400
     
@@ -129,8 +413,8 @@ def get_random():
         )
 
         choices = get_random_sentence(choices)
-        sentence = format_sentence(**{k: v['value'] for k, v in choices.items()})
-        return jsonify(choices=choices, sentence=sentence)
+        sentence = encode_sentence(*[choices[key]['value'] for key in SENTENCE_KEYS])
+        return json_fragments.response(choices=encode_choices(choices), sentence=sentence)
     except Exception as e:
         return jsonify(sentence=[], error=str(e)), 400
 
@@ -138,43 +422,327 @@ def get_random():
 def get_random_example():
     try:
         choices = get_random_sentence_big()
-        sentence = format_sentence(**{k: v['value'] for k, v in choices.items()})
-        return jsonify(choices=choices, sentence=sentence)
+        sentence = encode_sentence(*[choices[key]['value'] for key in SENTENCE_KEYS])
+        return json_fragments.response(choices=encode_choices(choices), sentence=sentence)
     except Exception as e:
         return jsonify(sentence=[], error=str(e)), 400
     
+def format_translation(response: Dict) -> Dict:
+    """Build the translator API response (with a quality message or warning) from a translate_english_to_ovp result.
+
+    The quality message/warning is only available in full mode (it needs the similarity scores),
+    and not if the scores were skipped because the deadline was near or the LLM is unavailable ("degraded").
+    Translations made without the LLM (see circuit_breaker.py) get a warning instead.
+    """
+    if 'sim_simple' not in response: # fast and standard modes, or degraded
+        llm_unavailable = response.get('fallback') or 'backwards' in response.get('skipped', [])
+        return dict(
+            english=response.get('backwards', ''),
+            paiute=response['target'],
+            message='',
+            warning=LLM_UNAVAILABLE_WARNING if llm_unavailable else '',
+            substitutions=response.get('substitutions', []),
+            mode=response.get('mode', 'full'),
+            degraded=response.get('degraded', False)
+        )
+    if response['sim_simple'] < TRANSLATION_QUALITY_THRESHOLD:
+        response['warning'] = (
+            'The input sentence is complex, so alot of meaning may have been lost in breaking ' +
+            'it down into simple sentences.'
+        )
+    elif response['sim_backwards'] < TRANSLATION_QUALITY_THRESHOLD:
+        response['warning'] = 'The translation doesn\'t seem to be very accurate.'
+    elif response['sim_comparator'] < TRANSLATION_QUALITY_THRESHOLD:
+        response['warning'] = (
+            'The translator doesn\'t know some of the words in your input sentence. ' +
+            'It left the english words as placeholders and gave you the best translation it could.'
+        )
+    elif all([response[k] >= TRANSLATION_QUALITY_THRESHOLD for k in ['sim_simple', 'sim_backwards', 'sim_comparator']]):
+        response['message'] = 'The translation is probably pretty good!'
+    return dict(
+        english=response['backwards'],
+        paiute=response['target'],
+        message=response.get('message', ''),
+        warning=response.get('warning', ''),
+        substitutions=response.get('substitutions', []),
+        mode=response.get('mode', 'full'),
+        degraded=response.get('degraded', False)
+    )
+
 @app.route('/api/translator/translate', methods=['POST'])
-@limiter.limit(LIMITS['translate'], key_func = lambda: session.get('profile', {}).get('sub', 'anonymous'))
+@translate_limit()
+@traced
+@with_request_client
+@with_deadline(TRANSLATION_DEADLINE)
 def translate_sentence():
+    """Translate a sentence from English to Paiute.
+
+    The optional "mode" (fast, standard or full) selects how much of the pipeline runs
+    (see translate_eng2ovp.TRANSLATION_MODES) and how much of the rate limit it uses.
+    Fails with a 504 if the translation runs out of time (see get_request_deadline), and with a 503
+    if the LLM is unavailable and the sentence cannot be translated locally.
+    """
     data: Dict = request.get_json()
     try:
-        response = translate_english_to_ovp(data.get('english'))
+        response = translator().translate_english_to_ovp(data.get('english'), mode=get_translation_mode())
         logging.info(response)
-        if response['sim_simple'] < TRANSLATION_QUALITY_THRESHOLD:
-            response['warning'] = (
-                'The input sentence is complex, so alot of meaning may have been lost in breaking ' +
-                'it down into simple sentences.'
-            )
-        elif response['sim_backwards'] < TRANSLATION_QUALITY_THRESHOLD:
-            response['warning'] = 'The translation doesn\'t seem to be very accurate.'
-        elif response['sim_comparator'] < TRANSLATION_QUALITY_THRESHOLD:
-            response['warning'] = (
-                'The translator doesn\'t know some of the words in your input sentence. ' +
-                'It left the english words as placeholders and gave you the best translation it could.'
-            )
-        elif all([response[k] >= TRANSLATION_QUALITY_THRESHOLD for k in ['sim_simple', 'sim_backwards', 'sim_comparator']]):
-            response['message'] = 'The translation is probably pretty good!'
-        return jsonify(
-            english=response['backwards'],
-            paiute=response['target'],
-            message=response.get('message', ''),
-            warning=response.get('warning', '')
-        )
+        return jsonify(**format_translation(response))
+    except circuit_breaker.CircuitOpen:
+        return llm_unavailable_response()
+    except deadlines.DeadlineExceeded as e:
+        return jsonify(error=str(e)), 504
+    except Exception as e:
+        return jsonify(error=str(e)), 400
+
+def format_event(event: str, data: Dict) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/translator/stream', methods=['POST'])
+@translate_limit()
+def stream_translation():
+    """Translate a sentence, streaming each stage's results as Server-Sent Events.
+
+    Emits split, target, backwards and scores events as the stages complete (see
+    iter_translate_english_to_ovp, fast and standard modes stop early) and a degraded event if stages were
+    skipped or answered locally, then a result event with the same payload as
+    /api/translator/translate, or an error event.
+    """
+    data: Dict = request.get_json()
+    english = data.get('english')
+    mode = get_translation_mode()
+    if mode not in translator().TRANSLATION_MODES:
+        return jsonify(error=f"Mode must be one of {translator().TRANSLATION_MODES} (not {mode})"), 400
+
+    client = get_request_client()
+    trace_id = tracing.new_trace_id(request.headers.get('X-Trace-Id'))
+    deadline = get_request_deadline(TRANSLATION_DEADLINE)
+
+    def generate():
+        # runs after the view returns, so the client is selected (and the trace and deadline started) here
+        response = {'mode': mode, 'degraded': False}
+        try:
+            with tracing.start_trace('stream_translation', trace_id=trace_id, path=request.path), \
+                 llm_clients.use_client(client), deadlines.use_deadline(deadline):
+                for stage, stage_data in translator().iter_translate_english_to_ovp(english, mode=mode):
+                    response.update(stage_data)
+                    yield format_event(stage, stage_data)
+            logging.info(response)
+            yield format_event('result', format_translation(response))
+        except Exception as e:
+            logging.exception(e)
+            yield format_event('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Trace-Id': trace_id}
+    )
+
+@app.route('/api/translator/batch', methods=['POST'])
+@shared_limit(LIMITS['translate_batch'], TRANSLATE_SCOPE, get_batch_cost)
+@traced
+@with_request_client
+@with_deadline(TRANSLATION_BATCH_DEADLINE)
+def translate_batch():
+    """Translate a list of English sentences ("sentences", at most MAX_BATCH_SIZE) to Paiute.
+
+    Duplicate sentences are only translated (and charged) once. Returns a list of
+    results in the order of the input sentences, each either the /api/translator/translate
+    payload or {"error": message}. Failures of the whole batch are answered like those of
+    /api/translator/translate (503 if the LLM is unavailable, 504 if the batch runs out of time).
+    """
+    error = get_batch_error()
+    if error is not None:
+        return jsonify(error=error), 400
+
+    sentences = get_batch_sentences()
+    to_translate = [sentence for sentence in sentences if sentence]
+    try:
+        responses = dict(zip(to_translate, translator().translate_english_to_ovp_batch(
+            to_translate, mode=get_translation_mode(), workers=BATCH_WORKERS
+        )))
+    except circuit_breaker.CircuitOpen:
+        return llm_unavailable_response()
+    except deadlines.DeadlineExceeded as e:
+        return jsonify(error=str(e)), 504
     except Exception as e:
         return jsonify(error=str(e)), 400
+    results = []
+    for sentence in sentences:
+        if not sentence:
+            results.append({'error': 'No sentence to translate'})
+        elif 'error' in responses[sentence]:
+            results.append(responses[sentence])
+        else:
+            results.append(format_translation(responses[sentence]))
+    return jsonify(results=results)
+
+def run_translation_job(payload: Dict) -> Dict:
+    # jobs run in the submitting request's context, so their trace keeps its ID
+    with tracing.start_trace('translation_job'), deadlines.use_deadline(deadlines.from_now(TRANSLATION_JOB_DEADLINE)):
+        return format_translation(translator().translate_english_to_ovp(payload['english'], mode=payload['mode']))
+
+translation_jobs = JobQueue(
+    path=os.getenv('JOB_DB', str(thisdir / '.results' / 'jobs.sqlite3')),
+    func=run_translation_job,
+    workers=int(os.getenv('JOB_WORKERS', '4')),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+    ttl=float(os.getenv('JOB_RESULT_TTL', '600')),
+)
+MAX_JOB_WAIT = 30 # seconds a long-poll may wait for a job to finish
+
+@app.route('/api/translator/jobs', methods=['POST'])
+@translate_limit()
+@traced
+@with_request_client
+def submit_translation_job():
+    """Submit an English to Paiute translation to run in the background.
+
+    Returns the job ID immediately; poll /api/translator/jobs/<job_id> for the result.
+    Submitting the same sentence while an identical job is still pending returns that job.
+    """
+    data: Dict = request.get_json()
+    english = (data.get('english') or '').strip()
+    if not english:
+        return jsonify(error='No sentence to translate'), 400
+    mode = get_translation_mode()
+    if mode not in translator().TRANSLATION_MODES:
+        return jsonify(error=f"Mode must be one of {translator().TRANSLATION_MODES} (not {mode})"), 400
+    try:
+        job_id, _ = translation_jobs.submit({'english': english, 'mode': mode})
+    except QueueFull as e:
+        return jsonify(error=str(e)), 503
+    return jsonify(**translation_jobs.get(job_id)), 202
+
+@app.route('/api/translator/jobs/<job_id>', methods=['GET'])
+def get_translation_job(job_id: str):
+    """Get the status (and result, once done) of a translation job.
+
+    Pass ?wait=<seconds> to long-poll until the job finishes (at most MAX_JOB_WAIT seconds).
+    """
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    job = translation_jobs.wait(job_id, wait) if wait > 0 else translation_jobs.get(job_id)
+    if job is None:
+        return jsonify(error='Job not found or expired'), 404
+    return jsonify(**job)
+
+for cache in (details_fragment, choice_list_fragment, choices_fragment):
+    metrics.register_cache(cache.__name__, cache)
+
+# bearer token of the metrics scraper (without one, only admins can read the metrics)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+def can_read_metrics() -> bool:
+    if is_admin():
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Metrics of all worker processes in the Prometheus text format (see metrics.py).
+
+    Readable by admins and by scrapers sending the METRICS_TOKEN as a bearer token.
+    """
+    if not can_read_metrics():
+        abort(403)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/debug/traces', methods=['GET'])
+@requires_admin
+def get_traces():
+    """The latest exported traces of this worker (at most ?limit=, default 20)."""
+    return jsonify(traces=tracing.get_traces(request.args.get('limit', 20, type=int)))
+
+@app.route('/api/debug/traces/<trace_id>', methods=['GET'])
+@requires_admin
+def get_trace(trace_id: str):
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        return jsonify(error='Trace not found (it may not have been sampled)'), 404
+    return jsonify(**trace)
+
+def profile_response(profile: str) -> Response:
+    return Response(profile, mimetype='text/plain')
+
+@app.route('/api/debug/profile/cpu', methods=['GET'])
+@requires_admin
+def get_cpu_profile():
+    """Sample this worker's threads for ?seconds= (default 10) and return the stacks in the collapsed format.
+
+    Pass ?interval= to change the sampling interval and ?idle=1 to keep the samples of waiting threads.
+    """
+    try:
+        return profile_response(profiler.cpu_profile(
+            request.args.get('seconds', 10, type=float),
+            interval=request.args.get('interval', profiler.DEFAULT_INTERVAL, type=float),
+            include_idle=request.args.get('idle', 0, type=int) == 1
+        ))
+    except profiler.ProfileBusy as e:
+        return jsonify(error=str(e)), 409
+
+@app.route('/api/debug/profile/memory', methods=['GET'])
+@requires_admin
+def get_memory_profile():
+    """Trace this worker's allocations for ?seconds= (default 10) and return the growth per stack in the collapsed format."""
+    try:
+        return profile_response(profiler.memory_profile(request.args.get('seconds', 10, type=float)))
+    except profiler.ProfileBusy as e:
+        return jsonify(error=str(e)), 409
+
+@app.route('/api/debug/profile/requests/<profile_id>', methods=['GET'])
+@requires_admin
+def get_request_profile(profile_id: str):
+    """The profile of a request sent with the X-Profile header (its X-Profile-Id response header)."""
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        return jsonify(error='Profile not found (it may have been made by another worker)'), 404
+    return profile_response(profile)
+
+def warm_up_builder() -> None:
+    """Fill the caches behind the builder page and the first builder requests."""
+    get_grammar_bundle()
+    get_initial_state()
+    get_example_pool()
+
+def warm_up_similarity_model() -> None:
+    """Load the SS_MODE embedding backend (e.g. the model and tokenizer) with a dummy encode.
+
+    The openai backend has nothing to load besides the translator's imports, and a dummy
+    encode would be an API call.
+    """
+    te = translator()
+    if te.SS_MODE != 'openai':
+        te.get_embeddings(['The dog ate the apples.'])
+
+def warm_up_gloss_embeddings() -> None:
+    """Load the gloss embedding matrix from its on-disk cache.
+
+    If there is none, it is built here with a local backend; with the openai backend it is
+    left to the first request that needs it, since building it calls the API.
+    """
+    te = translator()
+    if te.SS_MODE == 'openai':
+        te.GLOSS_EMBEDDINGS.load()
+    else:
+        te.GLOSS_EMBEDDINGS.matrix
+
+warmup.add_step('builder', warm_up_builder)
+# needs OPENAI_API_KEY, which users with their own keys can do without
+warmup.add_step('llm_client', llm_clients.default_client, blocking=False)
+warmup.add_step('similarity_model', warm_up_similarity_model)
+warmup.add_step('gloss_embeddings', warm_up_gloss_embeddings)
 
 # health check
 @app.route('/api/healthz', methods=['GET'])
 def health_check():
     return jsonify(status='ok')
 
+@app.route('/api/readyz', methods=['GET'])
+@exempt_from_default_limit
+def readiness_check():
+    """Whether all workers have warmed up (503 until they have), with the state of this worker's warm-up steps."""
+    status = warmup.status()
+    return jsonify(**status), 200 if status['ready'] else 503
+
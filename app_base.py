@@ -14,9 +14,10 @@ if os.getenv('FLASK_ENV') != 'production' and thisdir.joinpath('dev.env').exists
 
 PREFIX = os.getenv('PREFIX')
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() != 'false'
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_host=1, x_proto=1)  # Adjust these values according to your setup
 bp = Blueprint('kubishi', __name__, url_prefix=PREFIX, static_folder='static', static_url_path='/static')
@@ -1,18 +1,27 @@
 
 from functools import wraps
+import hashlib
+import logging
 import os
+import pathlib
+import threading
+import time
 import traceback
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 from urllib.parse import urlencode
 from app_base import bp
+import metrics
 
 from auth0.authentication import Users, GetToken
 from flask import session, url_for, flash, g
 from flask_oauthlib.client import OAuth
-from flask import Blueprint, render_template, redirect, request
+from flask import Blueprint, abort, render_template, redirect, request
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField
 from wtforms.validators import DataRequired
-from auth0.management.auth0 import Auth0
+
+if TYPE_CHECKING:
+    from auth0.management.auth0 import Auth0
 
 bp_auth0 = Blueprint('auth0', __name__)
 
@@ -20,6 +29,14 @@ bp_auth0 = Blueprint('auth0', __name__)
 AUTH0_CLIENT_ID = os.getenv('AUTH0_CLIENT_ID')
 AUTH0_CLIENT_SECRET = os.getenv('AUTH0_CLIENT_SECRET')
 AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN')
+# seconds a user's app metadata is cached before it is read from Auth0 again
+APP_METADATA_TTL = float(os.getenv('APP_METADATA_TTL', '60'))
+# markers of changed app metadata, shared by the workers of a server (empty to disable)
+APP_METADATA_DIR = os.getenv('APP_METADATA_DIR', str(pathlib.Path(__file__).parent / '.results' / 'app_metadata'))
+# Auth0 user IDs (sub, comma-separated) allowed to use the debugging endpoints
+ADMIN_USERS = {sub.strip() for sub in os.getenv('ADMIN_USERS', '').split(',') if sub.strip()}
+# refresh the management API token this many seconds before it expires
+MANAGEMENT_TOKEN_REFRESH_MARGIN = 300
 
 oauth = OAuth(bp)
 auth0 = oauth.remote_app(
@@ -44,6 +61,17 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+def is_admin() -> bool:
+    return session.get('profile', {}).get('sub') in ADMIN_USERS
+
+def requires_admin(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not is_admin():
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated
+
 # set global current_user variable
 @bp.before_request
 def before_request():
@@ -111,36 +139,107 @@ def user():
             error_message=error_message, success_message=success_message
         )
     
-def get_management_api_token():
-    get_token = GetToken(AUTH0_DOMAIN, AUTH0_CLIENT_ID, AUTH0_CLIENT_SECRET)
-    token = get_token.client_credentials(audience=f'https://{AUTH0_DOMAIN}/api/v2/')
-    return token['access_token']
+_management_token: Optional[str] = None
+_management_token_expires = 0.0
+_management_token_lock = threading.Lock()
+def get_management_api_token() -> str:
+    """Get a management API token, reusing it until shortly before it expires."""
+    global _management_token, _management_token_expires
+    if _management_token is not None and time.time() < _management_token_expires - MANAGEMENT_TOKEN_REFRESH_MARGIN:
+        return _management_token
+    with _management_token_lock: # only one thread fetches a new token
+        if _management_token is None or time.time() >= _management_token_expires - MANAGEMENT_TOKEN_REFRESH_MARGIN:
+            get_token = GetToken(AUTH0_DOMAIN, AUTH0_CLIENT_ID, AUTH0_CLIENT_SECRET)
+            token = get_token.client_credentials(audience=f'https://{AUTH0_DOMAIN}/api/v2/')
+            _management_token = token['access_token']
+            _management_token_expires = time.time() + token.get('expires_in', 86400)
+        return _management_token
+
+def get_management_api() -> "Auth0":
+    """Get a management API client (the management SDK is imported on first use, it pulls in aiohttp)."""
+    from auth0.management.auth0 import Auth0
+    return Auth0(AUTH0_DOMAIN, get_management_api_token())
+
+# Each worker caches app metadata for APP_METADATA_TTL. When a user changes theirs, the
+# worker handling the change also touches the user's marker in APP_METADATA_DIR, and the
+# other workers of the server re-read entries cached before the marker's version. Servers
+# that do not share the directory (e.g. other replicas) see the change within the TTL.
+
+# sub -> (expiry time, marker version, app metadata)
+_app_metadata_cache: Dict[str, Tuple[float, int, Dict[str, Any]]] = {}
+_app_metadata_lock = threading.Lock()
+
+def _app_metadata_marker(sub: str) -> Optional[pathlib.Path]:
+    if not APP_METADATA_DIR:
+        return None
+    # keep the user IDs out of the file names
+    return pathlib.Path(APP_METADATA_DIR) / hashlib.sha256(sub.encode()).hexdigest()
+
+def app_metadata_version(sub: str) -> int:
+    """The version of a user's app metadata shared by the workers (0 if it never changed)."""
+    marker = _app_metadata_marker(sub)
+    try:
+        return marker.stat().st_mtime_ns if marker is not None else 0
+    except OSError:
+        return 0
+
+def invalidate_app_metadata(sub: str) -> None:
+    """Make the other workers read a user's app metadata from Auth0 again."""
+    marker = _app_metadata_marker(sub)
+    if marker is None:
+        return
+    try:
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        version = max(time.time_ns(), app_metadata_version(sub) + 1)
+        marker.touch()
+        os.utime(marker, ns=(version, version))
+    except OSError as e:
+        logging.warning(f"Failed to write app metadata marker: {e}")
+
+def cache_app_metadata(sub: str, app_metadata: Optional[Dict[str, Any]], version: int = 0) -> None:
+    """Cache a user's app metadata read at a marker version (or drop it from the cache if None)."""
+    with _app_metadata_lock:
+        if app_metadata is None:
+            _app_metadata_cache.pop(sub, None)
+            return
+        now = time.time()
+        for key in [key for key, (expires, _, _) in _app_metadata_cache.items() if expires <= now]:
+            del _app_metadata_cache[key]
+        _app_metadata_cache[sub] = (now + APP_METADATA_TTL, version, app_metadata)
 
 def update_app_metadata(default_tutor_language, api_key):
-    auth0_mgmt_api = Auth0(AUTH0_DOMAIN, get_management_api_token())
+    auth0_mgmt_api = get_management_api()
     metadata = {
         'default_tutor_language': default_tutor_language,
         'api_key': api_key
     }
     sub = session['profile']['sub']
-    auth0_mgmt_api.users.update(session['profile']['sub'], {'app_metadata': metadata})
-    session['profile']['app_metadata'] = metadata
+    auth0_mgmt_api.users.update(sub, {'app_metadata': metadata})
+    invalidate_app_metadata(sub)
+    cache_app_metadata(sub, metadata, app_metadata_version(sub))
 
 def get_app_metadata():
     # if user is not logged in, return empty dict
     if 'profile' not in session:
         return {}
-    if 'app_metadata' in session['profile']:
-        return session['profile']['app_metadata']
-    auth0_mgmt_api = Auth0(AUTH0_DOMAIN, get_management_api_token())
-    app_metadata = auth0_mgmt_api.users.get(session['profile']['sub']).get('app_metadata', {})
-    session['profile']['app_metadata'] = app_metadata
+    sub = session['profile']['sub']
+    version = app_metadata_version(sub) # before reading, so a concurrent change invalidates what is read
+    cached = _app_metadata_cache.get(sub)
+    if cached is not None and cached[0] > time.time() and cached[1] == version:
+        metrics.CACHE_REQUESTS.inc(cache='app_metadata', result='hit')
+        return cached[2]
+    metrics.CACHE_REQUESTS.inc(cache='app_metadata', result='miss')
+    auth0_mgmt_api = get_management_api()
+    app_metadata = auth0_mgmt_api.users.get(sub).get('app_metadata', {})
+    cache_app_metadata(sub, app_metadata, version)
     return app_metadata
 
 @bp_auth0.route('/delete_account', methods=['POST'])
 def delete_account():
-    auth0_mgmt_api = Auth0(AUTH0_DOMAIN, get_management_api_token())
+    auth0_mgmt_api = get_management_api()
     auth0_mgmt_api.users.delete(session['profile']['sub'])
+    invalidate_app_metadata(session['profile']['sub'])
+    cache_app_metadata(session['profile']['sub'], None)
     session.clear()
     flash('Account deleted successfully!', 'success')
     return redirect('/')
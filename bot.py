@@ -1,6 +1,7 @@
 import json
 import time
 import openai
+import cassette
 from translate_eng2ovp import translate_english_to_ovp
 import dotenv
 import flask
@@ -12,7 +13,7 @@ bp = flask.Blueprint('bot', __name__)
 ASSISTANT_ID = "asst_D3k3AWyA22HCgtCZqYwjQWjO"
 
 def main():
-    client = openai.OpenAI()
+    client = openai.OpenAI(http_client=cassette.http_client())
 
     message = "How do you say 'I want to go to the big store and buy juicy apples' in Paiute?"
     run = client.beta.threads.create_and_run(
@@ -0,0 +1,222 @@
+"""Record/replay of LLM API traffic for offline, reproducible benchmarking.
+
+The cassette sits at the HTTP transport level, so it covers every OpenAI client
+in the app (the openai module default client, and clients created with
+http_client=cassette.http_client()). It is configured with env variables:
+
+    LLM_CASSETTE          path of the cassette (JSONL). Unset disables the cassette.
+    LLM_CASSETTE_MODE     record: always call the API and record the response
+                          replay: only serve recorded responses (misses raise CassetteMiss)
+                          auto:   replay when recorded, otherwise call the API and record (default)
+    LLM_CASSETTE_LATENCY  latency injected on replay:
+                          none (default), recorded, fixed:<seconds>,
+                          or lognormal:<median seconds>,<sigma>
+
+Usage:
+    python cassette.py stats .results/cassettes/eval.jsonl
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import dotenv
+import httpx
+
+dotenv.load_dotenv()
+
+LLM_CASSETTE = os.getenv('LLM_CASSETTE')
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'auto')
+LLM_CASSETTE_LATENCY = os.getenv('LLM_CASSETTE_LATENCY', 'none')
+
+# headers that describe the encoding of the original body, which is stored decoded
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request that is not on the cassette."""
+
+
+def request_key(request: httpx.Request) -> str:
+    """Hash the parts of a request that determine its response (method, path and JSON body)."""
+    body = request.content.decode('utf-8', errors='replace')
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True)
+    except ValueError:
+        pass
+    return hashlib.sha256(f"{request.method} {request.url.path}\n{body}".encode()).hexdigest()
+
+
+def latency_sampler(spec: str) -> Callable[[float], float]:
+    """Parse a LLM_CASSETTE_LATENCY spec into a function mapping the recorded latency to the injected one."""
+    kind, _, args = spec.partition(':')
+    if kind == 'none':
+        return lambda recorded: 0.0
+    if kind == 'recorded':
+        return lambda recorded: recorded
+    if kind == 'fixed':
+        seconds = float(args)
+        return lambda recorded: seconds
+    if kind == 'lognormal':
+        median, sigma = map(float, args.split(','))
+        return lambda recorded: random.lognormvariate(0, sigma) * median
+    raise ValueError(f"Invalid cassette latency: {spec}")
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records responses to, and replays them from, a JSONL cassette.
+
+    Identical requests recorded several times are replayed round-robin, so
+    a benchmark sees the same mix of responses it was recorded with.
+    """
+    def __init__(self,
+                 path: pathlib.Path,
+                 mode: str = 'auto',
+                 latency: str = 'none',
+                 wrapped: Optional[httpx.BaseTransport] = None):
+        if mode not in ('record', 'replay', 'auto'):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = pathlib.Path(path)
+        self.mode = mode
+        self.sample_latency = latency_sampler(latency)
+        self.wrapped = wrapped or httpx.HTTPTransport()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._next: Dict[str, int] = {}
+        if self.path.exists():
+            for entry in load_cassette(self.path):
+                self._entries.setdefault(entry['key'], []).append(entry)
+
+    def _replay(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            i = self._next.get(key, 0)
+            self._next[key] = (i + 1) % len(entries)
+            return entries[i]
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open('a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._entries.setdefault(entry['key'], []).append(entry)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        if self.mode != 'record':
+            entry = self._replay(key)
+            if entry is not None:
+                time.sleep(self.sample_latency(entry['latency']))
+                return httpx.Response(
+                    status_code=entry['status_code'],
+                    headers=entry['headers'],
+                    content=entry['body'].encode('utf-8'),
+                    request=request
+                )
+            if self.mode == 'replay':
+                raise CassetteMiss(f"No recorded response for {request.method} {request.url.path} ({key})")
+
+        start = time.perf_counter()
+        response = self.wrapped.handle_request(request)
+        body = response.read().decode('utf-8', errors='replace')
+        latency = time.perf_counter() - start
+        response.close()
+
+        usage = None
+        try:
+            usage = json.loads(body).get('usage')
+        except (ValueError, AttributeError):
+            pass
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        self._record({
+            'key': key,
+            'method': request.method,
+            'path': request.url.path,
+            'request': request.content.decode('utf-8', errors='replace'),
+            'status_code': response.status_code,
+            'headers': headers,
+            'body': body,
+            'latency': latency,
+            'usage': usage,
+        })
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=body.encode('utf-8'),
+            request=request
+        )
+
+    def close(self) -> None:
+        self.wrapped.close()
+
+
+def load_cassette(path: pathlib.Path) -> List[Dict[str, Any]]:
+    entries = []
+    with pathlib.Path(path).open(encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError: # truncated last line from an interrupted recording
+                continue
+    return entries
+
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+def http_client() -> Optional[httpx.Client]:
+    """The shared cassette-backed httpx client, or None if LLM_CASSETTE is not set."""
+    global _http_client
+    if not LLM_CASSETTE:
+        return None
+    with _http_client_lock:
+        if _http_client is None:
+            logging.info(f"Using LLM cassette {LLM_CASSETTE} (mode={LLM_CASSETTE_MODE}, latency={LLM_CASSETTE_LATENCY})")
+            transport = CassetteTransport(LLM_CASSETTE, mode=LLM_CASSETTE_MODE, latency=LLM_CASSETTE_LATENCY)
+            _http_client = httpx.Client(transport=transport, timeout=httpx.Timeout(600.0, connect=5.0))
+    return _http_client
+
+
+def install() -> None:
+    """Route the openai module default client through the cassette (if LLM_CASSETTE is set)."""
+    import openai
+    client = http_client()
+    if client is not None:
+        openai.http_client = client
+
+
+def stats(path: pathlib.Path) -> Dict[str, Any]:
+    """Summarize a cassette: number of calls, token usage and latency percentiles per path."""
+    summary = {}
+    for entry in load_cassette(path):
+        row = summary.setdefault(entry['path'], {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'latencies': []})
+        row['calls'] += 1
+        row['prompt_tokens'] += (entry.get('usage') or {}).get('prompt_tokens', 0)
+        row['completion_tokens'] += (entry.get('usage') or {}).get('completion_tokens', 0)
+        row['latencies'].append(entry['latency'])
+    for row in summary.values():
+        latencies = sorted(row.pop('latencies'))
+        row['latency_p50'] = latencies[len(latencies) // 2]
+        row['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect LLM cassettes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    stats_parser = subparsers.add_parser('stats', help='Summarize the calls recorded on a cassette')
+    stats_parser.add_argument('path', type=pathlib.Path, help='Path of the cassette')
+
+    args = parser.parse_args()
+    if args.command == 'stats':
+        print(json.dumps(stats(args.path), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Check that importing the web app stays fast and free of the LLM and ML dependencies.
+
+Imports app in a fresh interpreter with -X importtime (without OPENAI_API_KEY,
+which must not be needed to start a worker, and with placeholder Auth0 settings
+if there are none) and fails if the import takes longer than the budget or loads
+any of the heavy modules, which the translator routes import on first use.
+Run it in CI or before deploying:
+    python check_startup.py --budget 0.6
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# modules only the translator needs (the builder routes must work without them)
+HEAVY_MODULES = ['numpy', 'pandas', 'openai', 'httpx', 'rbo', 'torch', 'transformers', 'sentence_transformers', 'aiohttp']
+DEFAULT_BUDGET = float(os.getenv('IMPORT_TIME_BUDGET', '0.6'))
+# settings the app reads at import, with placeholders used when they are not set (nothing is contacted at import)
+PLACEHOLDER_ENV = {
+    'AUTH0_CLIENT_ID': 'check-startup',
+    'AUTH0_CLIENT_SECRET': 'check-startup',
+    'AUTH0_DOMAIN': 'auth0.invalid',
+    'SECRET_KEY': 'check-startup',
+}
+
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(module: str = 'app') -> Tuple[float, Dict[str, float], List[str]]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple[float, Dict[str, float], List[str]]: The cumulative import time of the module
+            in seconds, the cumulative time of each of its direct imports and the heavy modules loaded.
+    """
+    env = {**PLACEHOLDER_ENV, **{key: value for key, value in os.environ.items() if key != 'OPENAI_API_KEY'}}
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True
+    )
+    if res.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{res.stderr[-2000:]}")
+
+    # imports are listed after the modules they import, indented two spaces per level,
+    # so the direct imports of a top-level import are the second level entries since the previous one
+    total, direct, children = 0.0, {}, {}
+    for line in res.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+        depth, seconds = len(match.group(3)), int(match.group(2)) / 1e6
+        if depth == 1:
+            if match.group(4) == module:
+                total, direct = seconds, children
+            children = {}
+        elif depth == 3:
+            children[match.group(4)] = seconds
+    loaded = [name for name in res.stdout.strip().split(',') if name]
+    return total, direct, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time and dependencies of the web app')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='Maximum import time in seconds')
+    parser.add_argument('--module', default='app', help='Module to import')
+    args = parser.parse_args()
+
+    total, direct, loaded = measure(args.module)
+    for name, seconds in sorted(direct.items(), key=lambda item: -item[1])[:10]:
+        print(f"{seconds * 1000:8.1f}ms  {name}")
+    print(f"import {args.module}: {total:.3f}s (budget {args.budget:.3f}s)")
+
+    failed = False
+    if total > args.budget:
+        print(f"FAIL: import took {total:.3f}s, over the budget of {args.budget:.3f}s")
+        failed = True
+    if loaded:
+        print(f"FAIL: heavy modules loaded at import: {', '.join(loaded)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Circuit breaker around the LLM API.
+
+When the API has an incident, every call would otherwise wait out its timeout,
+tying up worker threads for requests that fail anyway. The breaker tracks the
+outcomes of the latest calls and opens once too many of them failed (timeouts,
+connection errors and server errors) or were slow. While it is open, calls fail
+immediately with CircuitOpen, which the translation pipeline answers with
+degraded local results (see translate_eng2ovp). After a while the breaker lets
+a single probe call through (half-open): if it succeeds the breaker closes,
+otherwise it stays open for another period. Each worker process has its own
+breaker. Configured with env variables:
+
+    LLM_BREAKER_WINDOW          number of latest calls the failure rate is computed over (default: 20)
+    LLM_BREAKER_MIN_CALLS       calls in the window before the breaker can open (default: 5)
+    LLM_BREAKER_FAILURE_RATE    fraction of failed or slow calls that opens the breaker (default: 0.5)
+    LLM_BREAKER_SLOW_SECONDS    calls taking longer count as failed (default: 8)
+    LLM_BREAKER_OPEN_SECONDS    seconds the breaker stays open before a probe (default: 30)
+"""
+import collections
+import contextlib
+import logging
+import os
+import threading
+import time
+from typing import Deque, Iterator, Optional, Tuple
+
+import metrics
+
+LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', '20'))
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '5'))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5'))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv('LLM_BREAKER_SLOW_SECONDS', '8'))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv('LLM_BREAKER_OPEN_SECONDS', '30'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of making a call while the breaker is open."""
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """Whether an exception means the API is unavailable (rather than e.g. rejecting a bad request)."""
+    import openai
+    return isinstance(exc, (TimeoutError, openai.APIConnectionError, openai.InternalServerError))
+
+
+class CircuitBreaker:
+    """Fail calls fast while a backend is failing or slow, probing for recovery."""
+    def __init__(self,
+                 name: str,
+                 window: int = LLM_BREAKER_WINDOW,
+                 min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 failure_rate: float = LLM_BREAKER_FAILURE_RATE,
+                 slow_seconds: float = LLM_BREAKER_SLOW_SECONDS,
+                 open_seconds: float = LLM_BREAKER_OPEN_SECONDS):
+        """
+        Args:
+            name (str): Name of the backend (in logs, errors and metrics).
+            window (int): Number of latest calls the failure rate is computed over.
+            min_calls (int): Calls in the window before the breaker can open.
+            failure_rate (float): Fraction of failed or slow calls that opens the breaker.
+            slow_seconds (float): Calls taking longer count as failed.
+            open_seconds (float): Seconds the breaker stays open before a probe call is let through.
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = collections.deque(maxlen=window) # True for failed calls
+        self._opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        if state == OPEN:
+            self._opened = time.monotonic()
+            logging.warning(f"Circuit breaker {self.name} opened, failing calls fast for {self.open_seconds:.0f}s")
+        elif state == CLOSED:
+            self._outcomes.clear()
+            logging.info(f"Circuit breaker {self.name} closed")
+        self.state = state
+        metrics.CIRCUIT_BREAKER.inc(breaker=self.name, event=state)
+
+    def _acquire(self) -> Tuple[bool, bool]:
+        # (allowed, whether the call is the half-open probe)
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True, False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True, True
+            return False, False
+
+    def _record(self, failed: Optional[bool], probe: bool) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+                if failed is not None:
+                    self._set_state(OPEN if failed else CLOSED)
+                return
+            if failed is None or self.state != CLOSED:
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and sum(self._outcomes) >= self.failure_rate * len(self._outcomes):
+                self._set_state(OPEN)
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Record the outcome of the call made in the block.
+
+        Raises:
+            CircuitOpen: Instead of running the block while the breaker is open.
+        """
+        allowed, probe = self._acquire()
+        if not allowed:
+            metrics.CIRCUIT_BREAKER.inc(breaker=self.name, event='rejected')
+            raise CircuitOpen(f"Circuit breaker {self.name} is open, the backend is unavailable")
+        start = time.perf_counter()
+        failed: Optional[bool] = None # not counted either way
+        try:
+            yield
+        except Exception as exc:
+            if not is_upstream_failure(exc):
+                failed = False # the backend answered (e.g. rejected the request)
+            elif metrics.is_timeout(exc):
+                # shorter timeouts come from the request's deadline rather than the backend
+                failed = True if time.perf_counter() - start >= self.slow_seconds else None
+            else:
+                failed = True
+            raise
+        else:
+            failed = time.perf_counter() - start > self.slow_seconds
+        finally:
+            self._record(failed, probe)
+
+
+llm_breaker = CircuitBreaker('llm')
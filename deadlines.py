@@ -0,0 +1,174 @@
+"""End-to-end deadlines for requests through the translation pipeline.
+
+A request's deadline is a context variable (use_deadline), so the stages and
+LLM calls of the request, including those run on threads started with
+contextvars.copy_context().run (batch workers), all see it. Each LLM call is
+given the time left as its timeout (capped at LLM_TIMEOUT) and is not started
+once less than MIN_LLM_TIMEOUT is left, which fails the request with
+DeadlineExceeded instead of spending tokens on a response nobody waits for.
+Optional stages check has_time_for with the expected duration of their work
+(a moving average of recent durations, see expected) and are skipped when it
+does not fit. Calls made with call_llm are retried after transient failures
+(instead of by the SDK, which would give every try the full timeout) as long
+as the time left covers another try. Configured with env variables:
+
+    LLM_TIMEOUT             maximum seconds per LLM call (default: 10)
+    MIN_LLM_TIMEOUT         seconds left below which no LLM call is started (default: 1)
+    EXPECTED_DURATION       initial estimate of an LLM call's duration in seconds (default: 2)
+    LLM_MAX_RETRIES         retries of an LLM call after transient failures (default: 2)
+    LLM_RETRY_BACKOFF       seconds before the first retry, doubled for every further one (default: 0.5)
+"""
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+import metrics
+
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '10'))
+MIN_LLM_TIMEOUT = float(os.getenv('MIN_LLM_TIMEOUT', '1'))
+EXPECTED_DURATION = float(os.getenv('EXPECTED_DURATION', '2'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))
+# weight of the latest duration in the moving averages
+SMOOTHING = 0.2
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('deadline', default=None)
+_expected: Dict[str, float] = {}
+_expected_lock = threading.Lock()
+
+T = TypeVar('T')
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request runs out of time before (or during) a required step."""
+
+
+def from_now(seconds: Optional[float]) -> Optional[float]:
+    """The deadline (on the time.monotonic clock) a number of seconds from now (None for no deadline)."""
+    return None if seconds is None else time.monotonic() + seconds
+
+
+@contextlib.contextmanager
+def use_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """Set the deadline (see from_now) of the work done in this context.
+
+    Within another deadline, the earlier of the two applies.
+    """
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline (None if there is none)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def has_time_for(seconds: float) -> bool:
+    """Whether work expected to take a number of seconds fits before the deadline."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def expected(name: str) -> float:
+    """The expected duration in seconds of an operation (e.g. an LLM call by its function name)."""
+    return _expected.get(name, EXPECTED_DURATION)
+
+
+def observe(name: str, seconds: float) -> None:
+    """Update the expected duration of an operation with one that just completed."""
+    with _expected_lock:
+        _expected[name] = (1 - SMOOTHING) * _expected.get(name, seconds) + SMOOTHING * seconds
+
+
+@contextlib.contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Observe the duration of the block (if it succeeds) as an operation's expected duration."""
+    start = time.perf_counter()
+    yield
+    observe(name, time.perf_counter() - start)
+
+
+def skip(stage: str) -> None:
+    """Count an optional stage skipped because the deadline was near."""
+    metrics.DEADLINE_EXCEEDED.inc(stage=stage, outcome='skipped')
+
+
+@contextlib.contextmanager
+def llm_call(name: str) -> Iterator[float]:
+    """Get the timeout of an LLM call made in the block from the time left.
+
+    Raises:
+        DeadlineExceeded: If too little time is left to start the call, or the call timed out at the deadline.
+    """
+    left = remaining()
+    if left is not None and left < MIN_LLM_TIMEOUT:
+        metrics.DEADLINE_EXCEEDED.inc(stage=name, outcome='failed')
+        raise DeadlineExceeded(f"Out of time before {name} ({max(left, 0):.1f}s left)")
+    timeout = LLM_TIMEOUT if left is None else min(LLM_TIMEOUT, left)
+    start = time.perf_counter()
+    try:
+        yield timeout
+    except Exception as exc:
+        if timeout < LLM_TIMEOUT and metrics.is_timeout(exc) and not isinstance(exc, DeadlineExceeded):
+            metrics.DEADLINE_EXCEEDED.inc(stage=name, outcome='failed')
+            raise DeadlineExceeded(f"Out of time during {name}") from exc
+        raise
+    observe(name, time.perf_counter() - start)
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a failed LLM call may succeed if it is made again (rate limits, server and connection errors)."""
+    import openai
+    # APITimeoutError is an APIConnectionError, timeouts at the deadline are DeadlineExceeded
+    return isinstance(exc, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError))
+
+
+def retry_delay(exc: BaseException, retry: int) -> float:
+    """Seconds to wait before a retry, as asked by the API (Retry-After) or with exponential backoff."""
+    response = getattr(exc, 'response', None)
+    try:
+        return min(float(response.headers['retry-after']), LLM_TIMEOUT)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return LLM_RETRY_BACKOFF * 2 ** retry
+
+
+def call_llm(name: str, call: Callable[[float], T]) -> T:
+    """Make an LLM call with the timeout of llm_call, retrying it after transient failures.
+
+    A call is retried at most LLM_MAX_RETRIES times, and only while the time left
+    covers the wait before the retry and the expected duration of the call (at least
+    MIN_LLM_TIMEOUT, below which llm_call would not start it).
+
+    Args:
+        name (str): The name of the operation (see llm_call and expected).
+        call (Callable[[float], T]): Makes the call with the given timeout in seconds.
+
+    Returns:
+        T: The result of call.
+
+    Raises:
+        DeadlineExceeded: See llm_call.
+    """
+    retry = 0
+    while True:
+        try:
+            with llm_call(name) as timeout:
+                return call(timeout)
+        except Exception as exc:
+            delay = retry_delay(exc, retry)
+            if retry >= LLM_MAX_RETRIES or not is_transient(exc) or not has_time_for(delay + max(expected(name), MIN_LLM_TIMEOUT)):
+                raise
+            logging.warning(f"{name} failed ({type(exc).__name__}: {exc}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            retry += 1
@@ -0,0 +1,106 @@
+"""Precomputed embedding matrix for mapping unknown English words onto the nearest known gloss."""
+import hashlib
+import logging
+import pathlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+thisdir = pathlib.Path(__file__).parent.absolute()
+
+
+class GlossEmbeddings:
+    """An on-disk cached matrix of unit-length embeddings, one row per English gloss.
+
+    Each gloss belongs to one or more categories (e.g. 'noun', 'transitive'),
+    so a lookup can be restricted to the glosses that fit a sentence slot.
+    The matrix is built lazily on first use and stored under
+    .results/gloss-embeddings, keyed by the model name and the gloss list.
+    """
+    def __init__(self,
+                 categories: Dict[str, Iterable[str]],
+                 embed: Callable[[List[str]], np.ndarray],
+                 model: str,
+                 savedir: Optional[pathlib.Path] = None):
+        self.glosses: List[str] = sorted({gloss for glosses in categories.values() for gloss in glosses})
+        self.masks: Dict[str, np.ndarray] = {
+            category: np.isin(self.glosses, list(glosses))
+            for category, glosses in categories.items()
+        }
+        self.embed = embed
+        self.model = model
+        self.savedir = savedir or thisdir / '.results' / 'gloss-embeddings'
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> pathlib.Path:
+        glosses_id = hashlib.md5("\n".join(self.glosses).encode()).hexdigest()
+        return self.savedir / f"{self.model.replace('/', '--')}-{glosses_id}.npy"
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The (num_glosses, dim) embedding matrix, loaded from disk or built on first access."""
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._matrix = self._load_or_build()
+        return self._matrix
+
+    def load(self) -> bool:
+        """Load the matrix if it was built before, without building it.
+
+        Returns:
+            bool: Whether the matrix is loaded.
+        """
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None and self.path.exists():
+                    self._matrix = np.load(self.path)
+        return self._matrix is not None
+
+    def _load_or_build(self) -> np.ndarray:
+        try:
+            return np.load(self.path)
+        except FileNotFoundError:
+            pass
+        logging.info(f"Building gloss embedding matrix ({len(self.glosses)} glosses) at {self.path}")
+        matrix = np.asarray(self.embed(self.glosses), dtype=np.float32)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(self.path, matrix)
+        return matrix
+
+    def nearest(self,
+                words: List[str],
+                categories: List[List[str]],
+                k: int = 1) -> List[List[Tuple[str, float]]]:
+        """Find the k nearest glosses for each word with a single matrix product.
+
+        Args:
+            words (List[str]): The English words to look up.
+            categories (List[List[str]]): For each word, the categories its match may come from.
+            k (int): The number of matches to return per word.
+
+        Returns:
+            List[List[Tuple[str, float]]]: For each word, up to k (gloss, similarity) pairs,
+                best first. Similarities are scaled to the 0-1 range like the
+                semantic_similarity_* functions in segment.
+        """
+        if not words:
+            return []
+        vectors = np.asarray(self.embed(words), dtype=np.float32)
+        similarities = (vectors @ self.matrix.T + 1) / 2
+        allowed = np.array([
+            np.logical_or.reduce([self.masks[category] for category in word_categories])
+            for word_categories in categories
+        ])
+        similarities = np.where(allowed, similarities, -np.inf)
+
+        k = min(k, len(self.glosses))
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for row, indices in zip(similarities, top):
+            indices = indices[np.argsort(-row[indices])]
+            results.append([(self.glosses[i], float(row[i])) for i in indices if np.isfinite(row[i])])
+        return results
@@ -0,0 +1,49 @@
+"""Gunicorn configuration for the web app.
+
+The translator routes spend several seconds waiting on sequential OpenAI calls.
+With gunicorn's default sync workers each of those requests pins a whole
+worker process, so a handful of concurrent translations starve the fast
+builder routes. Threaded (gthread) workers instead park the waiting request on
+a thread (the GIL is released while it waits on the network) and keep
+serving other requests from the same process. The CPU-bound builder routes
+are sub-millisecond, so sharing a process between threads does not slow
+them down noticeably.
+
+All settings can be overridden with env variables:
+
+    WEB_CONCURRENCY         number of worker processes (default: 2)
+    GUNICORN_WORKER_CLASS   gthread (default), sync (previous behaviour) or
+                            gevent (requires `pip install gevent`)
+    GUNICORN_THREADS        threads per gthread worker (default: 16)
+    GUNICORN_TIMEOUT        seconds before a silent worker is restarted (default: 60)
+
+Each worker warms up (loads the similarity model, fills caches) on a background
+thread after it boots, see warmup.py. /api/readyz fails until all workers are warm.
+
+Compare serving modes with loadtest.py (see Readme.md).
+"""
+import os
+
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# gunicorn silently turns sync workers into gthread workers when threads > 1
+threads = int(os.getenv('GUNICORN_THREADS', '16')) if worker_class == 'gthread' else 1
+# gevent workers multiplex requests on greenlets instead of threads
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '100'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    # drop the metrics snapshots of the previous run's workers
+    import metrics
+    import warmup
+    metrics.clear()
+    warmup.clear()
+
+
+def post_worker_init(worker):
+    # the app (and its warm-up steps) is loaded at this point
+    import warmup
+    warmup.start(workers=worker.cfg.workers)
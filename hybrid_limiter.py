@@ -0,0 +1,155 @@
+"""Rate limiting with per-worker token buckets, reconciled with a shared store in the background.
+
+Checking a shared store (e.g. Redis) on every request adds a network round-trip
+to handlers that otherwise take well under a millisecond. A LocalLimiter instead
+checks a token bucket in the worker's memory, and a background thread
+periodically adds the hits counted since the last sync to a shared counter per
+key. The increase of that counter caused by other workers is then deducted from
+the local bucket, so all workers together approximately respect the limit
+(overshooting by at most one sync interval's worth of requests). If the store
+is unreachable, the buckets keep working on their own and syncing resumes once
+it recovers.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import limits
+from limits.storage import Storage, storage_from_string
+
+# shared counters only need to outlive the gaps between syncs
+COUNTER_EXPIRY = 60
+
+
+class Bucket:
+    """Token bucket state (and sync bookkeeping) for one key."""
+    __slots__ = ('tokens', 'updated', 'pending', 'seen_total')
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.pending = 0 # hits since the last sync
+        self.seen_total: Optional[int] = None # shared counter value after the last sync
+
+
+class LocalLimiter:
+    """Token bucket limiter kept in this process and reconciled with a shared store."""
+    def __init__(self,
+                 limit: str,
+                 storage_uri: Optional[str] = None,
+                 storage_options: Optional[Dict[str, Any]] = None,
+                 sync_interval: float = 1.0,
+                 name: str = 'local'):
+        """
+        Args:
+            limit (str): The limit per key, e.g. "10/second" (a bucket of 10 tokens refilled at 10 per second).
+            storage_uri (Optional[str]): limits storage URI of the shared store (e.g. redis://...). None keeps the limit local.
+            storage_options (Optional[Dict[str, Any]]): Options passed to the storage (e.g. socket timeouts).
+            sync_interval (float): Seconds between syncs with the shared store.
+            name (str): Prefix of the shared counters.
+        """
+        item = limits.parse(limit)
+        self.capacity = float(item.amount)
+        self.rate = item.amount / item.get_expiry()
+        self.storage_uri = storage_uri
+        self.storage_options = storage_options or {}
+        self.sync_interval = sync_interval
+        self.name = name
+        self.storage_ok = True
+        self._storage: Optional[Storage] = None
+        self._buckets: Dict[str, Bucket] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._idle = self.capacity / self.rate + sync_interval # seconds after which an unused bucket is full again
+        self._pruned = time.monotonic()
+
+    def _refill(self, bucket: Bucket, now: float) -> None:
+        bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+
+    def _prune(self, now: float) -> None:
+        # drop buckets that are full again (and have nothing left to sync)
+        for key in [key for key, bucket in self._buckets.items() if not bucket.pending and now - bucket.updated > self._idle]:
+            del self._buckets[key]
+        self._pruned = now
+
+    def hit(self, key: str, cost: int = 1) -> bool:
+        """Take cost tokens from the key's bucket.
+
+        Returns:
+            bool: False (and nothing is taken) if the bucket does not have enough tokens.
+        """
+        if self.storage_uri and self._thread is None:
+            self._start()
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned > self._idle:
+                self._prune(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = Bucket(self.capacity, now)
+            else:
+                self._refill(bucket, now)
+            if bucket.tokens < cost:
+                return False
+            bucket.tokens -= cost
+            if self.storage_uri:
+                bucket.pending += cost
+            return True
+
+    def _start(self) -> None:
+        # started on first use, i.e. in each worker process after forking
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-sync', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as exc:
+                if self.storage_ok:
+                    logging.warning(f"Rate limit store unreachable, limiting locally only: {exc}")
+                self.storage_ok = False
+                self._storage = None # reconnect on the next sync
+                with self._lock: # hits made while the store is down are not shared
+                    for bucket in self._buckets.values():
+                        bucket.pending = 0
+            else:
+                if not self.storage_ok:
+                    logging.info("Rate limit store recovered")
+                self.storage_ok = True
+
+    def sync(self) -> None:
+        """Add local hits to the shared counters and deduct other workers' hits from the local buckets."""
+        if self._storage is None:
+            self._storage = storage_from_string(self.storage_uri, **self.storage_options)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            pending = {key: bucket.pending for key, bucket in self._buckets.items()}
+        totals = {
+            key: self._storage.incr(f'{self.name}/{key}', COUNTER_EXPIRY, amount=amount)
+            for key, amount in pending.items()
+        }
+        now = time.monotonic()
+        with self._lock:
+            for key, total in totals.items():
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                bucket.pending -= pending[key]
+                if bucket.seen_total is None: # first sync, older hits are already accounted for
+                    start = total - pending[key]
+                elif total < bucket.seen_total + pending[key]: # the counter expired and started over
+                    start = 0
+                else:
+                    start = bucket.seen_total
+                others = max(0, total - start - pending[key])
+                bucket.seen_total = total
+                if others:
+                    self._refill(bucket, now)
+                    bucket.tokens = max(0.0, bucket.tokens - others)
@@ -0,0 +1,152 @@
+"""Bounded background job queue with results stored in a local SQLite database.
+
+Jobs run on a thread pool in the process that accepted them, while their
+status and results are written to SQLite. Any worker process on the same host
+can therefore answer a poll for any job.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue already holds max_pending jobs."""
+
+
+class JobQueue:
+    """Run jobs in the background and keep their results for a limited time.
+
+    Submitting a payload identical to one that is still pending or running
+    returns the existing job instead of starting a new one. Jobs run in a copy
+    of the submitter's context variables (e.g. the selected LLM client).
+    """
+    def __init__(self,
+                 path: pathlib.Path,
+                 func: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 workers: int = 4,
+                 max_pending: int = 100,
+                 ttl: float = 600,
+                 timeout: float = 300):
+        """
+        Args:
+            path (pathlib.Path): The SQLite database file.
+            func (Callable[[Dict[str, Any]], Dict[str, Any]]): Maps a job payload to its (JSON-serializable) result.
+            workers (int): Maximum number of jobs running at once in this process.
+            max_pending (int): Maximum number of unfinished jobs in this process.
+            ttl (float): Seconds finished jobs are kept before they expire.
+            timeout (float): Seconds after which an unfinished job is considered lost (e.g. its worker died).
+        """
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.func = func
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._num_pending = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, key TEXT, status TEXT, payload TEXT, result TEXT, error TEXT, '
+                'created REAL, finished REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def payload_key(payload: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def submit(self, payload: Dict[str, Any]) -> Tuple[str, bool]:
+        """Submit a job.
+
+        Args:
+            payload (Dict[str, Any]): The (JSON-serializable) job payload.
+
+        Returns:
+            Tuple[str, bool]: The job ID and whether a new job was created (False if an
+                identical job was already pending or running).
+        """
+        key = self.payload_key(payload)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?', (now - self.ttl,))
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) AND created > ?',
+                (key, PENDING, RUNNING, now - self.timeout)
+            ).fetchone()
+            if row is not None:
+                return row['id'], False
+            if self._num_pending >= self.max_pending:
+                raise QueueFull(f"Too many pending jobs ({self._num_pending})")
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO jobs (id, key, status, payload, created) VALUES (?, ?, ?, ?, ?)',
+                (job_id, key, PENDING, json.dumps(payload), now)
+            )
+            self._num_pending += 1
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, payload)
+        return job_id, True
+
+    def _run(self, job_id: str, payload: Dict[str, Any]) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute('UPDATE jobs SET status = ? WHERE id = ?', (RUNNING, job_id))
+            try:
+                result = self.func(payload)
+            except Exception as exc:
+                logging.exception(exc)
+                update = (FAILED, None, str(exc), time.time(), job_id)
+            else:
+                update = (DONE, json.dumps(result), None, time.time(), job_id)
+            with self._connect() as conn:
+                conn.execute('UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?', update)
+        finally:
+            with self._lock:
+                self._num_pending -= 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status of a job (None if it does not exist or has expired)."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row['finished'] is not None and row['finished'] < now - self.ttl:
+            return None
+        job = {'job_id': row['id'], 'status': row['status']}
+        if row['status'] == DONE:
+            job['result'] = json.loads(row['result'])
+        elif row['status'] == FAILED:
+            job['error'] = row['error']
+        elif row['created'] < now - self.timeout:
+            job.update(status=FAILED, error='Job timed out')
+        return job
+
+    def wait(self, job_id: str, timeout: float, interval: float = 0.25) -> Optional[Dict[str, Any]]:
+        """Get the status of a job, waiting up to timeout seconds for it to finish."""
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+        while job is not None and job['status'] in (PENDING, RUNNING) and time.time() < deadline:
+            time.sleep(interval)
+            job = self.get(job_id)
+        return job
@@ -0,0 +1,72 @@
+"""Build JSON responses from cached, pre-encoded fragments.
+
+The builder routes return mostly the same word details and choice lists on
+every request. Encoding those once and splicing the cached text into each
+response avoids re-encoding them per request. The output is byte-for-byte
+what flask.jsonify produces (sorted keys, compact separators, ASCII escapes).
+orjson, if installed, is used to encode new fragments when its output is
+identical (i.e. ASCII-only).
+"""
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any
+
+from flask import Response, current_app
+
+try:
+    import orjson
+except ImportError: # optional
+    orjson = None
+
+
+class Fragment(str):
+    """Already encoded JSON, inserted into the output as it is."""
+
+
+def _dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            encoded = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+        else:
+            if encoded.isascii():
+                return encoded.decode('ascii')
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+
+def fragment(obj: Any) -> Fragment:
+    """Encode a value as a JSON fragment (cache the result to reuse it)."""
+    return Fragment(_dumps(obj))
+
+
+def dumps(obj: Any) -> str:
+    """Encode a value that may contain fragments."""
+    if isinstance(obj, Fragment):
+        return obj
+    if isinstance(obj, str):
+        return encode_basestring_ascii(obj)
+    if obj is None:
+        return 'null'
+    if isinstance(obj, dict):
+        return '{' + ','.join(
+            f"{encode_basestring_ascii(key)}:{dumps(value)}" for key, value in sorted(obj.items())
+        ) + '}'
+    if isinstance(obj, (list, tuple)):
+        return '[' + ','.join(map(dumps, obj)) + ']'
+    return _dumps(obj)
+
+
+def response(**fields: Any) -> Response:
+    """Like flask.jsonify(**fields), but fields may contain fragments."""
+    return encoded_response(dumps(fields))
+
+
+def encoded_response(text: str) -> Response:
+    """Response with an already encoded JSON body (e.g. a cached dumps result)."""
+    provider = current_app.json
+    compact = provider.compact or (provider.compact is None and not current_app.debug)
+    if not (compact and provider.sort_keys and provider.ensure_ascii):
+        # output is configured differently, re-encode it with the app's provider
+        return provider.response(json.loads(text))
+    return current_app.response_class(f"{text}\n", mimetype=provider.mimetype)
@@ -0,0 +1,253 @@
+"""Reverse lexicon index for resolving inflected or misspelled English words to known glosses."""
+import functools
+import pathlib
+from typing import Callable, Collection, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+thisdir = pathlib.Path(__file__).parent.absolute()
+
+IRREGULAR_NOUNS = {
+    'children': 'child',
+    'feet': 'foot',
+    'geese': 'goose',
+    'men': 'man',
+    'mice': 'mouse',
+    'people': 'person',
+    'teeth': 'tooth',
+    'women': 'woman',
+    'fishes': 'fish',
+}
+
+IRREGULAR_VERBS = {
+    'ate': 'eat', 'eaten': 'eat',
+    'saw': 'see', 'seen': 'see',
+    'drank': 'drink', 'drunk': 'drink',
+    'heard': 'hear',
+    'smelt': 'smell',
+    'found': 'find',
+    'read': 'read',
+    'wrote': 'write', 'written': 'write',
+    'sat': 'sit',
+    'slept': 'sleep',
+    'ran': 'run',
+    'went': 'go', 'gone': 'go', 'goes': 'go',
+    'stood': 'stand',
+    'lay': 'lie', 'lain': 'lie', 'lying': 'lie',
+    'fell': 'fall', 'fallen': 'fall',
+    'sang': 'sing', 'sung': 'sing',
+    'flew': 'fly', 'flown': 'fly', 'flies': 'fly',
+    'swam': 'swim', 'swum': 'swim',
+    'spoke': 'speak', 'spoken': 'speak',
+}
+
+# different words with the same meaning (reported as substitutions, see LexiconIndex.match)
+VERB_SYNONYMS = {
+    'speak': 'talk',
+}
+NOUN_SYNONYMS = {
+    'weasel': 'weasle', # the vocabulary's spelling
+}
+
+VOWELS = set('aeiou')
+
+
+@functools.lru_cache(maxsize=None)
+def english_words() -> FrozenSet[str]:
+    """Common English words (base forms) from data/english_words.txt."""
+    with (thisdir / 'data' / 'english_words.txt').open(encoding='utf-8') as f:
+        return frozenset(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+
+def noun_candidates(word: str) -> List[str]:
+    """Candidate lemmas for an English noun, most likely first.
+
+    Args:
+        word (str): A lowercase English noun.
+
+    Returns:
+        List[str]: The word itself followed by possible singular forms.
+    """
+    candidates = [word]
+    if word in IRREGULAR_NOUNS:
+        candidates.append(IRREGULAR_NOUNS[word])
+    if word.endswith('ies') and len(word) > 4:
+        candidates.append(word[:-3] + 'y')
+    if word.endswith('ves') and len(word) > 4:
+        candidates.extend([word[:-3] + 'f', word[:-3] + 'fe'])
+    if word.endswith('es') and len(word) > 3:
+        candidates.append(word[:-2])
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 2:
+        candidates.append(word[:-1])
+    return candidates
+
+
+def verb_candidates(word: str) -> List[str]:
+    """Candidate lemmas for an English verb, most likely first.
+
+    Phrasal verbs (e.g. "talked to") are lemmatized on their first word only.
+
+    Args:
+        word (str): A lowercase English verb.
+
+    Returns:
+        List[str]: The word itself followed by possible infinitive forms.
+    """
+    head, sep, rest = word.partition(' ')
+    candidates = [head]
+    if head in IRREGULAR_VERBS:
+        candidates.append(IRREGULAR_VERBS[head])
+    for suffix in ('ing', 'ed'):
+        if head.endswith(suffix) and len(head) > len(suffix) + 1:
+            stem = head[:-len(suffix)]
+            candidates.append(stem)
+            candidates.append(stem + 'e')
+            if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in VOWELS:
+                candidates.append(stem[:-1]) # running -> run, chatted -> chat
+            if suffix == 'ed' and stem.endswith('i'):
+                candidates.append(stem[:-1] + 'y') # cried -> cry
+    if head.endswith('ies') and len(head) > 4:
+        candidates.append(head[:-3] + 'y')
+    if head.endswith('es') and len(head) > 3:
+        candidates.append(head[:-2])
+    if head.endswith('s') and not head.endswith('ss') and len(head) > 2:
+        candidates.append(head[:-1])
+    return [f"{candidate}{sep}{rest}" for candidate in candidates]
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Compute the edit distance between two strings, counting adjacent transpositions as one edit."""
+    rows = [list(range(len(b) + 1))]
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            row[j] = min(
+                rows[i - 1][j] + 1,
+                row[j - 1] + 1,
+                rows[i - 1][j - 1] + (a[i - 1] != b[j - 1])
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], rows[i - 2][j - 2] + 1)
+        rows.append(row)
+    return rows[-1][-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree for nearest-neighbour lookups under edit distance."""
+    def __init__(self, words: Iterable[str]):
+        self.root: Optional[Tuple[str, Dict[int, Tuple]]] = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            node_word, children = node
+            distance = edit_distance(word, node_word)
+            if distance == 0:
+                return
+            if distance not in children:
+                children[distance] = (word, {})
+                return
+            node = children[distance]
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Find all words within max_distance of word, closest first."""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node_word, children = stack.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                matches.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+
+class LexiconIndex:
+    """Resolve English words to the glosses of a vocabulary.
+
+    Lookups try an exact match, then lemmatized candidates, then synonyms of
+    the candidates, then a fuzzy match over the glosses. Only words that are
+    not known English words (in any lemmatized form) are fuzzy matched, so
+    e.g. "hose" is not taken for a misspelling of "horse", and fuzzy matches
+    must share the first letter of the word (typos rarely hit the first
+    letter). Synonym and fuzzy matches replace the word with a different one,
+    so match reports them.
+    Results are memoized, so repeated lookups are a single dict access.
+    """
+    def __init__(self,
+                 glosses: Iterable[str],
+                 lemmatize: Callable[[str], List[str]],
+                 synonyms: Optional[Dict[str, str]] = None,
+                 known_words: Collection[str] = frozenset(),
+                 min_fuzzy_length: int = 4,
+                 max_cache_size: int = 10000):
+        self.glosses = set(glosses)
+        self.lemmatize = lemmatize
+        self.synonyms = synonyms or {}
+        self.known_words = known_words
+        self.min_fuzzy_length = min_fuzzy_length
+        self.max_cache_size = max_cache_size
+        self.tree = BKTree(sorted(self.glosses))
+        self._cache: Dict[str, Optional[Tuple[str, str]]] = {}
+
+    def max_distance(self, word: str) -> int:
+        if len(word) < self.min_fuzzy_length:
+            return 0
+        return 1 if len(word) < 8 else 2
+
+    def _match(self, word: str) -> Optional[Tuple[str, str]]:
+        candidates = self.lemmatize(word)
+        for candidate in candidates:
+            if candidate in self.glosses:
+                return candidate, 'exact' if candidate == word else 'lemma'
+        for candidate in candidates:
+            head, sep, rest = candidate.partition(' ')
+            synonym = f"{self.synonyms[head]}{sep}{rest}" if head in self.synonyms else None
+            if synonym in self.glosses:
+                return synonym, 'synonym'
+        # a correctly spelled word that is not in the vocabulary has no match
+        max_distance = self.max_distance(word)
+        if max_distance == 0 or any(candidate in self.known_words for candidate in candidates):
+            return None
+        for _, match in self.tree.search(word, max_distance):
+            if match[0] == word[0]:
+                return match, 'fuzzy'
+        return None
+
+    def match(self, word: Optional[str]) -> Optional[Tuple[str, str]]:
+        """Resolve a word to a known gloss, with how it was matched.
+
+        Args:
+            word (Optional[str]): An English word (any case/whitespace).
+
+        Returns:
+            Optional[Tuple[str, str]]: The matching gloss and how it matched: 'exact', 'lemma'
+                (an inflected form), 'synonym' or 'fuzzy' (a likely misspelling). None if there is no match.
+        """
+        if not word:
+            return None
+        word = word.strip().lower()
+        if word not in self._cache:
+            if len(self._cache) >= self.max_cache_size:
+                self._cache.clear()
+            self._cache[word] = self._match(word)
+        return self._cache[word]
+
+    def resolve(self, word: Optional[str]) -> Optional[str]:
+        """Resolve a word to a known gloss (see match).
+
+        Returns:
+            Optional[str]: The matching gloss, or None if there is no match.
+        """
+        match = self.match(word)
+        return match[0] if match else None
+
+    def __contains__(self, word: str) -> bool:
+        return self.resolve(word) is not None
@@ -0,0 +1,109 @@
+"""OpenAI clients shared across requests: one default client and a pool of per-user clients.
+
+Each client keeps its own HTTP connection pool, so reusing them keeps connections
+alive between requests. The client used by segment and translate_ovp2eng is
+selected per request (or job) with use_client, e.g. a client built from the
+user's own API key, and defaults to the shared client otherwise. Configured
+with env variables:
+
+    OPENAI_API_KEY          API key of the default client.
+    LLM_CLIENT_POOL_SIZE    maximum number of per-user clients kept (least recently used are dropped).
+"""
+import contextlib
+import contextvars
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import dotenv
+
+if TYPE_CHECKING: # the SDK is imported on first use, it is slow to import
+    import openai
+
+dotenv.load_dotenv()
+
+LLM_CLIENT_POOL_SIZE = int(os.getenv('LLM_CLIENT_POOL_SIZE', '64'))
+
+_default_client: Optional["openai.OpenAI"] = None
+_default_client_lock = threading.Lock()
+_current_client: contextvars.ContextVar[Optional["openai.OpenAI"]] = contextvars.ContextVar('llm_client', default=None)
+
+
+def make_client(api_key: Optional[str] = None) -> "openai.OpenAI":
+    """Create an OpenAI client (routed through the LLM cassette, if enabled).
+
+    The client does not retry itself: the timeout of an LLM call is the time left until the
+    request's deadline, which the SDK would give to each retry. Calls are retried within
+    the deadline by deadlines.call_llm instead.
+    """
+    import openai
+    import cassette
+    return openai.OpenAI(api_key=api_key, max_retries=0, http_client=cassette.http_client())
+
+
+def default_client() -> "openai.OpenAI":
+    """The shared client for the app's own API key, created on first use."""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = make_client(os.getenv('OPENAI_API_KEY'))
+    return _default_client
+
+
+def get_client() -> "openai.OpenAI":
+    """The client selected for the current request (see use_client), or the default client."""
+    return _current_client.get() or default_client()
+
+
+@contextlib.contextmanager
+def use_client(client: Optional["openai.OpenAI"]) -> Iterator[None]:
+    """Use a client for the LLM calls made in this context (None selects the default client).
+
+    Threads started with contextvars.copy_context().run inherit the selection.
+    """
+    token = _current_client.set(client)
+    try:
+        yield
+    finally:
+        _current_client.reset(token)
+
+
+class ClientPool:
+    """Bounded pool of clients keyed by API key, evicting the least recently used."""
+    def __init__(self, max_size: int = LLM_CLIENT_POOL_SIZE):
+        """
+        Args:
+            max_size (int): Maximum number of clients kept open.
+        """
+        self.max_size = max_size
+        self._clients: "OrderedDict[str, openai.OpenAI]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(api_key: str) -> str:
+        # keep the keys themselves out of the pool
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    def get(self, api_key: str) -> "openai.OpenAI":
+        """Get the client for an API key, creating it if it is not pooled."""
+        key = self._key(api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+            client = make_client(api_key)
+            self._clients[key] = client
+            if len(self._clients) > self.max_size:
+                # not closed here, in-flight requests may still use it (its pool closes once it is garbage collected)
+                self._clients.popitem(last=False)
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+user_clients = ClientPool()
@@ -0,0 +1,83 @@
+"""Simple closed-loop load test for comparing serving configurations.
+
+Runs a number of concurrent clients against a running server, each sending
+requests back-to-back, and reports latency percentiles and throughput per route.
+Mixing slow translator requests with fast builder requests shows whether the
+slow routes starve the fast ones.
+
+Example (run the server with rate limits disabled, e.g. RATELIMIT_ENABLED=false):
+    python loadtest.py http://localhost:8000 --translate-clients 8 --builder-clients 8 --duration 30
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import time
+from typing import Dict, List
+import urllib.error
+import urllib.request
+
+ROUTES = {
+    'translate': ('/api/translator/translate', {'english': 'The dog ate the apples.'}),
+    'choices': ('/api/builder/choices', {'subject_noun': 'pugu', 'subject_suffix': 'ii', 'verb': 'tüka'}),
+}
+
+
+def request(base_url: str, route: str) -> bool:
+    path, payload = ROUTES[route]
+    req = urllib.request.Request(
+        base_url.rstrip('/') + path,
+        data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=120) as res:
+            res.read()
+            return res.status == 200
+    except (urllib.error.URLError, TimeoutError):
+        return False
+
+
+def client(base_url: str, route: str, deadline: float, results: Dict[str, List], lock: threading.Lock) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        ok = request(base_url, route)
+        latency = time.perf_counter() - start
+        with lock:
+            results[route].append((latency, ok))
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the translator and builder routes')
+    parser.add_argument('base_url', help='Base URL of the running server')
+    parser.add_argument('--translate-clients', type=int, default=8, help='Concurrent clients calling the translator')
+    parser.add_argument('--builder-clients', type=int, default=8, help='Concurrent clients calling /api/builder/choices')
+    parser.add_argument('--duration', type=float, default=30, help='Duration of the test in seconds')
+    args = parser.parse_args()
+
+    results = {route: [] for route in ROUTES}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    clients = [('translate', args.translate_clients), ('choices', args.builder_clients)]
+    with ThreadPoolExecutor(max_workers=args.translate_clients + args.builder_clients) as executor:
+        for route, num in clients:
+            for _ in range(num):
+                executor.submit(client, args.base_url, route, deadline, results, lock)
+
+    print(f"{'route':<10} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8}")
+    for route, rows in results.items():
+        latencies = [latency for latency, _ in rows]
+        errors = sum(1 for _, ok in rows if not ok)
+        print(
+            f"{route:<10} {len(rows):>8} {errors:>6} {len(rows) / args.duration:>7.1f} "
+            f"{percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.95):>8.3f} {percentile(latencies, 0.99):>8.3f}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""In-process metrics (counters and histograms) exposed in the Prometheus text format.
+
+Recording a value only takes a lock and a dict update, so metrics are always on.
+With several worker processes, each one periodically writes a snapshot of its
+metrics to METRICS_DIR, and the worker answering a scrape merges the snapshots
+of all workers (its own is always fresh, the others are at most
+METRICS_FLUSH_INTERVAL seconds old). Snapshots of exited workers are kept, so
+counters do not go backwards when gunicorn replaces a worker. Configured with
+env variables:
+
+    METRICS_DIR             directory of the per-process snapshots (default: .results/metrics).
+                            Empty reports this process only.
+    METRICS_FLUSH_INTERVAL  seconds between snapshots (default: 5)
+"""
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+thisdir = pathlib.Path(__file__).parent.absolute()
+
+METRICS_DIR = os.getenv('METRICS_DIR', str(thisdir / '.results' / 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds, from sub-millisecond builder routes to multi-second translations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_registry: List["Metric"] = []
+_caches: Dict[str, Callable] = {}
+_flusher_pid: Optional[int] = None
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Metric:
+    """A metric with a value per combination of label values."""
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, Any] = {}
+        _registry.append(self)
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_flusher()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+        _ensure_flusher()
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+LLM_REQUESTS = Counter('llm_requests_total', 'LLM API calls by calling function, model and status (ok, timeout or error).')
+LLM_DURATION = Histogram('llm_request_duration_seconds', 'LLM API call latency by calling function and model.')
+LLM_TOKENS = Counter('llm_tokens_total', 'LLM tokens used by model and type (prompt or completion).')
+EMBEDDING_DURATION = Histogram('embedding_duration_seconds', 'Time to compute sentence embeddings by backend.')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result (hit or miss).')
+DEADLINE_EXCEEDED = Counter('deadline_exceeded_total', 'Pipeline stages hit by the request deadline by stage and outcome (skipped or failed).')
+CIRCUIT_BREAKER = Counter('circuit_breaker_events_total', 'Circuit breaker state changes and rejected calls by breaker and event (open, half_open, closed or rejected).')
+HTTP_DURATION = Histogram('http_request_duration_seconds', 'Request latency by route, method and status.')
+
+
+def register_cache(name: str, func: Callable) -> None:
+    """Report the hits and misses of a functools.lru_cache function in cache_requests_total."""
+    _caches[name] = func
+
+
+def is_timeout(exc: BaseException) -> bool:
+    import openai
+    return isinstance(exc, (openai.APITimeoutError, TimeoutError))
+
+
+@contextlib.contextmanager
+def llm_call(function: str, model: str) -> Iterator[None]:
+    """Count and time an LLM API call made in the block."""
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except BaseException as exc:
+        status = 'timeout' if is_timeout(exc) else 'error'
+        raise
+    finally:
+        LLM_DURATION.observe(time.perf_counter() - start, function=function, model=model)
+        LLM_REQUESTS.inc(function=function, model=model, status=status)
+
+
+def record_usage(model: str, usage: Any) -> None:
+    """Count the tokens of an API response's usage (if it has any)."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, model=model, type='prompt')
+    LLM_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, model=model, type='completion')
+
+
+def snapshot() -> Dict[str, Any]:
+    """The metrics of this process as a JSON-serializable dict."""
+    with _lock:
+        data = {
+            metric.name: [[list(key), value] for key, value in metric._values.items()]
+            for metric in _registry
+        }
+    caches = data[CACHE_REQUESTS.name]
+    for name, func in list(_caches.items()):
+        info = func.cache_info()
+        caches.append([[['cache', name], ['result', 'hit']], info.hits])
+        caches.append([[['cache', name], ['result', 'miss']], info.misses])
+    return data
+
+
+def _snapshot_path(pid: int) -> pathlib.Path:
+    return pathlib.Path(METRICS_DIR) / f'{pid}.json'
+
+
+def flush() -> None:
+    """Write this process's snapshot to METRICS_DIR."""
+    path = _snapshot_path(os.getpid())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(snapshot()), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _run_flusher() -> None:
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as exc:
+            logging.warning(f"Failed to write metrics snapshot: {exc}")
+
+
+def _ensure_flusher() -> None:
+    # one flusher per process, started on first use (i.e. after gunicorn forks the worker)
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_run_flusher, name='metrics-flush', daemon=True).start()
+
+
+def clear() -> None:
+    """Remove all snapshots (e.g. when the server starts)."""
+    if METRICS_DIR:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def collect() -> Dict[str, Dict[LabelKey, Any]]:
+    """Merge the snapshots of all processes (with a fresh one of this process)."""
+    snapshots = [snapshot()]
+    if METRICS_DIR:
+        own_path = _snapshot_path(os.getpid())
+        for path in pathlib.Path(METRICS_DIR).glob('*.json'):
+            if path == own_path:
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError) as exc: # e.g. removed by clear()
+                logging.warning(f"Skipping metrics snapshot {path}: {exc}")
+
+    merged = {metric.name: {} for metric in _registry}
+    for data in snapshots:
+        for metric in _registry:
+            values = merged[metric.name]
+            for key, value in data.get(metric.name, []):
+                key = tuple(map(tuple, key))
+                if metric.type == 'histogram':
+                    state = values.setdefault(key, [[0] * len(metric.buckets), 0.0, 0])
+                    state[0] = [a + b for a, b in zip(state[0], value[0])]
+                    state[1] += value[1]
+                    state[2] += value[2]
+                else:
+                    values[key] = values.get(key, 0) + value
+    return merged
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    labels = key + extra
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def render() -> str:
+    """Render the merged metrics of all processes in the Prometheus text format."""
+    merged = collect()
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for key, value in sorted(merged[metric.name].items()):
+            if metric.type == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric.name}_bucket{_format_labels(key, (("le", repr(float(bound))),))} {cumulative}')
+                lines.append(f'{metric.name}_bucket{_format_labels(key, (("le", "+Inf"),))} {count}')
+                lines.append(f'{metric.name}_sum{_format_labels(key)} {total}')
+                lines.append(f'{metric.name}_count{_format_labels(key)} {count}')
+            else:
+                lines.append(f'{metric.name}{_format_labels(key)} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,168 @@
+"""On-demand profiling of a live worker process.
+
+Nothing is hooked in while no profile is running. Profiles are written in the
+collapsed ("folded") stack format, one "frame;frame;...;frame count" line per
+stack, which flamegraph.pl, speedscope and inferno render as flame graphs.
+
+    cpu_profile     samples the stacks of the process's threads for a few seconds
+    memory_profile  traces allocations for a few seconds and reports the growth
+                    per allocation stack (a tracemalloc snapshot diff)
+    Sampler         samples selected threads, e.g. the one handling a request
+                    (its profile is kept with save_profile)
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Counter, Iterable, Optional, Set
+
+MAX_PROFILE_SECONDS = 30
+DEFAULT_INTERVAL = 0.005
+MIN_INTERVAL = 0.001
+MEMORY_TRACEBACK_LIMIT = 32
+MAX_SAVED_PROFILES = 20
+
+# leaf functions of threads that are waiting rather than running
+IDLE_FUNCTIONS = {'wait', 'select', 'poll', 'accept', 'sleep', '_wait_for_tstate_lock', 'get', 'recv_into', 'readinto'}
+
+# one cpu or memory profile at a time per process
+_lock = threading.Lock()
+_saved: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+_saved_lock = threading.Lock()
+
+
+class ProfileBusy(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, root: str) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.append(root)
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Sample the stacks of threads on a background thread."""
+    def __init__(self,
+                 interval: float = DEFAULT_INTERVAL,
+                 thread_ids: Optional[Iterable[int]] = None,
+                 exclude_ids: Iterable[int] = (),
+                 include_idle: bool = False):
+        """
+        Args:
+            interval (float): Seconds between samples.
+            thread_ids (Optional[Iterable[int]]): The threads to sample (default: all but the sampler).
+            exclude_ids (Iterable[int]): Threads not to sample.
+            include_idle (bool): Keep samples of threads waiting in IDLE_FUNCTIONS (wall-clock instead of CPU profile).
+        """
+        self.interval = interval
+        self.thread_ids: Optional[Set[int]] = set(thread_ids) if thread_ids is not None else None
+        self.exclude_ids = set(exclude_ids)
+        self.include_idle = include_idle
+        self.counts: Counter[str] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        self.exclude_ids.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self.exclude_ids or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                if not self.include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                self.counts[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            self.samples += 1
+
+
+def render_collapsed(counts: Counter[str]) -> str:
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common() if count > 0)
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    # NaN (e.g. from a ?seconds=nan query) becomes low
+    return min(value, high) if value >= low else low
+
+
+def _acquire() -> None:
+    if not _lock.acquire(blocking=False):
+        raise ProfileBusy("Another profile is running in this worker")
+
+
+def cpu_profile(seconds: float, interval: float = DEFAULT_INTERVAL, include_idle: bool = False) -> str:
+    """Sample all other threads for a few seconds (between 0 and MAX_PROFILE_SECONDS).
+
+    Returns:
+        str: The sampled stacks in the collapsed format (weights are sample counts).
+    """
+    _acquire()
+    try:
+        # the calling thread only waits, leave it out
+        sampler = Sampler(_clamp(interval, MIN_INTERVAL, MAX_PROFILE_SECONDS), exclude_ids=[threading.get_ident()], include_idle=include_idle).start()
+        time.sleep(_clamp(seconds, 0, MAX_PROFILE_SECONDS))
+        return render_collapsed(sampler.stop())
+    finally:
+        _lock.release()
+
+
+def memory_profile(seconds: float, limit: int = MEMORY_TRACEBACK_LIMIT) -> str:
+    """Trace allocations for a few seconds (between 0 and MAX_PROFILE_SECONDS) and diff snapshots.
+
+    Returns:
+        str: The allocation stacks whose memory grew, in the collapsed format (weights are bytes).
+    """
+    _acquire()
+    started = not tracemalloc.is_tracing()
+    try:
+        if started:
+            tracemalloc.start(limit)
+        before = tracemalloc.take_snapshot()
+        time.sleep(_clamp(seconds, 0, MAX_PROFILE_SECONDS))
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+        _lock.release()
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after, before = after.filter_traces(ignored), before.filter_traces(ignored)
+    counts: Counter[str] = collections.Counter()
+    for stat in after.compare_to(before, 'traceback'):
+        if stat.size_diff > 0:
+            stack = ';'.join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback)
+            counts[stack] += stat.size_diff
+    return render_collapsed(counts)
+
+
+def save_profile(profile: str) -> str:
+    """Keep a profile (the latest MAX_SAVED_PROFILES are kept) and return its ID."""
+    profile_id = uuid.uuid4().hex
+    with _saved_lock:
+        _saved[profile_id] = profile
+        while len(_saved) > MAX_SAVED_PROFILES:
+            _saved.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    return _saved.get(profile_id)
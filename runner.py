@@ -0,0 +1,117 @@
+"""Bounded, resumable parallel task runner backed by an append-only JSONL results store."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import logging
+import pathlib
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class ResultStore:
+    """Append-only JSONL store of results keyed by a tuple of strings.
+
+    Each line is {"key": [...], "result": {...}}. Later lines win if a key is
+    written twice, so a partially written run can always be resumed by just
+    reopening the file.
+    """
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple, Dict[str, Any]] = {}
+        if self.path.exists():
+            with self.path.open(encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError: # truncated last line from an interrupted run
+                        continue
+                    self._results[tuple(row['key'])] = row['result']
+
+    def __contains__(self, key: Tuple) -> bool:
+        return tuple(key) in self._results
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Tuple, default: Any = None) -> Optional[Dict[str, Any]]:
+        return self._results.get(tuple(key), default)
+
+    def items(self) -> List[Tuple[Tuple, Dict[str, Any]]]:
+        with self._lock:
+            return list(self._results.items())
+
+    def append(self, key: Tuple, result: Dict[str, Any]) -> None:
+        line = json.dumps({'key': list(key), 'result': result}, ensure_ascii=False)
+        with self._lock:
+            with self.path.open('a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self._results[tuple(key)] = result
+
+
+def retry(func: Callable[[], Any],
+          max_tries: int = 5,
+          backoff: float = 1.0,
+          max_backoff: float = 60.0) -> Any:
+    """Call func until it succeeds, sleeping with jittered exponential backoff between tries.
+
+    Args:
+        func (Callable[[], Any]): The function to call.
+        max_tries (int): Maximum number of calls before the last exception is re-raised.
+        backoff (float): Initial backoff in seconds (doubled after every failure).
+        max_backoff (float): Upper bound on the backoff in seconds.
+
+    Returns:
+        Any: The return value of func.
+    """
+    for try_num in range(1, max_tries + 1):
+        try:
+            return func()
+        except Exception as exc:
+            if try_num >= max_tries:
+                raise
+            delay = min(max_backoff, backoff * 2 ** (try_num - 1)) * random.uniform(0.5, 1.0)
+            logging.warning(f"Exception occurred ({exc}) - try {try_num}/{max_tries}, retrying in {delay:0.1f}s")
+            time.sleep(delay)
+
+
+def run_tasks(tasks: Iterable[Tuple[Tuple, Callable[[], Dict[str, Any]]]],
+              store: ResultStore,
+              workers: int = 4,
+              max_tries: int = 5,
+              backoff: float = 1.0) -> Iterator[Tuple[Tuple, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """Run keyed tasks on a bounded thread pool, skipping keys already in the store.
+
+    Results are appended to the store as soon as each task finishes. Tasks that
+    still fail after max_tries are reported but not stored, so they are retried
+    the next time the same tasks are run.
+
+    Args:
+        tasks (Iterable[Tuple[Tuple, Callable[[], Dict[str, Any]]]]): (key, func) pairs.
+        store (ResultStore): Where to read completed keys from and write results to.
+        workers (int): Maximum number of tasks running at once.
+        max_tries (int): Tries per task (see retry).
+        backoff (float): Initial retry backoff in seconds (see retry).
+
+    Yields:
+        Tuple[Tuple, Optional[Dict[str, Any]], Optional[Exception]]: (key, result, error)
+            for every task that was run, in completion order.
+    """
+    pending = [(tuple(key), func) for key, func in tasks if tuple(key) not in store]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(retry, func, max_tries=max_tries, backoff=backoff): key
+            for key, func in pending
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:
+                logging.error(f"Task {key} failed after {max_tries} tries: {exc}")
+                yield key, None, exc
+                continue
+            store.append(key, result)
+            yield key, result, None
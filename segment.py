@@ -4,15 +4,20 @@ import hashlib
 import json
 import os
 import pathlib
+import threading
 from typing import Callable, Dict, List, Optional, TYPE_CHECKING
 
 import dotenv
 import numpy as np
-import openai
+from openai.types import CreateEmbeddingResponse
 from openai.types.chat import ChatCompletion
-import pandas as pd
-import numpy as np
-import rbo
+
+import cassette
+import circuit_breaker
+import deadlines
+import llm_clients
+import metrics
+import tracing
 
 if TYPE_CHECKING:
     from sentence_transformers import SentenceTransformer
@@ -21,7 +26,7 @@ dotenv.load_dotenv()
 
 thisdir = pathlib.Path(__file__).parent.absolute()
 
-oai_client = openai.Client(api_key=os.environ['OPENAI_API_KEY'])
+cassette.install()
 
 nlp = None
 @functools.lru_cache(maxsize=1000)
@@ -93,7 +98,17 @@ def semantic_similarity_sentence_transforms_all_combinations(sentences: List[str
 
 tf_tokenizer = None
 tf_model = None
-def semantic_similarity_transformers_all_combinations(sentences: List[str], model: str) -> np.ndarray:
+tf_lock = threading.Lock() # threaded workers must not load the model twice
+def get_transformers_embeddings(sentences: List[str], model: str) -> np.ndarray:
+    """Compute L2-normalized mean-pooled sentence embeddings with a HuggingFace model.
+
+    Args:
+        sentences (List[str]): The sentences to embed.
+        model (str): The HuggingFace model name.
+
+    Returns:
+        np.ndarray: A (len(sentences), dim) array of unit-length embeddings.
+    """
     global tf_tokenizer, tf_model
     from transformers import AutoTokenizer, AutoModel
     import torch
@@ -106,27 +121,34 @@ def semantic_similarity_transformers_all_combinations(sentences: List[str], mode
         return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
 
     # Load model from HuggingFace Hub
-    if tf_tokenizer is None:
-        tf_tokenizer = AutoTokenizer.from_pretrained(model)
-    if tf_model is None:
-        tf_model = AutoModel.from_pretrained(model)
+    if tf_tokenizer is None or tf_model is None:
+        with tf_lock, tracing.span('load_model', model=model):
+            if tf_tokenizer is None:
+                tf_tokenizer = AutoTokenizer.from_pretrained(model)
+            if tf_model is None:
+                tf_model = AutoModel.from_pretrained(model)
 
-    # Tokenize sentences
-    encoded_input = tf_tokenizer(sentences, padding=True, truncation=True, return_tensors='pt')
+    with tracing.span('embeddings', backend='transformers', sentences=len(sentences)), \
+         metrics.EMBEDDING_DURATION.time(backend='transformers'):
+        # Tokenize sentences
+        encoded_input = tf_tokenizer(sentences, padding=True, truncation=True, return_tensors='pt')
 
-    # Compute token embeddings
-    with torch.no_grad():
-        model_output = tf_model(**encoded_input)
+        # Compute token embeddings
+        with torch.no_grad():
+            model_output = tf_model(**encoded_input)
 
-    # Perform pooling
-    sentence_embeddings = mean_pooling(model_output, encoded_input['attention_mask'])
+        # Perform pooling
+        sentence_embeddings = mean_pooling(model_output, encoded_input['attention_mask'])
 
-    # Normalize embeddings
-    sentence_embeddings = F.normalize(sentence_embeddings, p=2, dim=1)
+        # Normalize embeddings
+        sentence_embeddings = F.normalize(sentence_embeddings, p=2, dim=1)
+        return sentence_embeddings.cpu().numpy()
 
-    # Compute cosine similarity
-    similarities = F.cosine_similarity(sentence_embeddings.unsqueeze(1), sentence_embeddings.unsqueeze(0), dim=2)
-    similarities = similarities.cpu().numpy()
+def semantic_similarity_transformers_all_combinations(sentences: List[str], model: str) -> np.ndarray:
+    embeddings = get_transformers_embeddings(sentences, model)
+
+    # Compute cosine similarity (embeddings are unit length)
+    similarities = embeddings @ embeddings.T
     # scale to 0-1 range
     similarities = (similarities + 1) / 2
     return similarities
@@ -150,12 +172,20 @@ def _get_openai_embeddings(model: str, *sentences: str) -> Dict[str, np.ndarray]
             pass
 
     new_sentences = [s for s in sentences if s not in embeddings]
+    metrics.CACHE_REQUESTS.inc(len(sentences) - len(new_sentences), cache='openai_embeddings', result='hit')
+    metrics.CACHE_REQUESTS.inc(len(new_sentences), cache='openai_embeddings', result='miss')
     if new_sentences:
-        res = openai.embeddings.create(
-            input=new_sentences,
-            model=model,
-            encoding_format="float"
-        )
+        def create(timeout: float) -> CreateEmbeddingResponse:
+            with circuit_breaker.llm_breaker.guard(), metrics.llm_call('embeddings', model):
+                return llm_clients.get_client().embeddings.create(
+                    input=new_sentences,
+                    model=model,
+                    encoding_format="float",
+                    timeout=timeout
+                )
+        with tracing.span('embeddings', backend='openai', sentences=len(new_sentences)), metrics.EMBEDDING_DURATION.time(backend='openai'):
+            res = deadlines.call_llm('embeddings', create)
+        metrics.record_usage(model, res.usage)
         # save embeddings to disk
         for sentence, embedding in zip(new_sentences, res.data):
             emb  = np.array(embedding.embedding)
@@ -166,6 +196,12 @@ def _get_openai_embeddings(model: str, *sentences: str) -> Dict[str, np.ndarray]
 
     return embeddings
 
+def get_openai_embedding_matrix(sentences: List[str], model: str) -> np.ndarray:
+    """Get L2-normalized OpenAI embeddings (cached on disk) as a (len(sentences), dim) array."""
+    embeddings = _get_openai_embeddings(model, *sentences)
+    matrix = np.array([embeddings[s] for s in sentences])
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
 def semantic_similarity_openai(sentence1: str, sentence2: str, model: str) -> float:
     from sentence_transformers import util
     embeddings = _get_openai_embeddings(model, sentence1, sentence2)
@@ -313,14 +349,19 @@ def split_sentence(sentence: str, model: str = None, res_callback: Optional[Call
         },
         {'role': 'user', 'content': sentence},
     ]
-    response = openai.chat.completions.create(
-        model=model,
-        messages=messages,
-        functions=functions,
-        function_call={'name': 'set_sentences'},
-        temperature=0.0,
-        timeout=10,
-    )
+    def create(timeout: float) -> ChatCompletion:
+        with circuit_breaker.llm_breaker.guard(), metrics.llm_call('split_sentence', model):
+            return llm_clients.get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                functions=functions,
+                function_call={'name': 'set_sentences'},
+                temperature=0.0,
+                timeout=timeout,
+            )
+    with tracing.span('split_sentence', model=model):
+        response = deadlines.call_llm('split_sentence', create)
+    metrics.record_usage(model, response.usage)
     if res_callback:
         res_callback(response)
     response_message = response.choices[0].message
@@ -416,14 +457,19 @@ def make_sentence(sentence: Dict, model: str = None, res_callback: Optional[Call
             'content': json.dumps(sentence)
         }
     ]
-    response = openai.chat.completions.create(
-        model=model,
-        messages=messages,
-        functions=functions,
-        function_call={'name': 'make_sentence'},
-        temperature=0.0,
-        timeout=10,
-    )
+    def create(timeout: float) -> ChatCompletion:
+        with circuit_breaker.llm_breaker.guard(), metrics.llm_call('make_sentence', model):
+            return llm_clients.get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                functions=functions,
+                function_call={'name': 'make_sentence'},
+                temperature=0.0,
+                timeout=timeout,
+            )
+    with tracing.span('make_sentence', model=model):
+        response = deadlines.call_llm('make_sentence', create)
+    metrics.record_usage(model, response.usage)
     if res_callback:
         res_callback(response)
     response_message = response.choices[0].message
@@ -461,6 +507,8 @@ def avg_displacement(truth: np.ndarray, arr: np.ndarray) -> float:
     return np.mean(np.abs(np.argsort(truth) - np.argsort(arr)))    
 
 def test_similarity():
+    import pandas as pd
+    import rbo
     sentences = json.loads((thisdir / 'data' / 'semantic_sentences.json').read_text())
     similarity_funcs = {
         "spacy": semantic_similarity_spacy,
@@ -1,5 +1,7 @@
 
 
+import functools
+import hashlib
 from itertools import starmap
 import json
 import logging
@@ -7,7 +9,6 @@ import pathlib
 import random
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-import pandas as pd
 
 
 NOUNS = {
@@ -85,7 +86,7 @@ class Subject:
         else:
             return f"{self.noun}-{self.subject_suffix}"
         
-    @property
+    @functools.cached_property
     def details(self) -> Dict:
         data = {
             'type': 'subject',
@@ -210,7 +211,7 @@ class Verb:
     def is_transitive(self) -> bool:
         return self.verb_stem in Verb.TRANSIITIVE_VERBS
     
-    @property
+    @functools.cached_property
     def details(self) -> Dict:
         data = {
             'type': 'verb',
@@ -241,6 +242,11 @@ class Object:
         'eika': 'proximal',
         'oka': 'distal',
     }
+    # suffix forms used after nouns that do not end in a glottal stop
+    SUFFIXES_AFTER_VOWEL = {
+        'eika': 'neika',
+        'oka': 'noka',
+    }
     PRONOUNS = {
         'i': 'me',
         'u': 'him/her/it (distal)',
@@ -267,10 +273,7 @@ class Object:
     def __str__(self) -> str:
         object_suffix = self.object_suffix
         if "'" not in self.noun[-2:]: # noun does not end in glottal stop
-            if object_suffix == 'eika':
-                object_suffix = 'neika'
-            elif object_suffix == 'oka':
-                object_suffix = 'noka'
+            object_suffix = self.SUFFIXES_AFTER_VOWEL.get(object_suffix, object_suffix)
         return f"{self.noun}-{object_suffix}"
     
     @classmethod
@@ -323,7 +326,7 @@ class Object:
         else:
             raise ValueError(f"Object suffix must be one of {self.SUFFIXES}")
         
-    @property
+    @functools.cached_property
     def details(self) -> Dict:
         data = {
             'type': 'object',
@@ -342,6 +345,8 @@ class Object:
         })
         return data
 
+# get_all_choices and format_sentence are mirrored in static/js/grammar.js (driven by
+# get_grammar_bundle), so rule changes here must be made there too
 def get_all_choices(subject_noun: Optional[str],
                     subject_suffix: Optional[str],
                     verb: Optional[str],
@@ -505,15 +510,28 @@ def get_all_choices(subject_noun: Optional[str],
 
     return choices
 
-def format_sentence(subject_noun: Optional[str],
-                    subject_suffix: Optional[str],
-                    verb: Optional[str],
-                    verb_tense: Optional[str],
-                    object_pronoun: Optional[str],
-                    object_noun: Optional[str],
-                    object_suffix: Optional[str]) -> List[Dict]:
-    subject = Subject(subject_noun, subject_suffix)
-    _verb = Verb(verb, verb_tense, object_pronoun)
+@functools.lru_cache(maxsize=4096)
+def get_subject(noun: str, subject_suffix: Optional[str]) -> Subject:
+    return Subject(noun, subject_suffix)
+
+@functools.lru_cache(maxsize=4096)
+def get_verb(verb_stem: str, tense_suffix: str, object_pronoun_prefix: Optional[str]) -> Verb:
+    return Verb(verb_stem, tense_suffix, object_pronoun_prefix)
+
+@functools.lru_cache(maxsize=4096)
+def get_object(noun: str, object_suffix: Optional[str]) -> Object:
+    return Object(noun, object_suffix)
+
+def get_sentence_words(subject_noun: Optional[str],
+                       subject_suffix: Optional[str],
+                       verb: Optional[str],
+                       verb_tense: Optional[str],
+                       object_pronoun: Optional[str],
+                       object_noun: Optional[str],
+                       object_suffix: Optional[str]) -> List[Any]:
+    """Get the (cached and shared) words of a sentence in Paiute word order."""
+    subject = get_subject(subject_noun, subject_suffix)
+    _verb = get_verb(verb, verb_tense, object_pronoun)
 
     # check object_pronoun and object_suffix match
     if object_suffix is not None:
@@ -522,7 +540,7 @@ def format_sentence(subject_noun: Optional[str],
 
     object = None
     try:
-        object = Object(object_noun, object_suffix)
+        object = get_object(object_noun, object_suffix)
     except ValueError as e: # could not create object
         if object_noun is not None:
             raise e
@@ -531,15 +549,128 @@ def format_sentence(subject_noun: Optional[str],
     
     if subject.noun in Subject.PRONOUNS:
         if object:
-            return [object.details, subject.details, _verb.details]
+            return [object, subject, _verb]
         else:
-            return [_verb.details, subject.details]
+            return [_verb, subject]
     else:
         if object:
-            return [subject.details, object.details, _verb.details]
+            return [subject, object, _verb]
         else:
-             return [subject.details, _verb.details]
-        
+             return [subject, _verb]
+
+def format_sentence(subject_noun: Optional[str],
+                    subject_suffix: Optional[str],
+                    verb: Optional[str],
+                    verb_tense: Optional[str],
+                    object_pronoun: Optional[str],
+                    object_noun: Optional[str],
+                    object_suffix: Optional[str]) -> List[Dict]:
+    """Build the details of each word of a sentence (in Paiute word order).
+
+    Words (and their details) are cached and shared between sentences, so the
+    returned dictionaries must not be modified.
+    """
+    words = get_sentence_words(subject_noun, subject_suffix, verb, verb_tense, object_pronoun, object_noun, object_suffix)
+    return [word.details for word in words]
+
+SENTENCE_KEYS = (
+    'subject_noun', 'subject_suffix', 'verb', 'verb_tense',
+    'object_pronoun', 'object_noun', 'object_suffix'
+)
+CODE_SEPARATOR = '|'
+
+def encode_sentence(**selection: Optional[str]) -> str:
+    """Encode a word selection as a compact sentence code.
+
+    The code is the values of SENTENCE_KEYS joined by CODE_SEPARATOR, with unselected
+    words left empty (e.g. "isha'pugu|ii|tüka|ku|a|aaponu'|eika" or "nüü||poyoha|dü|||").
+    """
+    return CODE_SEPARATOR.join(selection.get(key) or '' for key in SENTENCE_KEYS)
+
+def decode_sentence(code: str) -> Dict[str, Optional[str]]:
+    """Decode a sentence code (see encode_sentence) into a word selection."""
+    values = code.split(CODE_SEPARATOR)
+    if len(values) != len(SENTENCE_KEYS):
+        raise ValueError(f"Sentence code must have {len(SENTENCE_KEYS)} fields separated by '{CODE_SEPARATOR}' (not {len(values)})")
+    return {key: value.strip() or None for key, value in zip(SENTENCE_KEYS, values)}
+
+def format_sentences(selections: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Format a batch of sentences.
+
+    Args:
+        selections (Iterable[Any]): Word selections (dictionaries with the SENTENCE_KEYS)
+            or sentence codes (see encode_sentence).
+
+    Returns:
+        List[Dict[str, Any]]: For each selection (in order) {'sentence': details} or, if it
+            could not be formatted, {'sentence': [], 'error': message}.
+    """
+    results = []
+    formatted: Dict[Tuple, Dict[str, Any]] = {}
+    for selection in selections:
+        try:
+            if isinstance(selection, str):
+                selection = decode_sentence(selection)
+            elif not isinstance(selection, dict):
+                raise ValueError("Sentence must be an object or a sentence code")
+            key = tuple(selection.get(k) or None for k in SENTENCE_KEYS)
+        except ValueError as e:
+            results.append({'sentence': [], 'error': str(e)})
+            continue
+        if key not in formatted:
+            try:
+                formatted[key] = {'sentence': format_sentence(*key)}
+            except Exception as e:
+                formatted[key] = {'sentence': [], 'error': str(e)}
+        results.append(formatted[key])
+    return results
+
+GRAMMAR_BUNDLE_FORMAT = 1
+
+@functools.lru_cache(maxsize=None)
+def get_grammar_bundle() -> Dict[str, Any]:
+    """Export the vocabulary and agreement tables the sentence builder rules run on.
+
+    static/js/grammar.js computes get_all_choices and format_sentence in the browser
+    from this bundle. Word lists are [word, definition] pairs in choice order.
+    The version is a hash of the contents, so it changes whenever the vocabulary does.
+
+    Returns:
+        Dict[str, Any]: The grammar bundle (JSON-serializable).
+    """
+    third_person_pronouns = Object.get_matching_third_person_pronouns(None)
+    bundle = {
+        'format': GRAMMAR_BUNDLE_FORMAT,
+        'keys': list(SENTENCE_KEYS),
+        'vocabulary': {
+            'nouns': list(NOUNS.items()),
+            'subject_pronouns': list(Subject.PRONOUNS.items()),
+            'subject_suffixes': list(Subject.SUFFIXES.items()),
+            'transitive_verbs': list(Verb.TRANSIITIVE_VERBS.items()),
+            'intransitive_verbs': list(Verb.INTRANSITIVE_VERBS.items()),
+            'tenses': list(Verb.TENSES.items()),
+            'object_pronouns': list(Object.PRONOUNS.items()),
+            'object_suffixes': list(Object.SUFFIXES.items()),
+        },
+        'agreement': {
+            # object pronouns allowed with an object noun, for each object suffix ('' for none)
+            'suffix_pronouns': {
+                '': third_person_pronouns,
+                **{suffix: Object.get_matching_third_person_pronouns(suffix) for suffix in Object.SUFFIXES}
+            },
+            # object suffix required by each object pronoun (None if it takes no object noun)
+            'pronoun_suffix': {pronoun: Object.get_matching_suffix(pronoun) for pronoun in Object.PRONOUNS},
+        },
+        'morphophonology': {
+            # first consonant of a verb stem after an object pronoun prefix
+            'lenis': LENIS_MAP,
+            # object suffixes after nouns that do not end in a glottal stop
+            'object_suffix_after_vowel': Object.SUFFIXES_AFTER_VOWEL,
+        },
+    }
+    content = json.dumps(bundle, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    bundle['version'] = hashlib.sha256(content).hexdigest()[:16]
+    return bundle
 
 def get_random_sentence(choices: Dict[str, Dict[str, Any]] = {}):
     if not choices:
@@ -146,33 +146,82 @@ function doUpdate(res) {
     }
 }
 
+// grammar bundle for computing choices locally (see grammar.js), null until loaded
+let grammar = null;
+
+function loadGrammar() {
+    return fetch($('#builder').data('grammar-url')).then(response => {
+        if (!response.ok) {
+            throw new Error(`Could not load grammar: ${response.status}`);
+        }
+        return response.json();
+    }).then(bundle => {
+        grammar = makeGrammar(bundle);
+    }).catch(err => {
+        console.error(err); // fall back to /api/builder/choices
+    });
+}
+
+function getSelection() {
+    return {
+        "subject_noun": $('#subject-noun').val(),
+        "subject_suffix": $('#subject-suffix').val(),
+        "verb": $('#verb').val(),
+        "verb_tense": $('#verb-tense').val(),
+        "object_pronoun": $('#object-pronoun').val(),
+        "object_noun": $('#object-noun').val(),
+        "object_suffix": $('#object-suffix').val()
+    }
+}
+
 function updateUI(url) {
+    const selection = getSelection();
+    if (url == '/api/builder/choices' && grammar !== null) {
+        let sentence = [];
+        try {
+            sentence = formatSentence(grammar, selection);
+        } catch (err) {
+            // not a complete sentence yet
+        }
+        doUpdate({choices: getAllChoices(grammar, selection), sentence: sentence});
+        return;
+    }
     fetch(url, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({
-            "subject_noun": $('#subject-noun').val(),
-            "subject_suffix": $('#subject-suffix').val(),
-            "verb": $('#verb').val(),
-            "verb_tense": $('#verb-tense').val(),
-            "object_pronoun": $('#object-pronoun').val(),
-            "object_noun": $('#object-noun').val(),
-            "object_suffix": $('#object-suffix').val()
-        })
+        body: JSON.stringify(selection)
     }).catch(err => {
         console.error(err);
     }).then(response => response.json()).then(res => doUpdate(res));
 }
 
-function startIntro() {
-    fetch('/api/builder/random-example', {
+// parse JSON embedded in the page by the builder view (null if missing)
+function readEmbedded(id) {
+    const element = document.getElementById(id);
+    return element && element.textContent.trim() ? JSON.parse(element.textContent) : null;
+}
+
+// the tour's example sentence, embedded in the page for the first tour
+let embeddedExample = readEmbedded('builder-example');
+
+function getExample() {
+    if (embeddedExample !== null) {
+        const example = embeddedExample;
+        embeddedExample = null;
+        return Promise.resolve(example);
+    }
+    return fetch('/api/builder/random-example', {
         method: 'GET',
         headers: {'Content-Type': 'application/json'}
     }).catch(err => {
         console.error(err);
-    }).then(response => response.json()).then(res => {
+    }).then(response => response.json());
+}
+
+function startIntro() {
+    getExample().then(res => {
         doUpdate(res);
 
         const subjectNoun = $('#subject-noun').val()
@@ -334,5 +383,11 @@ $(document).ready(function() {
       new bootstrap.Popover(el, opts);
     })
 
-    updateUI('/api/builder/choices')
+    const initialState = readEmbedded('builder-initial-state');
+    if (initialState !== null) {
+        doUpdate(initialState);
+        loadGrammar();
+    } else {
+        loadGrammar().then(() => updateUI('/api/builder/choices'))
+    }
 })
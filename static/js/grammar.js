@@ -0,0 +1,250 @@
+// Client-side port of sentence_builder.get_all_choices and sentence_builder.format_sentence.
+// All vocabulary and agreement tables come from the grammar bundle (/api/builder/grammar),
+// so only the rules themselves live here. Keep them in sync with sentence_builder.py.
+
+function makeGrammar(bundle) {
+    const vocab = bundle.vocabulary;
+    const toMap = pairs => new Map(pairs);
+    return {
+        version: bundle.version,
+        keys: bundle.keys,
+        vocab: vocab,
+        nouns: toMap(vocab.nouns),
+        subjectPronouns: toMap(vocab.subject_pronouns),
+        subjectSuffixes: toMap(vocab.subject_suffixes),
+        transitiveVerbs: toMap(vocab.transitive_verbs),
+        intransitiveVerbs: toMap(vocab.intransitive_verbs),
+        tenses: toMap(vocab.tenses),
+        objectPronouns: toMap(vocab.object_pronouns),
+        objectSuffixes: toMap(vocab.object_suffixes),
+        suffixPronouns: bundle.agreement.suffix_pronouns,
+        pronounSuffix: bundle.agreement.pronoun_suffix,
+        lenis: bundle.morphophonology.lenis,
+        objectSuffixAfterVowel: bundle.morphophonology.object_suffix_after_vowel
+    };
+}
+
+// selections use null for unselected words (like the API, empty strings count as unselected)
+function normalizeSelection(grammar, selection) {
+    const values = {};
+    grammar.keys.forEach(key => {
+        values[key] = selection[key] || null;
+    });
+    return values;
+}
+
+function toChoices(pairs) {
+    return pairs.map(([word, trans]) => [word, `${word}: ${trans}`]);
+}
+
+function getAllChoices(grammar, selection) {
+    const g = grammar;
+    let {subject_noun, subject_suffix, verb, verb_tense, object_pronoun, object_noun, object_suffix} = normalizeSelection(g, selection);
+    const choices = {};
+
+    // Validate inputs
+    if (!g.subjectPronouns.has(subject_noun) && !g.nouns.has(subject_noun)) subject_noun = null;
+    if (!g.subjectSuffixes.has(subject_suffix)) subject_suffix = null;
+    if (!g.transitiveVerbs.has(verb) && !g.intransitiveVerbs.has(verb)) verb = null;
+    if (!g.tenses.has(verb_tense)) verb_tense = null;
+    if (!g.objectPronouns.has(object_pronoun)) object_pronoun = null;
+    if (!g.nouns.has(object_noun)) object_noun = null;
+    if (!g.objectSuffixes.has(object_suffix)) object_suffix = null;
+
+    // Check object_pronoun and object_suffix match
+    if (object_pronoun !== null && object_suffix !== null) {
+        if (!g.suffixPronouns[object_suffix].includes(object_pronoun)) object_suffix = null;
+    }
+
+    // Subject
+    choices.subject_noun = {
+        choices: toChoices([...g.vocab.subject_pronouns, ...g.vocab.nouns]),
+        value: subject_noun,
+        requirement: "required"
+    };
+    if (subject_noun === null || g.subjectPronouns.has(subject_noun)) {
+        choices.subject_suffix = {choices: [], value: null, requirement: "disabled"};
+        subject_suffix = null;
+    } else {
+        choices.subject_suffix = {
+            choices: toChoices(g.vocab.subject_suffixes),
+            value: subject_suffix,
+            requirement: "required"
+        };
+    }
+
+    // Verb
+    if (object_noun !== null) { // verb must be transitive
+        if (!g.transitiveVerbs.has(verb)) verb = null;
+        choices.verb = {
+            choices: toChoices(g.vocab.transitive_verbs),
+            value: verb,
+            requirement: "required"
+        };
+    } else {
+        choices.verb = {
+            choices: toChoices([...g.vocab.transitive_verbs, ...g.vocab.intransitive_verbs]),
+            value: verb,
+            requirement: "required"
+        };
+    }
+
+    // Verb tense
+    if (verb === null) {
+        choices.verb_tense = {choices: [], value: null, requirement: "disabled"};
+        verb_tense = null;
+    } else {
+        choices.verb_tense = {
+            choices: toChoices(g.vocab.tenses),
+            value: verb_tense,
+            requirement: "required"
+        };
+    }
+
+    // Object pronoun
+    if (verb === null || g.intransitiveVerbs.has(verb)) {
+        choices.object_pronoun = {choices: [], value: null, requirement: "disabled"};
+        object_pronoun = null;
+    } else if (object_noun !== null) { // object pronoun must match object suffix
+        choices.object_pronoun = {
+            choices: g.suffixPronouns[object_suffix || ''].map(pronoun => [pronoun, `${pronoun}: ${g.objectPronouns.get(pronoun)}`]),
+            value: object_pronoun,
+            requirement: "required"
+        };
+    } else {
+        choices.object_pronoun = {
+            choices: toChoices(g.vocab.object_pronouns),
+            value: object_pronoun,
+            requirement: "optional"
+        };
+    }
+
+    // Object noun
+    if (g.intransitiveVerbs.has(verb) || (object_pronoun !== null && !g.suffixPronouns[''].includes(object_pronoun))) {
+        choices.object_noun = {choices: [], value: null, requirement: "disabled"};
+        object_noun = null;
+    } else { // verb is not selected or is transitive
+        choices.object_noun = {
+            choices: toChoices(g.vocab.nouns),
+            value: object_noun,
+            requirement: "required"
+        };
+    }
+
+    // Object suffix
+    if (object_noun === null) {
+        choices.object_suffix = {choices: [], value: null, requirement: "disabled"};
+        object_suffix = null;
+    } else if (object_pronoun !== null) {
+        const matchingSuffix = g.pronounSuffix[object_pronoun];
+        choices.object_suffix = {
+            choices: matchingSuffix === null ? [] : [[matchingSuffix, `${matchingSuffix}: ${g.objectSuffixes.get(matchingSuffix)}`]],
+            value: object_suffix !== matchingSuffix ? null : object_suffix,
+            requirement: "required"
+        };
+    } else {
+        choices.object_suffix = {
+            choices: toChoices(g.vocab.object_suffixes),
+            value: object_suffix,
+            requirement: "required"
+        };
+    }
+
+    return choices;
+}
+
+function lookup(map, key) {
+    if (!map.has(key)) {
+        throw new Error(`Unknown word: ${key}`);
+    }
+    return map.get(key);
+}
+
+function subjectDetails(g, noun, suffix) {
+    if (g.subjectPronouns.has(noun)) {
+        if (suffix !== null) throw new Error("Subject suffix is not allowed with pronouns");
+        return {
+            type: 'subject',
+            text: noun,
+            parts: [{type: 'pronoun', text: noun, definition: g.subjectPronouns.get(noun)}]
+        };
+    }
+    if (suffix === null) throw new Error("Subject suffix is required with non-pronoun subjects");
+    if (!g.subjectSuffixes.has(suffix)) throw new Error(`Invalid subject suffix: ${suffix}`);
+    return {
+        type: 'subject',
+        text: `${noun}-${suffix}`,
+        parts: [
+            {type: 'noun', text: noun, definition: lookup(g.nouns, noun)},
+            {type: 'subject_suffix', text: suffix, definition: g.subjectSuffixes.get(suffix)}
+        ]
+    };
+}
+
+function verbDetails(g, stem, tense, prefix) {
+    if (!g.tenses.has(tense)) throw new Error(`Invalid tense: ${tense}`);
+    const isTransitive = g.transitiveVerbs.has(stem);
+    if (!isTransitive && g.intransitiveVerbs.has(stem) && prefix !== null) {
+        throw new Error("Intransitive verbs cannot have object pronouns");
+    }
+    const parts = [];
+    let text = `${stem}-${tense}`;
+    if (prefix !== null) {
+        const lenisStem = stem !== null && stem[0] in g.lenis ? g.lenis[stem[0]] + stem.slice(1) : stem;
+        text = `${prefix}-${lenisStem}-${tense}`;
+        parts.push({type: 'object_pronoun', text: prefix, definition: lookup(g.objectPronouns, prefix)});
+    }
+    parts.push({
+        type: 'verb_stem',
+        text: stem,
+        definition: isTransitive ? g.transitiveVerbs.get(stem) : lookup(g.intransitiveVerbs, stem)
+    });
+    parts.push({type: 'tense', text: tense, definition: g.tenses.get(tense)});
+    return {type: 'verb', text: text, parts: parts};
+}
+
+function objectDetails(g, noun, suffix) {
+    const definition = lookup(g.nouns, noun);
+    let surfaceSuffix = suffix;
+    if (!noun.slice(-2).includes("'")) { // noun does not end in glottal stop
+        surfaceSuffix = g.objectSuffixAfterVowel[suffix] || suffix;
+    }
+    return {
+        type: 'object',
+        text: `${noun}-${surfaceSuffix}`,
+        parts: [
+            {type: 'noun', text: noun, definition: definition},
+            {type: 'object_suffix', text: suffix, definition: g.objectSuffixes.get(suffix)}
+        ]
+    };
+}
+
+// throws an Error for selections that do not form a valid sentence (like format_sentence)
+function formatSentence(grammar, selection) {
+    const g = grammar;
+    const {subject_noun, subject_suffix, verb, verb_tense, object_pronoun, object_noun, object_suffix} = normalizeSelection(g, selection);
+    const subject = subjectDetails(g, subject_noun, subject_suffix);
+    const _verb = verbDetails(g, verb, verb_tense, object_pronoun);
+
+    // check object_pronoun and object_suffix match
+    if (object_suffix !== null) {
+        if (!g.objectSuffixes.has(object_suffix)) throw new Error(`Invalid object suffix: ${object_suffix}`);
+        if (!g.suffixPronouns[object_suffix].includes(object_pronoun)) throw new Error("Object pronoun and suffix do not match");
+    }
+
+    let object = null;
+    if (object_suffix !== null) {
+        object = objectDetails(g, object_noun, object_suffix);
+    } else if (object_noun !== null) {
+        throw new Error("Object suffix is required");
+    }
+
+    if (g.subjectPronouns.has(subject_noun)) {
+        return object ? [object, subject, _verb] : [_verb, subject];
+    }
+    return object ? [subject, object, _verb] : [subject, _verb];
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = {makeGrammar, getAllChoices, formatSentence};
+}
@@ -1,4 +1,34 @@
-// on btn-translator click, get input-translator-english value and sent to /api/translator/translate
+// read a stream of Server-Sent Events from a fetch response, calling onEvent(event, data) for each one
+function readEvents(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    function pump() {
+        return reader.read().then(({done, value}) => {
+            if (done) {
+                return;
+            }
+            buffer += decoder.decode(value, {stream: true});
+            const messages = buffer.split("\n\n");
+            buffer = messages.pop();
+            messages.forEach(message => {
+                let event = "message", data = "";
+                message.split("\n").forEach(line => {
+                    if (line.startsWith("event: ")) {
+                        event = line.slice(7);
+                    } else if (line.startsWith("data: ")) {
+                        data += line.slice(6);
+                    }
+                });
+                onEvent(event, JSON.parse(data));
+            });
+            return pump();
+        });
+    }
+    return pump();
+}
+
+// on btn-translator click, get input-translator-english value and stream its translation from /api/translator/stream
 $(document).ready(function() {
     $('#input-translator-english').keypress(function(event) {
         if (event.which == 13) { // 13 is the keycode for the Enter key
@@ -21,7 +51,7 @@ $(document).ready(function() {
         $("#translation-message").hide();
 
         var english = $("#input-translator-english").val();
-        fetch("/api/translator/translate", {
+        fetch("/api/translator/stream", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json"
@@ -31,27 +61,36 @@ $(document).ready(function() {
             })
         }).then(res => {
             if (res.status == 200) {
-                let res_json = res.json();
-                return res_json;
+                return res;
             } else if (res.status == 429) {
                 throw new Error(`Too many requests. Please try again later.`);
             } else{
                 throw new Error(`Unknown error: ${res.status}`);
             }
-        }).then(response => {
-            console.log(response);
-            $("#output-translator-english").text(response.english);
-            $("#output-translator-paiute").text(response.paiute);
-            if (response.warning) {
-                $("#output-translator-warning").text(`*${response.warning}`);
-                $("#translation-warning").show();
-            }
-            if (response.message) {
-                $("#output-translator-message").text(`*${response.message}`);
-                $("#translation-message").show();
+        }).then(res => readEvents(res, (event, data) => {
+            console.log(event, data);
+            if (event == "target") { // show the translation as soon as it is ready
+                $("#output-translator-paiute").text(data.target);
+                $("#output-translator-english").html('<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span>');
+                $("#translation-section").show();
+            } else if (event == "backwards") {
+                $("#output-translator-english").text(data.backwards);
+            } else if (event == "result") {
+                $("#output-translator-english").text(data.english);
+                $("#output-translator-paiute").text(data.paiute);
+                if (data.warning) {
+                    $("#output-translator-warning").text(`*${data.warning}`);
+                    $("#translation-warning").show();
+                }
+                if (data.message) {
+                    $("#output-translator-message").text(`*${data.message}`);
+                    $("#translation-message").show();
+                }
+                $("#translation-section").show();
+            } else if (event == "error") {
+                throw new Error(data.error);
             }
-            $("#translation-section").show();
-        }).catch(error => {
+        })).catch(error => {
             console.log(error);
             $("#output-translator-warning").text(`*${error}`);
             $("#translation-warning").show();
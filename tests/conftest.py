@@ -0,0 +1,16 @@
+import os
+import pathlib
+import sys
+
+# the app's modules live at the top level of the repository
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+# importing the app requires its settings (the tests never reach the real services)
+for key, value in {
+    'AUTH0_CLIENT_ID': 'test-client',
+    'AUTH0_CLIENT_SECRET': 'test-secret',
+    'AUTH0_DOMAIN': 'auth0.invalid',
+    'SECRET_KEY': 'test',
+    'OPENAI_API_KEY': 'sk-test',
+}.items():
+    os.environ.setdefault(key, value)
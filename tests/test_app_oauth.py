@@ -0,0 +1,191 @@
+"""Caching of the Auth0 management token and users' app metadata, against a local Auth0 stand-in.
+
+The stand-in serves the token and user endpoints the SDK calls over HTTPS (with a
+self-signed certificate the SDK is told to trust) and counts the requests it gets.
+"""
+import http.server
+import json
+import os
+import pathlib
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator
+from urllib.parse import unquote, urlparse
+
+import pytest
+
+import app_oauth
+from app_base import app
+
+SUB = 'auth0|test-user'
+
+
+class StubAuth0(http.server.ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubAuth0Handler)
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {'token': 0, 'get': 0, 'update': 0, 'delete': 0}
+        self.users: Dict[str, Dict[str, Any]] = {SUB: {'user_id': SUB, 'app_metadata': {'api_key': 'sk-old'}}}
+        self.tokens = 0
+
+    def count(self, request: str) -> None:
+        with self.lock:
+            self.requests[request] += 1
+
+
+class StubAuth0Handler(http.server.BaseHTTPRequestHandler):
+    server: StubAuth0
+
+    def reply(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> Dict[str, Any]:
+        return json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+    def user_id(self) -> str:
+        path = urlparse(self.path).path
+        assert path.startswith('/api/v2/users/')
+        assert self.headers['Authorization'].startswith('Bearer token-')
+        return unquote(path[len('/api/v2/users/'):])
+
+    def do_POST(self):
+        assert self.path == '/oauth/token'
+        self.read_json()
+        self.server.count('token')
+        with self.server.lock:
+            self.server.tokens += 1
+            token = f"token-{self.server.tokens}"
+        self.reply(200, {'access_token': token, 'expires_in': 86400, 'token_type': 'Bearer'})
+
+    def do_GET(self):
+        self.server.count('get')
+        self.reply(200, self.server.users[self.user_id()])
+
+    def do_PATCH(self):
+        self.server.count('update')
+        user = self.server.users[self.user_id()]
+        user.update(self.read_json())
+        self.reply(200, user)
+
+    def do_DELETE(self):
+        self.server.count('delete')
+        self.server.users.pop(self.user_id(), None)
+        self.reply(204, {})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory) -> pathlib.Path:
+    if shutil.which('openssl') is None:
+        pytest.skip('openssl is required to serve the Auth0 stand-in over HTTPS')
+    path = tmp_path_factory.mktemp('tls')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+         '-addext', 'subjectAltName=DNS:localhost', '-keyout', str(path / 'key.pem'), '-out', str(path / 'cert.pem')],
+        check=True, capture_output=True
+    )
+    return path
+
+
+@pytest.fixture
+def stub(certificate, tmp_path, monkeypatch) -> Iterator[StubAuth0]:
+    server = StubAuth0()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate / 'cert.pem', certificate / 'key.pem')
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv('REQUESTS_CA_BUNDLE', str(certificate / 'cert.pem'))
+    monkeypatch.setattr(app_oauth, 'AUTH0_DOMAIN', f"localhost:{server.server_address[1]}")
+    monkeypatch.setattr(app_oauth, 'APP_METADATA_DIR', str(tmp_path / 'app_metadata'))
+    monkeypatch.setattr(app_oauth, '_management_token', None)
+    monkeypatch.setattr(app_oauth, '_management_token_expires', 0.0)
+    monkeypatch.setattr(app_oauth, '_app_metadata_cache', {})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def logged_in() -> Iterator[None]:
+    with app.test_request_context():
+        app_oauth.session['profile'] = {'sub': SUB}
+        yield
+
+
+def test_management_token_is_fetched_once(stub):
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        tokens = list(executor.map(lambda _: app_oauth.get_management_api_token(), range(32)))
+    assert set(tokens) == {'token-1'}
+    assert stub.requests['token'] == 1
+
+
+def test_management_token_is_refreshed_before_it_expires(stub, monkeypatch):
+    assert app_oauth.get_management_api_token() == 'token-1'
+    monkeypatch.setattr(app_oauth, '_management_token_expires', app_oauth.time.time() + app_oauth.MANAGEMENT_TOKEN_REFRESH_MARGIN - 1)
+    assert app_oauth.get_management_api_token() == 'token-2'
+    assert stub.requests['token'] == 2
+
+
+def test_app_metadata_is_cached(stub, logged_in):
+    assert app_oauth.get_app_metadata() == {'api_key': 'sk-old'}
+    assert app_oauth.get_app_metadata() == {'api_key': 'sk-old'}
+    assert stub.requests['get'] == 1
+
+
+def test_app_metadata_expires(stub, logged_in, monkeypatch):
+    monkeypatch.setattr(app_oauth, 'APP_METADATA_TTL', 0)
+    app_oauth.get_app_metadata()
+    app_oauth.get_app_metadata()
+    assert stub.requests['get'] == 2
+
+
+def test_update_is_visible_immediately(stub, logged_in):
+    app_oauth.get_app_metadata()
+    app_oauth.update_app_metadata(default_tutor_language='English', api_key='sk-new')
+    assert app_oauth.get_app_metadata() == {'default_tutor_language': 'English', 'api_key': 'sk-new'}
+    assert stub.requests == {'token': 1, 'get': 1, 'update': 1, 'delete': 0}
+
+
+def test_update_by_another_worker_invalidates_the_cache(stub, logged_in):
+    assert app_oauth.get_app_metadata() == {'api_key': 'sk-old'}
+
+    # another worker process of the server (sharing APP_METADATA_DIR) updates the metadata
+    code = (
+        "import app_oauth; from app_base import app\n"
+        f"app_oauth.AUTH0_DOMAIN = {app_oauth.AUTH0_DOMAIN!r}\n"
+        f"app_oauth.APP_METADATA_DIR = {app_oauth.APP_METADATA_DIR!r}\n"
+        "with app.test_request_context():\n"
+        f"    app_oauth.session['profile'] = {{'sub': {SUB!r}}}\n"
+        "    app_oauth.update_app_metadata(default_tutor_language='English', api_key='sk-new')\n"
+    )
+    subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=pathlib.Path(app_oauth.__file__).parent, env=os.environ.copy(), check=True, capture_output=True
+    )
+    assert stub.requests['update'] == 1
+
+    assert app_oauth.get_app_metadata() == {'default_tutor_language': 'English', 'api_key': 'sk-new'}
+    assert stub.requests['get'] == 2
+    assert app_oauth.get_app_metadata()['api_key'] == 'sk-new'
+    assert stub.requests['get'] == 2
+
+
+def test_delete_account_drops_the_cache(stub, logged_in):
+    app_oauth.get_app_metadata()
+    with app.test_request_context(method='POST'):
+        app_oauth.session['profile'] = {'sub': SUB}
+        app_oauth.delete_account()
+    assert stub.requests['delete'] == 1
+    assert SUB not in app_oauth._app_metadata_cache
@@ -0,0 +1,164 @@
+"""Conformance of static/js/grammar.js with sentence_builder's rules.
+
+The builder computes choices and sentence previews in the browser with a port of
+get_all_choices and format_sentence, running on the tables of get_grammar_bundle.
+This runs the port under node for every state the builder can show and compares
+its output with the Python rules.
+
+The subject slots and the verb/object slots do not constrain each other, so each
+builder state of the verb/object slots (46k) is paired with one of the subject
+states, cycling through all of them. Random selections with unknown or
+mismatching words cover the normalization of invalid input.
+"""
+import hashlib
+import itertools
+import json
+import pathlib
+import random
+import shutil
+import subprocess
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+
+from sentence_builder import (
+    NOUNS, SENTENCE_KEYS, Object, Subject, Verb,
+    format_sentence, get_all_choices, get_grammar_bundle
+)
+
+GRAMMAR_JS = pathlib.Path(__file__).parent.parent / 'static' / 'js' / 'grammar.js'
+NUM_RANDOM = 20000
+
+# digests the same canonical JSON as canonical() below
+NODE_SCRIPT = r"""
+const fs = require('fs');
+const crypto = require('crypto');
+const {makeGrammar, getAllChoices, formatSentence} = require(process.argv[1]);
+const grammar = makeGrammar(JSON.parse(fs.readFileSync(process.argv[2], 'utf8')));
+const selections = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+
+function canonical(value) {
+    if (Array.isArray(value)) return '[' + value.map(canonical).join(',') + ']';
+    if (value !== null && typeof value === 'object') {
+        return '{' + Object.keys(value).sort().map(key => JSON.stringify(key) + ':' + canonical(value[key])).join(',') + '}';
+    }
+    return JSON.stringify(value === undefined ? null : value);
+}
+
+const digests = selections.map(selection => {
+    let sentence = null;
+    try {
+        sentence = formatSentence(grammar, selection);
+    } catch (e) {}
+    const output = canonical({choices: getAllChoices(grammar, selection), sentence: sentence});
+    return crypto.createHash('sha1').update(output, 'utf8').digest('hex');
+});
+process.stdout.write(JSON.stringify(digests));
+"""
+
+
+def canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def python_output(selection: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    try:
+        sentence = format_sentence(**selection)
+    except Exception:
+        sentence = None
+    return {'choices': get_all_choices(**selection), 'sentence': sentence}
+
+
+def subject_states() -> List[Dict[str, Optional[str]]]:
+    states = [{'subject_noun': None, 'subject_suffix': None}]
+    states.extend({'subject_noun': pronoun, 'subject_suffix': None} for pronoun in Subject.PRONOUNS)
+    for noun in NOUNS:
+        states.extend({'subject_noun': noun, 'subject_suffix': suffix} for suffix in [None, *Subject.SUFFIXES])
+    return states
+
+
+def verb_object_states() -> Iterator[Dict[str, Optional[str]]]:
+    """Selections of the verb and object slots that get_all_choices leaves as they are."""
+    slots = SENTENCE_KEYS[2:]
+    values = [
+        [None, *Verb.TRANSIITIVE_VERBS, *Verb.INTRANSITIVE_VERBS],
+        [None, *Verb.TENSES],
+        [None, *Object.PRONOUNS],
+        [None, *NOUNS],
+        [None, *Object.SUFFIXES],
+    ]
+    for combination in itertools.product(*values):
+        selection = dict(zip(slots, combination))
+        choices = get_all_choices(None, None, **selection)
+        if all(choices[slot]['value'] == value for slot, value in selection.items()):
+            yield selection
+
+
+def builder_states() -> List[Dict[str, Optional[str]]]:
+    subjects = subject_states()
+    return [
+        {**subject, **verb_object}
+        for subject, verb_object in zip(itertools.cycle(subjects), verb_object_states())
+    ]
+
+
+def random_selections(num: int, seed: int = 0) -> List[Dict[str, Optional[str]]]:
+    rng = random.Random(seed)
+    options = {
+        'subject_noun': [None, '', 'unknown', *Subject.PRONOUNS, *NOUNS],
+        'subject_suffix': [None, 'unknown', *Subject.SUFFIXES],
+        'verb': [None, 'unknown', *Verb.TRANSIITIVE_VERBS, *Verb.INTRANSITIVE_VERBS],
+        'verb_tense': [None, 'unknown', *Verb.TENSES],
+        'object_pronoun': [None, 'unknown', *Object.PRONOUNS],
+        'object_noun': [None, 'unknown', *NOUNS],
+        'object_suffix': [None, 'unknown', *Object.SUFFIXES],
+    }
+    return [{key: rng.choice(values) for key, values in options.items()} for _ in range(num)]
+
+
+def run_grammar_js(selections: List[Dict[str, Optional[str]]], tmp_path: pathlib.Path) -> List[str]:
+    bundle_path, selections_path = tmp_path / 'bundle.json', tmp_path / 'selections.json'
+    bundle_path.write_text(json.dumps(get_grammar_bundle(), ensure_ascii=False), encoding='utf-8')
+    selections_path.write_text(json.dumps(selections, ensure_ascii=False), encoding='utf-8')
+    res = subprocess.run(
+        ['node', '-e', NODE_SCRIPT, str(GRAMMAR_JS), str(bundle_path), str(selections_path)],
+        capture_output=True, check=True
+    )
+    return json.loads(res.stdout)
+
+
+def assert_conforms(selections: List[Dict[str, Optional[str]]], tmp_path: pathlib.Path) -> None:
+    digests = run_grammar_js(selections, tmp_path)
+    assert len(digests) == len(selections)
+    mismatches = []
+    for selection, digest in zip(selections, digests):
+        output = canonical(python_output(selection))
+        if hashlib.sha1(output.encode('utf-8')).hexdigest() != digest:
+            mismatches.append(selection)
+    assert not mismatches, f"grammar.js differs from sentence_builder for {len(mismatches)} selections, e.g. {mismatches[:5]}"
+
+
+@pytest.fixture(autouse=True)
+def require_node():
+    if shutil.which('node') is None:
+        pytest.skip('node is required to run static/js/grammar.js')
+
+
+@pytest.fixture(scope='module')
+def states() -> List[Dict[str, Optional[str]]]:
+    return builder_states()
+
+
+def test_builder_states_cover_every_slot_state(states):
+    assert {(s['subject_noun'], s['subject_suffix']) for s in states} == {
+        (s['subject_noun'], s['subject_suffix']) for s in subject_states()
+    }
+    assert len(states) > 40000
+
+
+def test_every_builder_state(states, tmp_path):
+    assert_conforms(states, tmp_path)
+
+
+def test_invalid_selections(tmp_path):
+    assert_conforms(random_selections(NUM_RANDOM), tmp_path)
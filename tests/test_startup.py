@@ -0,0 +1,14 @@
+"""The web app imports within its budget and without the translator's heavy dependencies (see check_startup.py)."""
+import check_startup
+
+
+def test_import_time_is_within_budget():
+    total, direct, _ = check_startup.measure('app')
+    assert direct, 'no imports of app were measured'
+    assert total <= check_startup.DEFAULT_BUDGET, f"import app took {total:.3f}s (budget {check_startup.DEFAULT_BUDGET:.3f}s)"
+
+
+def test_no_heavy_modules_are_imported():
+    assert {'openai', 'torch', 'sentence_transformers', 'pandas'} <= set(check_startup.HEAVY_MODULES)
+    _, _, loaded = check_startup.measure('app')
+    assert not loaded, f"heavy modules loaded at import: {', '.join(loaded)}"
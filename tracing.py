@@ -0,0 +1,208 @@
+"""Span-based tracing of requests through the translation pipeline.
+
+A trace is started per request (start_trace) and code on its path records
+spans (span), e.g. the stages of translate_eng2ovp and the LLM and embedding
+calls in segment. The current span is a context variable, so threads started
+with contextvars.copy_context().run (batch workers, background jobs) add their
+spans to the same trace. Outside of a trace, span is a no-op.
+
+Traces are head-sampled: a TRACE_SAMPLE_RATE fraction of traces is exported to
+an in-memory ring buffer (and to TRACE_FILE, if set). Traces slower than
+TRACE_SLOW_SECONDS are always exported and logged with their span breakdown.
+Configured with env variables:
+
+    TRACE_SAMPLE_RATE   fraction of traces exported (default: 0.05)
+    TRACE_SLOW_SECONDS  duration from which traces are logged as slow (default: 5)
+    TRACE_BUFFER_SIZE   number of traces kept in memory per process (default: 200)
+    TRACE_FILE          JSONL file traces are appended to (default: unset)
+"""
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.05'))
+TRACE_SLOW_SECONDS = float(os.getenv('TRACE_SLOW_SECONDS', '5'))
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+TRACE_FILE = os.getenv('TRACE_FILE')
+
+TRACE_ID_PATTERN = re.compile(r'^[0-9a-f]{8,32}$')
+
+_buffer: Deque[Dict[str, Any]] = collections.deque(maxlen=TRACE_BUFFER_SIZE)
+_file_lock = threading.Lock()
+
+
+class Span:
+    """A timed operation within a trace."""
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Trace:
+    """The spans recorded for one request."""
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.timestamp = time.time()
+        self.spans: List[Span] = [] # appends are atomic, so threads can add spans without a lock
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0]
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'timestamp': self.timestamp,
+            'duration': root.duration,
+            'spans': [
+                {
+                    'name': span.name,
+                    'span_id': span.span_id,
+                    'parent_id': span.parent_id,
+                    'offset': span.start - root.start,
+                    'duration': span.duration,
+                    'attributes': span.attributes,
+                    'error': span.error,
+                }
+                for span in self.spans
+            ]
+        }
+
+
+_current: contextvars.ContextVar[Optional[Tuple[Trace, Span]]] = contextvars.ContextVar('trace_span', default=None)
+
+
+def new_trace_id(trace_id: Optional[str] = None) -> str:
+    """Use a propagated trace ID (e.g. from a request header) if it is valid, otherwise create one."""
+    if trace_id and TRACE_ID_PATTERN.match(trace_id):
+        return trace_id
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current[0].trace_id if current else None
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a span for the block (if a trace is active)."""
+    current = _current.get()
+    if current is None:
+        yield None
+        return
+    trace, parent = current
+    _span = Span(name, parent.span_id, attributes)
+    trace.spans.append(_span)
+    token = _current.set((trace, _span))
+    try:
+        yield _span
+    except BaseException as exc:
+        _span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _span.end = time.perf_counter()
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def start_trace(name: str, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Trace]:
+    """Trace the block, exporting the trace (if sampled or slow) when it ends.
+
+    Within another trace's context (e.g. a job submitted by a traced request), the new
+    trace keeps that trace's ID and sampling decision.
+    """
+    parent = _current.get()
+    if parent is not None and trace_id is None:
+        trace = Trace(parent[0].trace_id, parent[0].sampled)
+    else:
+        trace = Trace(new_trace_id(trace_id), random.random() < TRACE_SAMPLE_RATE)
+    root = Span(name, None, attributes)
+    trace.spans.append(root)
+    token = _current.set((trace, root))
+    try:
+        yield trace
+    except BaseException as exc:
+        root.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current.reset(token)
+        _finish(trace)
+
+
+def _finish(trace: Trace) -> None:
+    slow = trace.spans[0].duration >= TRACE_SLOW_SECONDS
+    if slow:
+        logging.warning(f"Slow request ({trace.spans[0].duration:.2f}s):\n{format_trace(trace)}")
+    if trace.sampled or slow:
+        export(trace.to_dict())
+
+
+def export(data: Dict[str, Any]) -> None:
+    _buffer.append(data)
+    if TRACE_FILE:
+        line = json.dumps(data, default=str) + '\n'
+        try:
+            with _file_lock, open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError as exc:
+            logging.warning(f"Failed to export trace: {exc}")
+
+
+def format_trace(trace: Trace) -> str:
+    """Format a trace's spans as an indented tree with their start offsets and durations."""
+    children: Dict[Optional[str], List[Span]] = collections.defaultdict(list)
+    for _span in trace.spans:
+        children[_span.parent_id].append(_span)
+    root = trace.spans[0]
+    lines = [f"trace {trace.trace_id}"]
+
+    def add(_span: Span, depth: int) -> None:
+        attributes = ' '.join(f"{key}={value}" for key, value in _span.attributes.items())
+        error = f" ERROR {_span.error}" if _span.error else ''
+        lines.append(
+            f"{'  ' * depth}{_span.name} +{(_span.start - root.start) * 1000:.0f}ms "
+            f"{_span.duration * 1000:.0f}ms {attributes}{error}".rstrip()
+        )
+        for child in sorted(children[_span.span_id], key=lambda child: child.start):
+            add(child, depth + 1)
+
+    add(root, 1)
+    return '\n'.join(lines)
+
+
+def get_traces(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """The exported traces of this process, newest first."""
+    traces = list(reversed(_buffer))
+    return traces[:limit] if limit else traces
+
+
+def get_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    """Find an exported trace in this process's buffer, or in TRACE_FILE (written by all processes)."""
+    trace = next((trace for trace in reversed(_buffer) if trace['trace_id'] == trace_id), None)
+    if trace is None and TRACE_FILE and os.path.exists(TRACE_FILE):
+        with open(TRACE_FILE, encoding='utf-8') as f:
+            for line in f:
+                if trace_id in line and json.loads(line)['trace_id'] == trace_id:
+                    trace = json.loads(line)
+    return trace
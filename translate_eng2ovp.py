@@ -1,32 +1,52 @@
 """Functions for translating simple sentences from English to Paiute."""
 import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from functools import partial
 import json
 import logging
 import os
 import pathlib
 import random
-import traceback
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import dotenv
 import numpy as np
 from openai.types.chat import ChatCompletion
-import pandas as pd
 
+from gloss_embeddings import GlossEmbeddings
+from lexicon import IRREGULAR_VERBS, NOUN_SYNONYMS, VERB_SYNONYMS, LexiconIndex, english_words, noun_candidates, verb_candidates
+from runner import ResultStore, run_tasks
 from sentence_builder import NOUNS, Object, Subject, Verb
 from segment import make_sentence, split_sentence
 from segment import semantic_similarity_transformers, semantic_similarity_openai
+from segment import get_transformers_embeddings, get_openai_embedding_matrix
 from translate_ovp2eng import translate as translate_ovp_to_english
+import circuit_breaker
+import deadlines
+import tracing
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 dotenv.load_dotenv()
 
 SS_MODE = os.getenv('SS_MODE', 'sentence-transformers')
 
 if SS_MODE == 'openai':
-    semantic_similarity = partial(semantic_similarity_openai, model='text-embedding-ada-002')
+    SS_MODEL = 'text-embedding-ada-002'
+    semantic_similarity = partial(semantic_similarity_openai, model=SS_MODEL)
+    get_embeddings = partial(get_openai_embedding_matrix, model=SS_MODEL)
 else:
-    semantic_similarity = partial(semantic_similarity_transformers, model='sentence-transformers/all-MiniLM-L6-v2')
+    SS_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+    semantic_similarity = partial(semantic_similarity_transformers, model=SS_MODEL)
+    get_embeddings = partial(get_transformers_embeddings, model=SS_MODEL)
+
+# minimum (0-1 scaled) similarity for replacing an unknown word with its nearest known gloss
+GLOSS_SIMILARITY_THRESHOLD = float(os.getenv('GLOSS_SIMILARITY_THRESHOLD', '0.85'))
 
 thisdir = pathlib.Path(__file__).parent.absolute()
 
@@ -66,6 +86,268 @@ R_SUBJECT_PRONOUNS = {
     'this': ['ihi']
 }
 
+NOUN_INDEX = LexiconIndex(R_NOUNS.keys(), noun_candidates, NOUN_SYNONYMS, english_words())
+TRANSITIVE_VERB_INDEX = LexiconIndex(R_TRANSIITIVE_VERBS.keys(), verb_candidates, VERB_SYNONYMS, english_words())
+INTRANSITIVE_VERB_INDEX = LexiconIndex(R_INTRANSITIVE_VERBS.keys(), verb_candidates, VERB_SYNONYMS, english_words())
+
+def resolve_sentence(sentence: Dict[str, str],
+                     substitutions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, str]:
+    """Map inflected, misspelled or synonymous words in a simple sentence onto known English glosses.
+
+    Words that are pronouns or that cannot be resolved are left unchanged.
+
+    Args:
+        sentence (Dict[str, str]): A simple English sentence (as returned by split_sentence).
+        substitutions (Optional[List[Dict[str, Any]]]): If given, the words replaced by a different
+            word (synonym or fuzzy matches, not inflections) are appended as {'word', 'gloss', 'match'}.
+
+    Returns:
+        Dict[str, str]: A copy of the sentence with resolved words replaced by their glosses.
+    """
+    sentence = dict(sentence)
+
+    def replace(key: str, word: str, match: Optional[Tuple[str, str]]) -> None:
+        if match is None:
+            return
+        gloss, how = match
+        sentence[key] = gloss
+        if substitutions is not None and how in ('synonym', 'fuzzy'):
+            substitutions.append({'word': word, 'gloss': gloss, 'match': how})
+
+    subject = (sentence.get('subject') or '').strip().lower()
+    if subject and subject not in R_SUBJECT_PRONOUNS:
+        replace('subject', subject, NOUN_INDEX.match(subject))
+    _object = (sentence.get('object') or '').strip().lower()
+    if _object and _object not in R_OBJECT_PRONOUNS:
+        replace('object', _object, NOUN_INDEX.match(_object))
+    verb = (sentence.get('verb') or '').strip().lower()
+    if verb:
+        if _object:
+            match = TRANSITIVE_VERB_INDEX.match(verb)
+        else:
+            match = INTRANSITIVE_VERB_INDEX.match(verb) or TRANSITIVE_VERB_INDEX.match(verb)
+        replace('verb', verb, match)
+    return sentence
+
+def resolve_sentences(sentences: List[Dict[str, str]],
+                      substitutions: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, str]]:
+    """Resolve every simple sentence of a split result (see resolve_sentence)."""
+    return [resolve_sentence(sentence, substitutions) for sentence in sentences]
+
+DETERMINERS = {'the', 'a', 'an', 'this', 'that', 'these', 'those', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'some'}
+FUTURE_AUXILIARIES = {'will', 'shall'}
+PAST_AUXILIARIES = {'was', 'were', 'did'}
+PRESENT_AUXILIARIES = {'is', 'am', 'are', 'do', 'does'}
+# contracted auxiliaries by their suffix, e.g. "I'll" is "I will" ('d and 've are ambiguous or not auxiliaries here)
+CONTRACTED_AUXILIARIES = {'ll': 'will', 'm': 'am', 're': 'are', 's': 'is'}
+# negated clauses cannot be built (and would be translated as affirmative), along with n't contractions
+NEGATIONS = {
+    'not', 'never', 'no', 'nobody', 'nothing', 'none', 'nor', 'neither', 'nowhere', 'cannot',
+    'dont', 'doesnt', 'didnt', 'isnt', 'arent', 'wasnt', 'werent', 'wont', 'cant',
+}
+CLAUSE_SEPARATORS = re.compile(r"[.,;:!?]|\b(?:and|but|then|while|because)\b")
+
+def _verb_tense(word: str, auxiliary: Optional[str]) -> str:
+    if auxiliary in FUTURE_AUXILIARIES:
+        return 'future'
+    if word.endswith('ing'):
+        return 'past_continuous' if auxiliary in PAST_AUXILIARIES else 'present_continuous'
+    irregular_past = word in IRREGULAR_VERBS and not word.endswith('s') and word != 'read'
+    if auxiliary in PAST_AUXILIARIES or word.endswith('ed') or irregular_past:
+        return 'past'
+    return 'present'
+
+def _clause_words(clause: str) -> Optional[List[str]]:
+    """The words of a clause with contracted auxiliaries spelled out (None if the clause is negated)."""
+    words = []
+    for word in re.findall(r"[a-z]+(?:'[a-z]+)?", clause.replace('\u2019', "'")):
+        word, _, suffix = word.partition("'")
+        if word in NEGATIONS or suffix == 't':
+            return None
+        words.append(word)
+        if suffix in CONTRACTED_AUXILIARIES:
+            words.append(CONTRACTED_AUXILIARIES[suffix])
+    return words
+
+def _parse_clause(words: List[str]) -> Optional[Dict[str, str]]:
+    """Parse the words of a clause as subject, verb and optional object (None unless every word is understood)."""
+    subject = verb = tense = _object = auxiliary = None
+    for word in words:
+        if word in DETERMINERS:
+            continue
+        if subject is None:
+            subject = word if word in R_SUBJECT_PRONOUNS else NOUN_INDEX.resolve(word)
+            if not subject:
+                return None
+        elif verb is None:
+            if word in FUTURE_AUXILIARIES | PAST_AUXILIARIES | PRESENT_AUXILIARIES:
+                auxiliary = word
+            elif word in TRANSITIVE_VERB_INDEX or word in INTRANSITIVE_VERB_INDEX:
+                verb, tense = word, _verb_tense(word, auxiliary)
+            else:
+                return None
+        elif _object is None:
+            _object = word if word in R_OBJECT_PRONOUNS else NOUN_INDEX.resolve(word)
+            if not _object:
+                return None
+        else: # e.g. an adverb or a second object
+            return None
+    if not (subject and verb):
+        return None
+    simple_sentence = {'subject': subject, 'verb': verb, 'verb_tense': tense}
+    if _object:
+        simple_sentence['object'] = _object
+    return simple_sentence
+
+def split_sentence_locally(sentence: str) -> List[Dict[str, str]]:
+    """Split a sentence into simple sentences with rules (for when the LLM is unavailable).
+
+    Only sentences whose clauses are all made of known words in subject-verb(-object)
+    order are understood, e.g. "The dogs ate the apples and I slept." If any clause is
+    not (e.g. it is negated, as in "He didn't eat the fish.", or has a word that is
+    not known), nothing is returned rather than a translation of part of the sentence.
+
+    Args:
+        sentence (str): The English sentence.
+
+    Returns:
+        List[Dict[str, str]]: The simple sentences (as returned by split_sentence), or an
+            empty list if the sentence is not understood.
+    """
+    simple_sentences = []
+    for clause in CLAUSE_SEPARATORS.split(sentence.lower()):
+        words = _clause_words(clause)
+        if words is None:
+            return []
+        if not words:
+            continue
+        simple_sentence = _parse_clause(words)
+        if simple_sentence is None:
+            return []
+        simple_sentences.append(simple_sentence)
+    return simple_sentences
+
+class RecentResults:
+    """Bounded map of the latest LLM results (least recently used are dropped), for answering while the LLM is unavailable."""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._results: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def put(self, key: Any, result: Any) -> None:
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            if len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+RECENT_RESULTS_SIZE = int(os.getenv('RECENT_RESULTS_SIZE', '10000'))
+recent_splits = RecentResults(RECENT_RESULTS_SIZE)
+recent_back_translations = RecentResults(RECENT_RESULTS_SIZE)
+
+def split_sentence_with_fallback(sentence: str,
+                                 model: str = None,
+                                 res_callback: Optional[Callable[[ChatCompletion], None]] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """split_sentence, answered with a recent result or split_sentence_locally while the LLM is unavailable.
+
+    Returns:
+        Tuple[List[Dict[str, str]], Optional[str]]: The simple sentences and the fallback used
+            ('cache' or 'rules', or None if the LLM answered).
+
+    Raises:
+        circuit_breaker.CircuitOpen: If the LLM is unavailable and the sentence cannot be split locally.
+    """
+    key = (model, sentence.strip())
+    try:
+        simple_sentences = split_sentence(sentence, model=model, res_callback=res_callback)
+    except circuit_breaker.CircuitOpen:
+        cached = recent_splits.get(key)
+        if cached is not None:
+            return cached, 'cache'
+        simple_sentences = split_sentence_locally(sentence)
+        if not simple_sentences:
+            raise
+        return simple_sentences, 'rules'
+    recent_splits.put(key, simple_sentences)
+    return simple_sentences, None
+
+GLOSS_EMBEDDINGS = GlossEmbeddings(
+    {
+        'noun': R_NOUNS.keys(),
+        'transitive': R_TRANSIITIVE_VERBS.keys(),
+        'intransitive': R_INTRANSITIVE_VERBS.keys(),
+    },
+    embed=get_embeddings,
+    model=SS_MODEL
+)
+
+def _substitute_unknown_words(sentences: List[Dict[str, str]],
+                              threshold: float) -> Tuple[List[Dict[str, str]], List[Tuple[int, Dict[str, Any]]]]:
+    """substitute_unknown_words, but with the index of the sentence each substitution was made in."""
+    sentences = [dict(sentence) for sentence in sentences]
+    unknown = [] # (sentence index, key, word, allowed categories)
+    for i, sentence in enumerate(sentences):
+        subject = (sentence.get('subject') or '').strip().lower()
+        if subject and subject not in R_SUBJECT_PRONOUNS and subject not in R_NOUNS:
+            unknown.append((i, 'subject', subject, ['noun']))
+        _object = (sentence.get('object') or '').strip().lower()
+        if _object and _object not in R_OBJECT_PRONOUNS and _object not in R_NOUNS:
+            unknown.append((i, 'object', _object, ['noun']))
+        verb = (sentence.get('verb') or '').strip().lower()
+        if _object and verb and verb not in R_TRANSIITIVE_VERBS:
+            unknown.append((i, 'verb', verb, ['transitive']))
+        elif not _object and verb and verb not in R_INTRANSITIVE_VERBS and verb not in R_TRANSIITIVE_VERBS:
+            unknown.append((i, 'verb', verb, ['intransitive', 'transitive']))
+
+    substitutions = []
+    if not unknown:
+        return sentences, substitutions
+
+    try:
+        matches = GLOSS_EMBEDDINGS.nearest(
+            [word for _, _, word, _ in unknown],
+            [categories for _, _, _, categories in unknown],
+            k=1
+        )
+    except circuit_breaker.CircuitOpen as exc: # e.g. openai embeddings, the unknown words stay placeholders
+        logging.warning(f"Not substituting unknown words: {exc}")
+        return sentences, substitutions
+    for (i, key, word, _), word_matches in zip(unknown, matches):
+        if not word_matches:
+            continue
+        gloss, similarity = word_matches[0]
+        if similarity < threshold:
+            continue
+        sentences[i][key] = gloss
+        substitutions.append((i, {'word': word, 'gloss': gloss, 'match': 'embedding', 'similarity': similarity}))
+    return sentences, substitutions
+
+def substitute_unknown_words(sentences: List[Dict[str, str]],
+                             threshold: float = GLOSS_SIMILARITY_THRESHOLD) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    """Replace words that are not in the vocabulary with their nearest known gloss.
+
+    All unknown words of all sentences are embedded together and matched against
+    the precomputed gloss matrix in one lookup. Words whose best match is below
+    the threshold are left as they are (and end up as placeholders).
+
+    Args:
+        sentences (List[Dict[str, str]]): Resolved simple sentences (see resolve_sentences).
+        threshold (float): Minimum similarity for a substitution.
+
+    Returns:
+        Tuple[List[Dict[str, str]], List[Dict[str, Any]]]: The sentences with substitutions
+            applied, and a list of the substitutions made ({'word', 'gloss', 'match': 'embedding', 'similarity'}).
+    """
+    sentences, substitutions = _substitute_unknown_words(sentences, threshold)
+    return sentences, [substitution for _, substitution in substitutions]
+
 def translate_simple(sentence: Dict[str, str]) -> Tuple[Subject, Verb, Object]:
     """Translate a simple English sentence to Paiute.
 
@@ -75,7 +357,7 @@ def translate_simple(sentence: Dict[str, str]) -> Tuple[Subject, Verb, Object]:
     Returns:
         List[Union[Subject, Verb, Object]]: A list of Paiute words.
     """
-    sentence = {k: v.strip().lower() for k, v in sentence.items() if v}
+    sentence = {k: v.strip().lower() for k, v in resolve_sentence(sentence).items() if v}
     if sentence.get('object'):
         verb_stem = R_TRANSIITIVE_VERBS.get(sentence['verb'], f"[{sentence['verb']}]")
     else:
@@ -118,7 +400,7 @@ def order_sentence(subject: Subject, verb: Verb, _object: Optional[Object] = Non
     return sentence
 
 def comparator_sentence(simple_sentence: Dict[str, str]) -> str:
-    simple_sentence = {k: v.strip().lower() for k, v in simple_sentence.items() if v}
+    simple_sentence = {k: v.strip().lower() for k, v in resolve_sentence(simple_sentence).items() if v}
     if simple_sentence['subject'] not in R_NOUNS and simple_sentence['subject'] not in R_SUBJECT_PRONOUNS:
         simple_sentence['subject'] = '[SUBJECT]'
     if simple_sentence['verb'] not in R_TRANSIITIVE_VERBS and simple_sentence['verb'] not in R_INTRANSITIVE_VERBS:
@@ -127,33 +409,166 @@ def comparator_sentence(simple_sentence: Dict[str, str]) -> str:
         simple_sentence['object'] = '[OBJECT]'
     return simple_sentence
 
-def translate_english_to_ovp(sentence: str, model: str = None, res_callback: Optional[Callable[[ChatCompletion], None]] = None) -> Dict[str, Any]:
-    simple_sentences = split_sentence(sentence, model=model, res_callback=res_callback)
+TargetWords = Tuple[Subject, Verb, Optional[Object]]
+
+def build_target(vocab_sentences: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[TargetWords], str]:
+    """Translate simple English sentences to Paiute (locally, without any LLM calls).
+
+    Args:
+        vocab_sentences (List[Dict[str, str]]): Simple sentences with unknown words substituted.
+
+    Returns:
+        Tuple[List[Dict[str, str]], List[TargetWords], str]: The comparator sentences, the
+            Paiute words of each sentence and the natural language Paiute translation.
+    """
     comparator_sentences = []
     target_simple_sentences = []
-    backwards_translations = []
-    for simple_sentence in simple_sentences:
+    target_words = []
+    for simple_sentence in vocab_sentences:
         comparator_sentences.append(comparator_sentence(simple_sentence))
         subject, verb, _object = translate_simple(simple_sentence)
         target_simple_sentence = order_sentence(subject, verb, _object)
         target_simple_sentences.append(" ".join(map(str, target_simple_sentence)))
-        backwards_translations.append(
-            translate_ovp_to_english(
-                subject_noun=subject.noun,
-                subject_suffix=subject.subject_suffix,
-                verb=verb.verb_stem,
-                verb_tense=verb.tense_suffix,
-                object_pronoun=verb.object_pronoun_prefix,
-                object_noun=_object.noun if _object else None,
-                object_suffix=_object.object_suffix if _object else None
-            ).strip(".")
-        )
-        # compare source sentence and com
+        target_words.append((subject, verb, _object))
+    return comparator_sentences, target_words, ". ".join(target_simple_sentences) + '.'
+
+def back_translation_args(target_words: TargetWords) -> Dict[str, Optional[str]]:
+    subject, verb, _object = target_words
+    return dict(
+        subject_noun=subject.noun,
+        subject_suffix=subject.subject_suffix,
+        verb=verb.verb_stem,
+        verb_tense=verb.tense_suffix,
+        object_pronoun=verb.object_pronoun_prefix,
+        object_noun=_object.noun if _object else None,
+        object_suffix=_object.object_suffix if _object else None,
+    )
+
+def translate_ovp_to_english_with_fallback(model: str = None,
+                                           res_callback: Optional[Callable[[ChatCompletion], None]] = None,
+                                           **args: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """translate_ovp_to_english, answered with a recent result while the LLM is unavailable.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The translation (None if the LLM is unavailable and
+            there is no recent result) and the fallback used ('cache', or None if the LLM answered).
+    """
+    key = (model, tuple(sorted(args.items())))
+    try:
+        translation = translate_ovp_to_english(**args, model=model, res_callback=res_callback)
+    except circuit_breaker.CircuitOpen:
+        translation = recent_back_translations.get(key)
+        return translation, 'cache' if translation is not None else None
+    recent_back_translations.put(key, translation)
+    return translation, None
+
+def back_translate(target_words: TargetWords,
+                   model: str = None,
+                   res_callback: Optional[Callable[[ChatCompletion], None]] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Translate the Paiute words of a simple sentence back to English (without the final period).
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: See translate_ovp_to_english_with_fallback.
+    """
+    translation, fallback = translate_ovp_to_english_with_fallback(
+        **back_translation_args(target_words),
+        model=model,
+        res_callback=res_callback
+    )
+    return (translation.strip(".") if translation is not None else None), fallback
+
+# how much of the pipeline to run: fast stops after the (local) translation,
+# standard adds the back-translation, full adds the similarity scores
+TRANSLATION_MODES = ('fast', 'standard', 'full')
+
+def iter_translate_english_to_ovp(sentence: str,
+                                  model: str = None,
+                                  res_callback: Optional[Callable[[ChatCompletion], None]] = None,
+                                  mode: str = 'full') -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Translate an English sentence to Paiute, yielding the results of each stage as soon as it completes.
+
+    Stages (in order):
+        split: the simple sentences the input was split into ('structure')
+        target: the Paiute translation ('target') and any vocabulary substitutions ('substitutions')
+        backwards: the translation back to English ('backwards') - standard and full modes only
+        scores: the natural language simple/comparator sentences and the three similarity scores - full mode only
+        degraded: {"degraded": True, "skipped": [stage, ...], "fallback": {stage: 'cache' or 'rules'}} if
+            stages were skipped (because the request's deadline was near or the LLM is unavailable, see
+            circuit_breaker.py) or answered locally from recent results or rules
+
+    Merging the data of all stages gives the translate_english_to_ovp response.
 
-    simple_sentences_nl = ". ".join([make_sentence(sentence, model=model, res_callback=res_callback) for sentence in simple_sentences]) + '.'
-    comparator_sentence_nl = ". ".join([make_sentence(sentence, model=model, res_callback=res_callback) for sentence in comparator_sentences]) + '.'
-    target_simple_sentence_nl = ". ".join(target_simple_sentences) + '.'
-    backwards_translation_nl = ". ".join(backwards_translations) + '.'
+    Args:
+        sentence (str): The English sentence.
+        model (str): The OpenAI model to use (defaults to the OPENAI_MODEL env variable).
+        res_callback (Optional[Callable[[ChatCompletion], None]]): Called with every completion response.
+        mode (str): One of TRANSLATION_MODES.
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: (stage name, stage data)
+    """
+    if mode not in TRANSLATION_MODES:
+        raise ValueError(f"Mode must be one of {TRANSLATION_MODES} (not {mode})")
+    skipped: List[str] = []
+    fallbacks: Dict[str, str] = {}
+    yield from _iter_stages(sentence, model, res_callback, mode, skipped, fallbacks)
+    if skipped or fallbacks:
+        yield 'degraded', {"degraded": True, "skipped": skipped, "fallback": fallbacks}
+
+def _iter_stages(sentence: str,
+                 model: Optional[str],
+                 res_callback: Optional[Callable[[ChatCompletion], None]],
+                 mode: str,
+                 skipped: List[str],
+                 fallbacks: Dict[str, str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    # the stages of iter_translate_english_to_ovp, recording the stages skipped and answered locally
+    with tracing.span('split'):
+        split_sentences, fallback = split_sentence_with_fallback(sentence, model=model, res_callback=res_callback)
+        lexicon_substitutions: List[Dict[str, Any]] = []
+        simple_sentences = resolve_sentences(split_sentences, lexicon_substitutions)
+    if fallback:
+        fallbacks['split'] = fallback
+    yield 'split', {"structure": simple_sentences}
+
+    with tracing.span('target', sentences=len(simple_sentences)):
+        vocab_sentences, substitutions = substitute_unknown_words(simple_sentences)
+        comparator_sentences, target_words, target_simple_sentence_nl = build_target(vocab_sentences)
+    yield 'target', {"target": target_simple_sentence_nl, "substitutions": lexicon_substitutions + substitutions}
+    if mode == 'fast':
+        return
+
+    with tracing.span('backwards', sentences=len(target_words)):
+        results = [
+            back_translate(target_word, model=model, res_callback=res_callback)
+            for target_word in target_words
+        ]
+    if any(translation is None for translation, _ in results):
+        skipped.extend(['backwards'] if mode == 'standard' else ['backwards', 'make_sentences', 'scores'])
+        return
+    if any(fallback for _, fallback in results):
+        fallbacks['backwards'] = 'cache'
+    backwards_translation_nl = ". ".join(translation for translation, _ in results) + '.'
+    yield 'backwards', {"backwards": backwards_translation_nl}
+    if mode == 'standard':
+        return
+
+    # the natural language sentences and the scores only grade the translation,
+    # so they are skipped when time runs short or the LLM is unavailable
+    # the simple sentences are made from the split as the LLM returned it, so that sim_simple
+    # measures what splitting loses and sim_comparator what the vocabulary (substitutions) loses
+    num_made = len(split_sentences) + len(comparator_sentences)
+    try:
+        if not deadlines.has_time_for(deadlines.expected('make_sentence') * num_made + deadlines.expected('scores')):
+            raise deadlines.DeadlineExceeded("Not enough time left for make_sentences")
+        with tracing.span('make_sentences', sentences=num_made):
+            simple_sentences_nl = ". ".join([make_sentence(sentence, model=model, res_callback=res_callback) for sentence in split_sentences]) + '.'
+            comparator_sentence_nl = ". ".join([make_sentence(sentence, model=model, res_callback=res_callback) for sentence in comparator_sentences]) + '.'
+    except (deadlines.DeadlineExceeded, circuit_breaker.CircuitOpen) as exc:
+        logging.warning(f"Skipping make_sentences and scores: {exc}")
+        if isinstance(exc, deadlines.DeadlineExceeded):
+            deadlines.skip('make_sentences')
+        skipped.extend(['make_sentences', 'scores'])
+        return
 
     logging.info(f"Source: {sentence}")
     logging.info(f"Simple: {simple_sentences_nl}")
@@ -161,26 +576,230 @@ def translate_english_to_ovp(sentence: str, model: str = None, res_callback: Opt
     logging.info(f"Target: {target_simple_sentence_nl}")
     logging.info(f"BackTrans: {backwards_translation_nl}")
 
-    sim_source_simple = semantic_similarity(sentence, simple_sentences_nl)
-    logging.info(f"Source/Simple similarity: {sim_source_simple:0.3f}")
-    # source/comparator similarity
-    sim_source_comparator = semantic_similarity(sentence, comparator_sentence_nl)
-    logging.info(f"Source/Comparator similarity: {sim_source_comparator:0.3f}")
-    # source/backwards similarity
-    sim_source_backwards = semantic_similarity(sentence, backwards_translation_nl)
+    try:
+        if not deadlines.has_time_for(deadlines.expected('scores')):
+            raise deadlines.DeadlineExceeded("Not enough time left for scores")
+        with tracing.span('scores'), deadlines.timed('scores'):
+            sim_source_simple = semantic_similarity(sentence, simple_sentences_nl)
+            logging.info(f"Source/Simple similarity: {sim_source_simple:0.3f}")
+            # source/comparator similarity
+            sim_source_comparator = semantic_similarity(sentence, comparator_sentence_nl)
+            logging.info(f"Source/Comparator similarity: {sim_source_comparator:0.3f}")
+            # source/backwards similarity
+            sim_source_backwards = semantic_similarity(sentence, backwards_translation_nl)
+    except (deadlines.DeadlineExceeded, circuit_breaker.CircuitOpen) as exc:
+        logging.warning(f"Skipping scores: {exc}")
+        if isinstance(exc, deadlines.DeadlineExceeded):
+            deadlines.skip('scores')
+        skipped.append('scores')
+        yield 'scores', {"simple": simple_sentences_nl, "comparator": comparator_sentence_nl}
+        return
     logging.info(f"Source/Backwards similarity: {sim_source_backwards:0.3f}")
     logging.info("--------")
-    response = {
+    yield 'scores', {
         "simple": simple_sentences_nl,
         "comparator": comparator_sentence_nl,
-        "target": target_simple_sentence_nl,
-        "backwards": backwards_translation_nl,
-        "sim_simple": sim_source_simple,
-        "sim_comparator": sim_source_comparator,
-        "sim_backwards": sim_source_backwards
+        "sim_simple": float(sim_source_simple),
+        "sim_comparator": float(sim_source_comparator),
+        "sim_backwards": float(sim_source_backwards),
     }
+
+def translate_english_to_ovp(sentence: str,
+                             model: str = None,
+                             res_callback: Optional[Callable[[ChatCompletion], None]] = None,
+                             mode: str = 'full') -> Dict[str, Any]:
+    response = {"mode": mode, "degraded": False}
+    for _, data in iter_translate_english_to_ovp(sentence, model=model, res_callback=res_callback, mode=mode):
+        response.update(data)
     return response
 
+def translate_english_to_ovp_batch(sentences: List[str],
+                                   model: str = None,
+                                   res_callback: Optional[Callable[[ChatCompletion], None]] = None,
+                                   mode: str = 'full',
+                                   workers: int = 8) -> List[Dict[str, Any]]:
+    """Translate a batch of English sentences to Paiute.
+
+    Duplicate sentences are translated once, and so are duplicate back-translations
+    and natural language sentences across the batch. The LLM calls of each stage run
+    concurrently, all unknown words are substituted in one lookup and all similarity
+    scores come from one embedding pass.
+
+    Args:
+        sentences (List[str]): The English sentences.
+        model (str): The OpenAI model to use (defaults to the OPENAI_MODEL env variable).
+        res_callback (Optional[Callable[[ChatCompletion], None]]): Called with every completion response.
+        mode (str): One of TRANSLATION_MODES.
+        workers (int): Maximum number of concurrent LLM calls.
+
+    Returns:
+        List[Dict[str, Any]]: For each sentence (in order) the translate_english_to_ovp
+            response, or {'error': message} if its translation failed.
+    """
+    if mode not in TRANSLATION_MODES:
+        raise ValueError(f"Mode must be one of {TRANSLATION_MODES} (not {mode})")
+    unique = list(dict.fromkeys(sentences))
+    responses = {sentence: {"mode": mode, "degraded": False} for sentence in unique}
+    errors: Dict[str, str] = {}
+    skipped: Dict[str, List[str]] = {} # sentence -> stages skipped (see iter_translate_english_to_ovp)
+    fallbacks: Dict[str, Dict[str, str]] = {} # sentence -> {stage: fallback} of the stages answered locally
+    split_sentences: Dict[str, List[Dict[str, str]]] = {} # sentence -> its simple sentences before resolve_sentences
+
+    def run_unique(executor: ThreadPoolExecutor,
+                   func: Callable[..., Any],
+                   keys: Dict[Any, Dict[str, Any]]) -> Dict[Any, Any]:
+        # run func once per distinct key (in the caller's context, e.g. its LLM client), mapping each key to its result or exception
+        futures = {key: executor.submit(contextvars.copy_context().run, func, **kwargs) for key, kwargs in keys.items()}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as exc:
+                if not isinstance(exc, circuit_breaker.CircuitOpen):
+                    logging.exception(exc)
+                results[key] = exc
+        return results
+
+    def fail(sentence: str, exc: Exception) -> None:
+        errors[sentence] = str(exc)
+
+    def pending() -> List[str]:
+        return [sentence for sentence in unique if sentence not in errors]
+
+    def graded() -> List[str]:
+        return [sentence for sentence in pending() if sentence not in skipped]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+        with tracing.span('split', sentences=len(unique)):
+            splits = run_unique(executor, split_sentence_with_fallback, {
+                sentence: dict(sentence=sentence, model=model, res_callback=res_callback)
+                for sentence in unique
+            })
+        for sentence in unique:
+            if isinstance(splits[sentence], Exception):
+                fail(sentence, splits[sentence])
+                continue
+            simple_sentences, fallback = splits[sentence]
+            split_sentences[sentence] = simple_sentences
+            responses[sentence]["substitutions"] = []
+            responses[sentence]["structure"] = resolve_sentences(simple_sentences, responses[sentence]["substitutions"])
+            if fallback:
+                fallbacks.setdefault(sentence, {})['split'] = fallback
+
+        # substitute the unknown words of all sentences in one lookup
+        flat = [(sentence, i) for sentence in pending() for i in range(len(responses[sentence]["structure"]))]
+        with tracing.span('target', sentences=len(flat)):
+            vocab_flat, substitutions = _substitute_unknown_words(
+                [responses[sentence]["structure"][i] for sentence, i in flat],
+                GLOSS_SIMILARITY_THRESHOLD
+            )
+        vocab_sentences = {sentence: [] for sentence in pending()}
+        for (sentence, _), vocab_sentence in zip(flat, vocab_flat):
+            vocab_sentences[sentence].append(vocab_sentence)
+        for i, substitution in substitutions:
+            responses[flat[i][0]]["substitutions"].append(substitution)
+
+        comparator_sentences, target_words = {}, {}
+        for sentence in pending():
+            try:
+                comparator_sentences[sentence], target_words[sentence], responses[sentence]["target"] = build_target(vocab_sentences[sentence])
+            except Exception as exc:
+                logging.exception(exc)
+                fail(sentence, exc)
+
+        if mode != 'fast':
+            back_args = {
+                sentence: [back_translation_args(words) for words in target_words[sentence]]
+                for sentence in pending()
+            }
+            with tracing.span('backwards'):
+                back_translations = run_unique(executor, translate_ovp_to_english_with_fallback, {
+                    tuple(args.items()): dict(**args, model=model, res_callback=res_callback)
+                    for sentence in pending() for args in back_args[sentence]
+                })
+            for sentence in pending():
+                results = [back_translations[tuple(args.items())] for args in back_args[sentence]]
+                error = next((result for result in results if isinstance(result, Exception)), None)
+                if error is not None:
+                    fail(sentence, error)
+                elif any(translation is None for translation, _ in results):
+                    skipped[sentence] = ['backwards'] if mode == 'standard' else ['backwards', 'make_sentences', 'scores']
+                else:
+                    if any(fallback for _, fallback in results):
+                        fallbacks.setdefault(sentence, {})['backwards'] = 'cache'
+                    responses[sentence]["backwards"] = ". ".join(translation.strip(".") for translation, _ in results) + '.'
+
+        if mode == 'full':
+            def schema_key(schema: Dict[str, str]) -> Tuple:
+                return tuple(sorted(schema.items()))
+            schemas = {
+                sentence: (split_sentences[sentence], comparator_sentences[sentence])
+                for sentence in graded()
+            }
+            to_make = {
+                schema_key(schema): schema
+                for simple, comparator in schemas.values() for schema in [*simple, *comparator]
+            }
+            # the calls run concurrently, in rounds of at most workers calls
+            rounds = -(-len(to_make) // workers)
+            make_skipped = not deadlines.has_time_for(deadlines.expected('make_sentence') * rounds + deadlines.expected('batch_scores'))
+            made = {}
+            if make_skipped:
+                logging.warning("Skipping make_sentences and scores: not enough time left")
+                deadlines.skip('make_sentences')
+            else:
+                with tracing.span('make_sentences'):
+                    made = run_unique(executor, make_sentence, {
+                        key: dict(sentence=schema, model=model, res_callback=res_callback)
+                        for key, schema in to_make.items()
+                    })
+            for sentence, (simple, comparator) in schemas.items():
+                results = [made.get(schema_key(schema)) for schema in [*simple, *comparator]]
+                error = next((result for result in results if isinstance(result, Exception)), None)
+                if make_skipped or isinstance(error, (deadlines.DeadlineExceeded, circuit_breaker.CircuitOpen)):
+                    skipped[sentence] = ['make_sentences', 'scores']
+                elif error is not None:
+                    fail(sentence, error)
+                else:
+                    responses[sentence]["simple"] = ". ".join(results[:len(simple)]) + '.'
+                    responses[sentence]["comparator"] = ". ".join(results[len(simple):]) + '.'
+
+            # one embedding pass for the similarity scores of the whole batch
+            texts = list(dict.fromkeys(
+                text for sentence in graded()
+                for text in (sentence, *(responses[sentence][key] for key in ('simple', 'comparator', 'backwards')))
+            ))
+            try:
+                if texts and not deadlines.has_time_for(deadlines.expected('batch_scores')):
+                    raise deadlines.DeadlineExceeded("Not enough time left for scores")
+                with tracing.span('scores', texts=len(texts)), deadlines.timed('batch_scores'):
+                    embeddings = dict(zip(texts, get_embeddings(texts))) if texts else {}
+            except (deadlines.DeadlineExceeded, circuit_breaker.CircuitOpen) as exc:
+                logging.warning(f"Skipping scores: {exc}")
+                if isinstance(exc, deadlines.DeadlineExceeded):
+                    deadlines.skip('scores')
+                for sentence in graded():
+                    skipped[sentence] = ['scores']
+                embeddings = {}
+            except Exception as exc:
+                logging.exception(exc)
+                for sentence in graded():
+                    fail(sentence, exc)
+                embeddings = {}
+            for sentence in graded():
+                for key in ('simple', 'comparator', 'backwards'):
+                    similarity = embeddings[sentence] @ embeddings[responses[sentence][key]]
+                    responses[sentence][f"sim_{key}"] = float((similarity + 1) / 2) # scale to 0-1 range
+
+    for sentence in pending():
+        if sentence in skipped or sentence in fallbacks:
+            responses[sentence].update(degraded=True, skipped=skipped.get(sentence, []), fallback=fallbacks.get(sentence, {}))
+
+    return [
+        {"error": errors[sentence]} if sentence in errors else dict(responses[sentence])
+        for sentence in sentences
+    ]
+
 def translate(sentence):
     logging.getLogger().setLevel(logging.ERROR)
     if sentence is None:
@@ -196,91 +815,100 @@ def translate(sentence):
         print(f"Backwards: {translation['backwards']}")
         print()
 
-def evaluate(models: List[str], max_tries: int = 15) -> None:
+EVALUATION_COLUMNS = [
+    'sentence', 'type', 'structure', 'simple', 'sim_simple', 'comparator', 'sim_comparator',
+    'target', 'backwards', 'sim_backwards', 'prompt_tokens', 'completion_tokens'
+]
+
+def evaluate_sentence(sentence: str, model: str) -> Dict[str, Any]:
+    """Translate a sentence and collect the evaluation metrics for it.
+
+    Raises:
+        RuntimeError: If the translation is degraded (see iter_translate_english_to_ovp), since
+            its metrics would not be those of the model.
+    """
+    tokens = {'prompt': 0, 'completion': 0}
+    def res_callback(res: ChatCompletion) -> None:
+        tokens['prompt'] += res.usage.prompt_tokens
+        tokens['completion'] += res.usage.completion_tokens
+
+    response = translate_english_to_ovp(sentence, model=model, res_callback=res_callback)
+    if response['degraded']: # answered without (some of) the LLM, fail the try so run_tasks retries it
+        raise RuntimeError(
+            f"Degraded translation (skipped: {response['skipped']}, fallbacks: {response['fallback']})"
+        )
+    return {
+        'structure': json.dumps(response['structure']),
+        'simple': response['simple'],
+        'sim_simple': float(response['sim_simple']),
+        'comparator': response['comparator'],
+        'sim_comparator': float(response['sim_comparator']),
+        'target': response['target'],
+        'backwards': response['backwards'],
+        'sim_backwards': float(response['sim_backwards']),
+        'prompt_tokens': tokens['prompt'],
+        'completion_tokens': tokens['completion'],
+    }
+
+def import_evaluation_csv(store: ResultStore, model: str, path: pathlib.Path) -> None:
+    """Seed the results store with the finished rows of a CSV written by an older run."""
+    import pandas as pd
+    df = pd.read_csv(path, index_col=0)
+    df = df[df['sim_backwards'].notnull()]
+    for row in df.to_dict('records'):
+        if (model, row['sentence']) not in store:
+            store.append((model, row['sentence']), {
+                k: (None if pd.isna(v) else v) for k, v in row.items()
+                if k in EVALUATION_COLUMNS and k not in ('sentence', 'type')
+            })
+
+def export_evaluation_csv(store: ResultStore, df: "pd.DataFrame", model: str, path: pathlib.Path) -> None:
+    """Write the results for a model in the CSV format read by plot_results.py."""
+    import pandas as pd
+    rows = []
+    for row in df.to_dict('records'):
+        result = store.get((model, row['sentence']), {})
+        rows.append({**row, **result})
+    df_results = pd.DataFrame(rows).reindex(columns=EVALUATION_COLUMNS)
+    df_results.to_csv(path)
+
+def evaluate(models: List[str], max_tries: int = 15, workers: int = 4) -> None:
+    """Evaluate the translation of every sentence in data/sentences.csv with each model.
+
+    Sentences and models are processed in parallel on a bounded worker pool.
+    Results are appended to .results/sentences-translated/results.jsonl as they
+    finish, so an interrupted run resumes where it left off, and are exported to
+    one CSV per model at the end.
+
+    Args:
+        models (List[str]): The OpenAI models to evaluate.
+        max_tries (int): Tries per sentence before giving up on it.
+        workers (int): Number of sentences translated concurrently.
+    """
+    import pandas as pd
     path = thisdir / 'data' / 'sentences.csv'
     df = pd.read_csv(path)
+    savedir = thisdir / '.results' / 'sentences-translated'
+    store = ResultStore(savedir / 'results.jsonl')
     for model in models:
-        path_similiarty = thisdir / '.results' / 'sentences-translated' / f"{model}.csv"
-        path_similiarty.parent.mkdir(parents=True, exist_ok=True)
-        if not path_similiarty.exists():
-            df_similarity = df.copy()
-            df_similarity['structure'] = None
-            df_similarity['simple'] = None
-            df_similarity['sim_simple'] = None
-            df_similarity['comparator'] = None
-            df_similarity['sim_comparator'] = None
-            df_similarity['target'] = None
-            df_similarity['backwards'] = None
-            df_similarity['sim_backwards'] = None
-        else:
-            df_similarity = pd.read_csv(path_similiarty, index_col=0)
+        path_similiarty = savedir / f"{model}.csv"
+        if path_similiarty.exists():
+            import_evaluation_csv(store, model, path_similiarty)
+
+    tasks = [
+        ((model, sentence), partial(evaluate_sentence, sentence, model))
+        for model in models
+        for sentence in df['sentence'].unique()
+    ]
+    num_pending = sum(1 for key, _ in tasks if key not in store)
+    num_failed = 0
+    for i, (key, _, error) in enumerate(run_tasks(tasks, store, workers=workers, max_tries=max_tries), start=1):
+        num_failed += error is not None
+        print(f"{i}/{num_pending} ({num_failed} failed)", end='\r')
+    print()
 
-        os.environ['MODEL'] = model
-        for i, sentence in enumerate(df_similarity['sentence']):
-            if df_similarity.loc[df_similarity['sentence'] == sentence, 'sim_backwards'].notnull().values[0]:
-                continue
-            try_num = 1
-            while True:
-                try:
-                    print(f"{i+1}/{len(df_similarity)}", end='\r')
-                    simple_sentences = split_sentence(sentence)
-                    comparator_sentences = []
-                    target_simple_sentences = []
-                    backwards_translations = []
-                    
-                    tokens = {'prompt': 0, 'completion': 0}
-                    res_callback = lambda res: tokens.update({
-                        'prompt': tokens['prompt'] + res.usage.prompt_tokens,
-                        'completion': tokens['completion'] + res.usage.completion_tokens
-                    })
-                    for simple_sentence in simple_sentences:
-                        comparator_sentences.append(comparator_sentence(simple_sentence))
-                        subject, verb, _object = translate_simple(simple_sentence)
-                        target_simple_sentence = order_sentence(subject, verb, _object)
-                        target_simple_sentences.append(" ".join(map(str, target_simple_sentence)))
-                        backwards_translation = translate_ovp_to_english(
-                            subject_noun=subject.noun,
-                            subject_suffix=subject.subject_suffix,
-                            verb=verb.verb_stem,
-                            verb_tense=verb.tense_suffix,
-                            object_pronoun=verb.object_pronoun_prefix,
-                            object_noun=_object.noun if _object else None,
-                            object_suffix=_object.object_suffix if _object else None,
-                            model=model,
-                            res_callback=res_callback
-                        )
-                        backwards_translations.append(backwards_translation.strip("."))
-
-                    simple_sentences_nl = ". ".join([make_sentence(sentence, model=model, res_callback=res_callback) for sentence in simple_sentences]) + '.'
-                    comparator_sentence_nl = ". ".join([make_sentence(sentence, model=model, res_callback=res_callback) for sentence in comparator_sentences]) + '.'
-                    target_simple_sentence_nl = ". ".join(target_simple_sentences) + '.'
-                    backwards_translation_nl = ". ".join(backwards_translations) + '.'
-
-
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'structure'] = json.dumps(simple_sentences)
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'simple'] = simple_sentences_nl
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'comparator'] = comparator_sentence_nl
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'target'] = target_simple_sentence_nl
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'backwards'] = backwards_translation_nl
-
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'prompt_tokens'] = tokens['prompt']
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'completion_tokens'] = tokens['completion']
-
-                    similarity_simple = semantic_similarity(sentence, simple_sentences_nl)
-                    similarity_comparator = semantic_similarity(sentence, comparator_sentence_nl)
-                    similarity_backwards = semantic_similarity(sentence, backwards_translation_nl)
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'sim_simple'] = similarity_simple
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'sim_comparator'] = similarity_comparator
-                    df_similarity.loc[df_similarity['sentence'] == sentence, 'sim_backwards'] = similarity_backwards
-
-                    df_similarity.to_csv(path_similiarty)
-                    break
-                except Exception as exc:
-                    try_num += 1
-                    if try_num > max_tries:
-                        raise exc
-                    traceback.print_exc()
-                    print(f"Exception occurred ({exc}) - try {try_num}/{max_tries}")
+    for model in models:
+        export_evaluation_csv(store, df, model, savedir / f"{model}.csv")
 
 def main():
     parser = argparse.ArgumentParser(description="Translate English to Paiute")
@@ -292,6 +920,8 @@ def main():
 
     evaluate_parser = subparsers.add_parser('evaluate', help="Evaluate the translation of English sentences to Paiute")
     evaluate_parser.add_argument('models', nargs='+', help="Models to evaluate")
+    evaluate_parser.add_argument('--workers', type=int, default=4, help="Number of sentences to translate concurrently")
+    evaluate_parser.add_argument('--max-tries', type=int, default=15, help="Tries per sentence before giving up on it")
     evaluate_parser.set_defaults(func="evaluate")
 
     args = parser.parse_args()
@@ -300,7 +930,7 @@ def main():
     elif args.command == 'translate':
         translate(args.sentence)
     elif args.command == 'evaluate':
-        evaluate(args.models)
+        evaluate(args.models, max_tries=args.max_tries, workers=args.workers)
 
 if __name__ == '__main__':
     main()
@@ -1,20 +1,27 @@
 import argparse
-from functools import lru_cache
+from functools import lru_cache, partial
 import json
 import logging
 import os
 import pathlib
 import pprint
-from typing import Callable, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import dotenv
 import openai
-import pandas as pd
 
+import cassette
+import circuit_breaker
+import deadlines
+import llm_clients
+import metrics
+import tracing
+from runner import ResultStore, run_tasks
 from sentence_builder import (NOUNS, Object, Subject, Verb, format_sentence,
                   get_random_sentence, sentence_to_str)
 
 dotenv.load_dotenv()
+cassette.install()
 
 thisdir = pathlib.Path(__file__).parent.absolute()
 
@@ -74,7 +81,8 @@ def translate(subject_noun: str,
               object_noun: Optional[str],
               object_suffix: Optional[str],
               model = None,
-              res_callback: Optional[Callable[[ChatCompletion], None]] = None) -> str:
+              res_callback: Optional[Callable[[ChatCompletion], None]] = None,
+              client: Optional[openai.OpenAI] = None) -> str:
     if model is None:
         model = os.environ['OPENAI_MODEL']
     structure = get_english_structure(
@@ -117,12 +125,17 @@ def translate(subject_noun: str,
         *examples,
         {'role': 'user', 'content': json.dumps(structure)}
     ]
-    res = openai.chat.completions.create(
-        model=model,
-        messages=messages,
-        timeout=10,
-        temperature=0.0
-    )
+    def create(timeout: float) -> ChatCompletion:
+        with circuit_breaker.llm_breaker.guard(), metrics.llm_call('translate_ovp2eng', model):
+            return (client or llm_clients.get_client()).chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout,
+                temperature=0.0
+            )
+    with tracing.span('translate_ovp2eng', model=model):
+        res = deadlines.call_llm('translate_ovp2eng', create)
+    metrics.record_usage(model, res.usage)
     if res_callback:
         res_callback(res)
     return res.choices[-1].message.content
@@ -135,23 +148,101 @@ def translate_random():
     translation = translate(**{key: value['value'] for key, value in choices.items()})
     print(f"Translation: {translation}")
 
-def evaluate(num: int, savepath: pathlib.Path):
-    rows = []
-    if savepath.exists():
-        df = pd.read_csv(savepath)
-        rows = df.to_dict('records')
-    for i in range(len(rows), num):
-        print(f"Generating sentence {i+1}/{num}")
-        choices = get_random_sentence()
-        sentence_details = format_sentence(**{key: value['value'] for key, value in choices.items()})
-        translation = translate(**{key: value['value'] for key, value in choices.items()})
-        rows.append({
-            'sentence': sentence_to_str(sentence_details),
-            'translation': translation,
-        })
-
-        df = pd.DataFrame(rows)
-        df.to_csv(savepath, index=False, encoding='utf-8')
+def write_requests(num: int, path: pathlib.Path) -> List[Dict[str, Any]]:
+    """Append randomly generated sentence structures to a JSONL request file until it holds num requests.
+
+    Args:
+        num (int): The total number of requests the file should hold.
+        path (pathlib.Path): The request file.
+
+    Returns:
+        List[Dict[str, Any]]: All requests in the file ({'id', 'choices', 'sentence'}).
+    """
+    requests = []
+    if path.exists():
+        with path.open(encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+    with path.open('a', encoding='utf-8') as f:
+        for i in range(len(requests), num):
+            choices = get_random_sentence()
+            choices = {key: value['value'] for key, value in choices.items()}
+            request = {
+                'id': i,
+                'choices': choices,
+                'sentence': sentence_to_str(format_sentence(**choices)),
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+            requests.append(request)
+    return requests[:num]
+
+def export_results(requests: List[Dict[str, Any]], store: ResultStore, savepath: pathlib.Path) -> None:
+    import pandas as pd
+    rows = [
+        {'sentence': request['sentence'], 'translation': store.get((request['id'],))['translation']}
+        for request in requests if (request['id'],) in store
+    ]
+    pd.DataFrame(rows, columns=['sentence', 'translation']).to_csv(savepath, index=False, encoding='utf-8')
+
+def evaluate(num: int,
+             savepath: pathlib.Path,
+             workers: int = 8,
+             base_url: Optional[str] = None,
+             model: Optional[str] = None,
+             checkpoint_every: int = 100,
+             max_tries: int = 5):
+    """Translate num randomly generated sentences as a batch job.
+
+    All sentence structures are first written to <savepath>.requests.jsonl. They are then
+    translated concurrently (at most workers requests in flight) and each result is appended
+    to <savepath>.results.jsonl as soon as it arrives, so an interrupted job resumes where it
+    left off. The results CSV at savepath is rewritten every checkpoint_every results and at
+    the end.
+
+    Args:
+        num (int): Number of sentences to evaluate.
+        savepath (pathlib.Path): Path of the results CSV.
+        workers (int): Maximum number of requests in flight.
+        base_url (Optional[str]): Base URL of an OpenAI-compatible endpoint (e.g. a local
+            server at http://localhost:8000/v1). Defaults to the OpenAI API.
+        model (Optional[str]): The model to use (defaults to the OPENAI_MODEL env variable).
+        checkpoint_every (int): Number of results between CSV checkpoints.
+        max_tries (int): Tries per request before giving up on it.
+    """
+    savepath.parent.mkdir(parents=True, exist_ok=True)
+    requests_path = savepath.with_suffix('.requests.jsonl')
+    store = ResultStore(savepath.with_suffix('.results.jsonl'))
+
+    if savepath.exists() and not requests_path.exists(): # import results of a sequential run
+        import pandas as pd
+        with requests_path.open('w', encoding='utf-8') as f:
+            for i, row in enumerate(pd.read_csv(savepath).to_dict('records')):
+                f.write(json.dumps({'id': i, 'choices': None, 'sentence': row['sentence']}, ensure_ascii=False) + '\n')
+                store.append((i,), {'translation': row['translation']})
+
+    requests = write_requests(num, requests_path)
+    client = None
+    if base_url is not None:
+        client = openai.OpenAI(
+            base_url=base_url,
+            api_key=os.getenv('OPENAI_API_KEY', 'local'),
+            max_retries=0, # calls are retried by deadlines.call_llm (and failed requests by run_tasks)
+            http_client=cassette.http_client()
+        )
+
+    tasks = [
+        ((request['id'],), partial(_translate_request, request, model=model, client=client))
+        for request in requests if request['choices'] is not None
+    ]
+    num_pending = sum(1 for key, _ in tasks if key not in store)
+    for i, (_, _, error) in enumerate(run_tasks(tasks, store, workers=workers, max_tries=max_tries), start=1):
+        print(f"Translated {i}/{num_pending}", end='\r')
+        if i % checkpoint_every == 0:
+            export_results(requests, store, savepath)
+    print()
+    export_results(requests, store, savepath)
+
+def _translate_request(request: Dict[str, Any], model: Optional[str], client: Optional[openai.OpenAI]) -> Dict[str, Any]:
+    return {'translation': translate(**request['choices'], model=model, client=client)}
 
 def main():
     parser = argparse.ArgumentParser(description='Translate OVP sentences to English')
@@ -163,6 +254,10 @@ def main():
     evaluate_parser = subparsers.add_parser('evaluate', help='Evaluate the translation of a number of randomly generated sentences')
     evaluate_parser.add_argument('num', type=int, help='Number of sentences to evaluate')
     evaluate_parser.add_argument('savepath', type=pathlib.Path, help='Path to save the evaluation results')
+    evaluate_parser.add_argument('--workers', type=int, default=8, help='Maximum number of translation requests in flight')
+    evaluate_parser.add_argument('--base-url', help='Base URL of an OpenAI-compatible endpoint (defaults to the OpenAI API)')
+    evaluate_parser.add_argument('--model', help='Model to use (defaults to the OPENAI_MODEL env variable)')
+    evaluate_parser.add_argument('--checkpoint-every', type=int, default=100, help='Number of results between CSV checkpoints')
     evaluate_parser.set_defaults(func='evaluate')
     
     args = parser.parse_args()
@@ -172,7 +267,13 @@ def main():
     elif args.func == 'translate-random':
         translate_random()
     elif args.func == 'evaluate':
-        evaluate(args.num, args.savepath)
+        evaluate(
+            args.num, args.savepath,
+            workers=args.workers,
+            base_url=args.base_url,
+            model=args.model,
+            checkpoint_every=args.checkpoint_every
+        )
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""Warm-up of a worker process before it is sent traffic.
+
+Workers start quickly because the translator's dependencies are imported on
+first use (see check_startup.py), so without a warm-up the first translator
+request each worker gets pays for loading the similarity model. The app
+registers warm-up steps (add_step) and each gunicorn worker runs them on a
+background thread after it boots (start), so liveness checks keep answering
+meanwhile. Steps that fail are retried every WARMUP_RETRY_INTERVAL seconds.
+
+A worker is ready once its blocking steps are done. Steps that depend on
+services outside the pod (e.g. a client that needs an API key) are added with
+blocking=False: they run and retry the same way, but do not hold back
+readiness, so an upstream outage cannot take the pod out of rotation. Since the orchestrator's readiness
+probe reaches an arbitrary worker of the pod, each ready worker also leaves a
+marker in WARMUP_DIR and the pod is only reported ready (pod_ready) once all
+of its workers have. Configured with env variables:
+
+    WARMUP_STEPS            comma-separated steps to run (default: all registered steps).
+                            Empty skips the warm-up.
+    WARMUP_RETRY_INTERVAL   seconds between attempts of failed steps (default: 30)
+    WARMUP_DIR              directory of the ready markers (default: .results/warmup)
+"""
+import logging
+import os
+import pathlib
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+thisdir = pathlib.Path(__file__).parent.absolute()
+
+WARMUP_STEPS = os.getenv('WARMUP_STEPS')
+WARMUP_RETRY_INTERVAL = float(os.getenv('WARMUP_RETRY_INTERVAL', '30'))
+WARMUP_DIR = os.getenv('WARMUP_DIR', str(thisdir / '.results' / 'warmup'))
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_steps: Dict[str, Callable[[], Any]] = {}
+_blocking: Dict[str, bool] = {}
+_state: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_workers = 1
+
+
+def add_step(name: str, func: Callable[[], Any], blocking: bool = True) -> None:
+    """Register a warm-up step (steps run in the order they are added).
+
+    Args:
+        name (str): Name of the step (see WARMUP_STEPS).
+        func (Callable[[], Any]): The step.
+        blocking (bool): Whether the worker is only ready once the step is done.
+    """
+    _steps[name] = func
+    _blocking[name] = blocking
+
+
+def enabled_steps() -> List[str]:
+    if WARMUP_STEPS is None:
+        return list(_steps)
+    names = [name.strip() for name in WARMUP_STEPS.split(',') if name.strip()]
+    unknown = set(names) - set(_steps)
+    if unknown:
+        logging.warning(f"Unknown warm-up steps (ignored): {', '.join(sorted(unknown))}")
+    return [name for name in _steps if name in names]
+
+
+def start(workers: int = 1) -> None:
+    """Run the enabled steps in the background (once per process).
+
+    Args:
+        workers (int): Number of worker processes of this server, all of which must be warm for pod_ready.
+    """
+    global _thread, _workers
+    with _lock:
+        if _thread is not None:
+            return
+        _workers = workers
+        for name in enabled_steps():
+            _state[name] = {'status': PENDING, 'seconds': None, 'error': None, 'blocking': _blocking[name]}
+        _thread = threading.Thread(target=_run, name='warmup', daemon=True)
+        _thread.start()
+
+
+def _run() -> None:
+    started = time.perf_counter()
+    pending = list(_state)
+    marked = False
+    while True:
+        for name in pending:
+            state = _state[name]
+            state['status'] = RUNNING
+            start_time = time.perf_counter()
+            try:
+                _steps[name]()
+            except Exception as exc:
+                logging.warning(f"Warm-up step {name} failed (retrying in {WARMUP_RETRY_INTERVAL:.0f}s): {exc}")
+                state.update(status=FAILED, error=f"{type(exc).__name__}: {exc}")
+            else:
+                state.update(status=DONE, error=None)
+            state['seconds'] = round(time.perf_counter() - start_time, 3)
+        pending = [name for name in pending if _state[name]['status'] == FAILED]
+        if not marked and is_ready():
+            logging.info(f"Worker {os.getpid()} warmed up in {time.perf_counter() - started:.1f}s")
+            _mark_ready()
+            marked = True
+        if not pending:
+            break
+        time.sleep(WARMUP_RETRY_INTERVAL)
+
+
+def is_ready() -> bool:
+    """Whether this process has run all of its blocking warm-up steps."""
+    return _thread is not None and all(state['status'] == DONE for state in _state.values() if state['blocking'])
+
+
+def _mark_ready() -> None:
+    if not WARMUP_DIR:
+        return
+    try:
+        path = pathlib.Path(WARMUP_DIR)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / str(os.getpid())).touch()
+    except OSError as exc:
+        logging.warning(f"Failed to write warm-up marker: {exc}")
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def ready_workers() -> int:
+    """Number of running worker processes that have warmed up."""
+    if not WARMUP_DIR:
+        return int(is_ready())
+    path = pathlib.Path(WARMUP_DIR)
+    if not path.exists():
+        return 0
+    return sum(1 for marker in path.iterdir() if marker.name.isdigit() and _is_alive(int(marker.name)))
+
+
+def pod_ready() -> bool:
+    """Whether this process and all other workers of the server have warmed up."""
+    return is_ready() and ready_workers() >= _workers
+
+
+def status() -> Dict[str, Any]:
+    """The warm-up state of this process and the server's workers."""
+    return {
+        'ready': pod_ready(),
+        'worker_ready': is_ready(),
+        'started': _thread is not None,
+        'workers': _workers,
+        'ready_workers': ready_workers(),
+        'steps': {name: dict(state) for name, state in _state.items()},
+    }
+
+
+def clear() -> None:
+    """Remove the ready markers (e.g. when the server starts)."""
+    if WARMUP_DIR:
+        shutil.rmtree(WARMUP_DIR, ignore_errors=True)